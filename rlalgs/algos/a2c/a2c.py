@@ -6,6 +6,11 @@ import time
 import numpy as np
 import tensorflow as tf
 import rlalgs.utils.mpi as mpi
+import rlalgs.utils.xla as xla
+import rlalgs.utils.timer as timer
+import rlalgs.utils.trace as trace
+import rlalgs.utils.memory as memory
+import rlalgs.utils.session as session
 import rlalgs.utils.logger as log
 import rlalgs.utils.utils as utils
 import rlalgs.algos.a2c.core as core
@@ -67,7 +72,9 @@ class ReplayBuffer:
 
 def a2c(env_fn, hidden_sizes=[64, 64], epochs=50, steps_per_epoch=4000, pi_lr=3e-4, vf_lr=1e-3,
         train_v_iters=80, gamma=0.99, seed=0, logger_kwargs=dict(), save_freq=10,
-        overwrite_save=True, preprocess_fn=None, obs_dim=None):
+        overwrite_save=True, preprocess_fn=None, obs_dim=None, xla_compile=False,
+        exec_config=None, resume_from=None, time_phases=False,
+        trace_epoch=None, track_memory=False, profile_mpi=False):
     """
     Train agent on env using A2C
 
@@ -89,14 +96,31 @@ def a2c(env_fn, hidden_sizes=[64, 64], epochs=50, steps_per_epoch=4000, pi_lr=3e
     done apart for handling reshaping for discrete observation spaces)
     obs_dim : dimensions for observations (if None then dimensions extracted from environment
     observation space)
+    xla_compile : whether to compile the acting, loss and local gradient ops with XLA (gradient
+    averaging and optimizer ops run MPI collectives so are not compiled)
+    exec_config : tf session execution config (threads, cpu affinity, graph optimizer options and
+    auto-tuning) as dict of kwargs or rlalgs.utils.session.ExecConfig. Cores are shared between
+    processes by default.
+    resume_from : output directory of a run to resume training from. Training continues from the
+    training state saved with the run's last model save (network, optimizer, random number
+    generator and logger state). Must be resumed with the same number of processes.
+    time_phases : whether to log time spent in each phase of the training loop (env steps,
+    preprocessing, action selection, buffer writes, updates and checkpointing) by root process
+    trace_epoch : epoch to record a timeline of (python phases of training loop, per-op timings of
+    tf session runs and MPI collective calls) for all processes, written to trace.json in output
+    directory in Chrome trace format. If None no timeline is recorded.
+    track_memory : whether to log memory used by buffer and tf variables, tf graph op count and
+    peak memory usage each epoch (for root process)
+    profile_mpi : whether to log calls, bytes sent and time spent in MPI collectives, and wait
+    time and load imbalance between processes, aggregated over all processes each epoch
     """
     seed += 10000 * mpi.proc_id()
     tf.set_random_seed(seed)
     np.random.seed(seed)
 
     if mpi.proc_id() == 0:
-        logger = log.Logger(**logger_kwargs)
-        logger.save_config(locals())
+        logger = log.Logger(resume_from=resume_from, **logger_kwargs)
+        logger.save_config(locals(), algo="a2c")
 
     # 2. Initialize environment
     env = env_fn()
@@ -116,106 +140,192 @@ def a2c(env_fn, hidden_sizes=[64, 64], epochs=50, steps_per_epoch=4000, pi_lr=3e
     ret_ph = tf.placeholder(tf.float32, shape=(None, ))
     adv_ph = tf.placeholder(tf.float32, shape=(None, ))
 
-    # 3b.Create global policy and value networks
-    pi, pi_logp, v = core.mlp_actor_critic(obs_ph, act_ph, env.action_space, hidden_sizes)
+    # epoch batch is loaded into graph once and then reused by all loss and train ops
+    local_steps_per_epoch = int(steps_per_epoch / mpi.num_procs())
+    batch_phs = [obs_ph, act_ph, ret_ph, adv_ph]
+    (obs_ph, act_ph, ret_ph, adv_ph), load_batch_op = utils.batch_inputs(batch_phs,
+                                                                         local_steps_per_epoch)
+
+    with xla.jit_scope(xla_compile):
+        # 3b.Create global policy and value networks
+        pi, pi_logp, v = core.mlp_actor_critic(obs_ph, act_ph, env.action_space, hidden_sizes)
 
-    # 4. Define global losses
-    pi_loss = -tf.reduce_mean(pi_logp * adv_ph)
-    v_loss = tf.reduce_mean((ret_ph - v)**2)
+        # 4. Define global losses
+        pi_loss = -tf.reduce_mean(pi_logp * adv_ph)
+        v_loss = tf.reduce_mean((ret_ph - v)**2)
 
     # 5. Define multiprocessor training ops
     pi_train_op = mpi.MPIAdamOptimizer(learning_rate=pi_lr).minimize(pi_loss)
     v_train_op = mpi.MPIAdamOptimizer(learning_rate=vf_lr).minimize(v_loss)
 
     # 6. Initialize buffer
-    local_steps_per_epoch = int(steps_per_epoch / mpi.num_procs())
     buf = ReplayBuffer(obs_dim, act_dim, local_steps_per_epoch)
 
     # 8. Create tf session
-    sess = tf.Session()
+    # benchmark excludes train ops, since they run MPI collectives
+    benchmark = [([pi_loss, v_loss], session.zeros_feed([obs_ph, act_ph, ret_ph, adv_ph],
+                                                       local_steps_per_epoch)),
+                 ([pi, v], session.zeros_feed([obs_ph]))]
+    sess = session.make_session(exec_config, benchmark, mpi.proc_id() == 0)
     sess.run(tf.global_variables_initializer())
-
-    # 9. Sync all params across processes
-    sess.run(mpi.sync_all_params())
+    sess.run(tf.local_variables_initializer())
 
     if mpi.proc_id() == 0:
         # only save model of one cpu
         logger.setup_tf_model_saver(sess, env, {log.OBS_NAME: obs_ph}, {log.ACTS_NAME: pi})
 
+    start_epoch, total_time = 0, 0
+    if resume_from is not None:
+        # root restores saved state and sends each process its own random number generator state
+        proc_rng_states, progress = None, None
+        if mpi.proc_id() == 0:
+            state = logger.restore_train_state(env)
+            proc_rng_states = state["proc_rng_states"]
+            assert len(proc_rng_states) == mpi.num_procs(), \
+                "Must resume with same number of processes as saved run"
+            progress = (state["epoch"] + 1, state["total_time"])
+        log.set_rng_state(mpi.scatter_obj(proc_rng_states), env)
+        start_epoch, total_time = mpi.broadcast_obj(progress)
+
+    # 9. Sync all params across processes
+    sess.run(mpi.sync_all_params())
+
+    tracer = trace.TraceRecorder(pid=mpi.proc_id())
+    compile_timer = xla.CompileTimer(xla_compile)
+    phase_timer = timer.PhaseTimer(time_phases, ["env_step", "preprocess", "act", "buffer",
+                                                 "update", "checkpoint"], tracer)
+    mem_tracker = memory.MemoryTracker(track_memory)
+    mem_tracker.register("buffer", buf)
+
+    def run_op(name, fetches, feed_dict=None):
+        """ Run fetches in session, traced while tracer is recording and timing XLA compile """
+        with compile_timer.time(name):
+            return tracer.run(sess, fetches, feed_dict)
+
+    comm_profiler = mpi.CommProfiler(profile_mpi)
+
     def get_action(o):
-        a, v_t = sess.run([pi, v], {obs_ph: o.reshape(1, -1)})
+        a, v_t = run_op("act", [pi, v], {obs_ph: o.reshape(1, -1)})
         return a[0], v_t[0]
 
     def update():
         batch = buf.get()
-        input_dict = {obs_ph: batch[0],
-                      act_ph: batch[1],
-                      ret_ph: batch[2],
-                      adv_ph: batch[3]}
+        sess.run(load_batch_op, feed_dict=dict(zip(batch_phs, batch[:4])))
 
-        pi_l, v_l = sess.run([pi_loss, v_loss], feed_dict=input_dict)
+        pi_l, v_l = run_op("loss", [pi_loss, v_loss])
 
         # policy grad step
-        sess.run([pi_train_op], feed_dict=input_dict)
+        run_op("pi_train", [pi_train_op])
 
         for _ in range(train_v_iters):
             # value func grad step
-            sess.run([v_train_op], feed_dict=input_dict)
+            run_op("v_train", [v_train_op])
 
         return pi_l, v_l
 
     # 9. The training loop
-    total_time = 0
-    for epoch in range(epochs):
+    for epoch in range(start_epoch, epochs):
+        if epoch == trace_epoch:
+            tracer.start()
+            mpi.add_comm_observer(tracer.comm_event)
 
         epoch_start = time.time()
 
         o, r, d = preprocess_fn(env.reset(), env), 0, False
-        ep_rews, ep_steps = [], []
+        ep_rews, ep_steps, ep_end_times = [], [], []
         ep_r, ep_t = 0, 0
 
         for t in range(local_steps_per_epoch):
 
-            a, v_t = get_action(o)
-            o2, r, d, _ = env.step(a)
-            o2 = preprocess_fn(o2, env)
+            with phase_timer.phase("act"):
+                a, v_t = get_action(o)
+            with phase_timer.phase("env_step"):
+                o2, r, d, _ = env.step(a)
+            with phase_timer.phase("preprocess"):
+                o2 = preprocess_fn(o2, env)
 
             ep_r += r
             ep_t += 1
 
             if d or t == local_steps_per_epoch-1:
-                r = r if d else sess.run(v, {obs_ph: o2.reshape(1, -1)})
-                buf.store(o, a, r, v_t)
-                buf.finish_path()
+                if not d:
+                    with phase_timer.phase("act"):
+                        r = run_op("val", v, {obs_ph: o2.reshape(1, -1)})
+                with phase_timer.phase("buffer"):
+                    buf.store(o, a, r, v_t)
+                    buf.finish_path()
                 if d:
                     # only save if episode done
                     ep_rews.append(ep_r)
                     ep_steps.append(ep_t)
+                    ep_end_times.append(time.time())
                 ep_r, ep_t = 0, 0
-                o, r, d = preprocess_fn(env.reset(), env), 0, False
+                with phase_timer.phase("env_step"):
+                    o, r, d = env.reset(), 0, False
+                with phase_timer.phase("preprocess"):
+                    o = preprocess_fn(o, env)
             else:
-                buf.store(o, a, r, v_t)
+                with phase_timer.phase("buffer"):
+                    buf.store(o, a, r, v_t)
                 o = o2
 
-        epoch_pi_loss, epoch_v_loss = update()
+        with phase_timer.phase("update"):
+            epoch_pi_loss, epoch_v_loss = update()
 
         epoch_time = time.time() - epoch_start
         total_time += epoch_time
+        comm_profiler.end_epoch(epoch_time)
+        # episode stats and losses over all processes, not just root
+        epoch_stats = mpi.gather_stats({"return": ep_rews, "ep_len": ep_steps,
+                                        "pi_loss": [epoch_pi_loss], "v_loss": [epoch_v_loss]})
+        save = (save_freq != 0 and epoch % save_freq == 0) or epoch == epochs-1
+        # each process has its own random number generator states, which are needed to resume
+        proc_rng_states = mpi.gather_obj(log.get_rng_state(env)) if save else None
+        # episodes of all processes are logged by root, gathered once per epoch
+        proc_episodes = mpi.gather_obj((ep_rews, ep_steps, ep_end_times))
         if mpi.proc_id() == 0:
+            for rets, lens, end_times in proc_episodes:
+                for ep in zip(rets, lens, end_times):
+                    logger.log_episode(*ep)
             logger.log_tabular("epoch", epoch)
-            logger.log_tabular("pi_loss", epoch_pi_loss)
-            logger.log_tabular("v_loss", epoch_v_loss)
-            logger.log_tabular("avg_return", np.mean(ep_rews))
-            logger.log_tabular("avg_ep_lens", np.mean(ep_steps))
+            logger.log_tabular("pi_loss", epoch_stats["pi_loss"]["mean"])
+            logger.log_tabular("v_loss", epoch_stats["v_loss"]["mean"])
+            logger.log_tabular("avg_return", epoch_stats["return"]["mean"])
+            logger.log_tabular("std_return", epoch_stats["return"]["std"])
+            logger.log_tabular("min_return", epoch_stats["return"]["min"])
+            logger.log_tabular("max_return", epoch_stats["return"]["max"])
+            logger.log_tabular("avg_ep_lens", epoch_stats["ep_len"]["mean"])
+            logger.log_tabular("num_eps", epoch_stats["return"]["count"])
             logger.log_tabular("epoch_time", epoch_time)
             logger.log_tabular("time", total_time)
+            if xla_compile:
+                logger.log_tabular("compile_time", compile_timer.total)
             training_time_left = utils.training_time_left(epoch, epochs, epoch_time)
             logger.log_tabular("time_rem", training_time_left)
+            # checkpoint time is for save at end of previous epoch
+            phase_timer.log_tabular(logger)
+            mem_tracker.log_tabular(logger)
+            comm_profiler.log_tabular(logger)
             logger.dump_tabular()
 
-            if (save_freq != 0 and epoch % save_freq == 0) or epoch == epochs-1:
-                itr = None if overwrite_save else epoch
-                logger.save_model(itr)
+            if save:
+                with phase_timer.phase("checkpoint"):
+                    itr = None if overwrite_save else epoch
+                    logger.save_model(itr, dict(epoch=epoch, total_time=total_time,
+                                                proc_rng_states=proc_rng_states), env)
+
+        if epoch == trace_epoch:
+            tracer.stop()
+            mpi.remove_comm_observer(tracer.comm_event)
+            # combine timelines of all processes into single trace
+            proc_events = mpi.gather_obj(tracer.events)
+            if mpi.proc_id() == 0:
+                trace.write_trace(os.path.join(logger.output_dir, trace.TRACE_FNAME),
+                                  [e for events in proc_events for e in events])
+
+    comm_profiler.close()
+    if mpi.proc_id() == 0:
+        logger.close()
 
 
 if __name__ == "__main__":
@@ -233,7 +343,13 @@ if __name__ == "__main__":
     parser.add_argument("--seed", type=int, default=0)
     parser.add_argument("--render", action="store_true")
     parser.add_argument("--renderlast", action="store_true")
+    parser.add_argument("--xla", action="store_true")
     parser.add_argument("--exp_name", type=str, default=None)
+    parser.add_argument("--resume_from", type=str, default=None)
+    parser.add_argument("--time_phases", action="store_true")
+    parser.add_argument("--trace_epoch", type=int, default=None)
+    parser.add_argument("--track_memory", action="store_true")
+    parser.add_argument("--profile_mpi", action="store_true")
     args = parser.parse_args()
 
     # 1. fork
@@ -253,4 +369,7 @@ if __name__ == "__main__":
     a2c(lambda: gym.make(args.env), hidden_sizes=args.hidden_sizes, epochs=args.epochs,
         steps_per_epoch=args.steps, pi_lr=args.pi_lr, vf_lr=args.vf_lr, seed=args.seed,
         train_v_iters=args.train_v_iters, gamma=args.gamma, logger_kwargs=logger_kwargs,
-        preprocess_fn=preprocess_fn, obs_dim=obs_dim)
+        preprocess_fn=preprocess_fn, obs_dim=obs_dim, xla_compile=args.xla,
+        resume_from=args.resume_from, time_phases=args.time_phases,
+        trace_epoch=args.trace_epoch, track_memory=args.track_memory,
+        profile_mpi=args.profile_mpi)
@@ -10,7 +10,9 @@ import numpy as np
 import tensorflow as tf
 import rlalgs.utils.logger as log
 import rlalgs.utils.utils as utils
+import rlalgs.utils.session as session
 import rlalgs.algos.basicpg.core as core
+import rlalgs.utils.preprocess as preprocess
 from rlalgs.utils.logger import Logger
 
 # Just disables the warning, doesn't enable AVX/FMA
@@ -53,7 +55,8 @@ def r2g_finish_path(ptr, path_start_idx, rew_buf):
 
 
 def r2gpg(env_fn, hidden_sizes=[32], lr=1e-2, epochs=50, batch_size=5000,
-          seed=0, render=False, render_last=False):
+          seed=0, render=False, render_last=False, logger_kwargs=dict(), save_freq=10,
+          exec_config=None, resume_from=None):
     """
     Simple Reward-to-Go Policy Gradient
 
@@ -67,6 +70,13 @@ def r2gpg(env_fn, hidden_sizes=[32], lr=1e-2, epochs=50, batch_size=5000,
     seed : random seed
     render : whether to render environment or not
     render_last : whether to render environment after final epoch
+    logger_kwargs : dictionary of keyword arguments for logger
+    save_freq : number of epochs between model saves (always atleast saves at end of training)
+    exec_config : tf session execution config (threads, cpu affinity, graph optimizer options and
+        auto-tuning) as dict of kwargs or rlalgs.utils.session.ExecConfig
+    resume_from : output directory of a run to resume training from. Training continues from the
+        training state saved with the run's last model save (network, optimizer, random number
+        generator and logger state).
     """
     print("Setting seeds")
     tf.set_random_seed(seed)
@@ -76,7 +86,9 @@ def r2gpg(env_fn, hidden_sizes=[32], lr=1e-2, epochs=50, batch_size=5000,
     env = env_fn()
 
     print("Initializing logger")
-    logger = Logger(output_fname="r2gpg_" + env.spec.id + ".txt")
+    logger_kwargs = dict(dict(output_fname="r2gpg_" + env.spec.id + ".txt"), **logger_kwargs)
+    logger = Logger(resume_from=resume_from, **logger_kwargs)
+    logger.save_config(locals(), algo="r2gpg")
 
     print("Building network")
     obs_ph = utils.placeholder_from_space(env.observation_space, obs_space=True, name=log.OBS_NAME)
@@ -95,9 +107,13 @@ def r2gpg(env_fn, hidden_sizes=[32], lr=1e-2, epochs=50, batch_size=5000,
     buf = core.SimpleBuffer(r2g_finish_path)
 
     print("Launching tf session")
-    sess = tf.Session()
+    benchmark = [([loss, train_op], session.zeros_feed([obs_ph, act_ph, return_ph], batch_size)),
+                 (actions, session.zeros_feed([obs_ph]))]
+    sess = session.make_session(exec_config, benchmark)
     sess.run(tf.global_variables_initializer())
 
+    logger.setup_tf_model_saver(sess, env, {log.OBS_NAME: obs_ph}, {log.ACTS_NAME: actions})
+
     def train_one_epoch():
         o, r, d = env.reset(), 0, False
         finished_rendering_this_epoch = False
@@ -109,7 +125,7 @@ def r2gpg(env_fn, hidden_sizes=[32], lr=1e-2, epochs=50, batch_size=5000,
             # render first episode of each epoch
             if not finished_rendering_this_epoch and render:
                 env.render()
-            o = utils.process_obs(o, env.observation_space)
+            o = preprocess.preprocess_obs(o, env)
             # select action for current obs
             a = sess.run(actions, {obs_ph: o.reshape(1, -1)})[0]
             # store step
@@ -125,6 +141,7 @@ def r2gpg(env_fn, hidden_sizes=[32], lr=1e-2, epochs=50, batch_size=5000,
                 finished_rendering_this_epoch = True
                 batch_ep_lens.append(ep_len)
                 batch_ep_rets.append(ep_ret)
+                logger.log_episode(ep_ret, ep_len)
                 ep_len, ep_ret = 0, 0
                 # finish epoch
                 if buf.size() > batch_size:
@@ -141,8 +158,12 @@ def r2gpg(env_fn, hidden_sizes=[32], lr=1e-2, epochs=50, batch_size=5000,
                                  })
         return batch_loss, batch_ep_rets, batch_ep_lens
 
+    start_epoch = 0
+    if resume_from is not None:
+        start_epoch = logger.restore_train_state(env)["epoch"] + 1
+
     # training loop
-    for i in range(epochs):
+    for i in range(start_epoch, epochs):
         batch_loss, batch_ep_rets, batch_ep_lens = train_one_epoch()
         logger.log_tabular("epoch", i)
         logger.log_tabular("loss", batch_loss)
@@ -150,8 +171,10 @@ def r2gpg(env_fn, hidden_sizes=[32], lr=1e-2, epochs=50, batch_size=5000,
         logger.log_tabular("avg_ep_lens", np.mean(batch_ep_lens))
         logger.dump_tabular()
 
-    log.save_model(sess, "r2gpg_" + env.spec.id, env, {log.OBS_NAME: obs_ph},
-                   {log.ACTS_NAME: actions})
+        if (save_freq != 0 and i % save_freq == 0) or i == epochs-1:
+            logger.save_model(train_state=dict(epoch=i), env=env)
+
+    logger.close()
 
     if render_last:
         input("Press enter to view final policy in action")
@@ -160,6 +183,7 @@ def r2gpg(env_fn, hidden_sizes=[32], lr=1e-2, epochs=50, batch_size=5000,
         finished_rendering_this_epoch = False
         while not finished_rendering_this_epoch:
             env.render()
+            o = preprocess.preprocess_obs(o, env)
             a = sess.run(actions, {obs_ph: o.reshape(1, -1)})[0]
             o, r, d, _ = env.step(a)
             final_ret += r
@@ -177,9 +201,11 @@ if __name__ == "__main__":
     parser.add_argument("--lr", type=float, default=1e-2)
     parser.add_argument("--epochs", type=int, default=50)
     parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--resume_from", type=str, default=None)
     args = parser.parse_args()
 
     print("\nSimple Reward-to-Go Policy Gradient")
     print("Training on the " + args.env + "environment\n")
     r2gpg(lambda: gym.make(args.env), epochs=args.epochs, lr=args.lr,
-          seed=args.seed, render=args.render, render_last=args.renderlast)
+          seed=args.seed, render=args.render, render_last=args.renderlast,
+          resume_from=args.resume_from)
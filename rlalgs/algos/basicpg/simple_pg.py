@@ -12,7 +12,9 @@ N.B. some of the code is extra verbose to help with understanding
 import gym
 import numpy as np
 import tensorflow as tf
+import rlalgs.utils.logger as log
 import rlalgs.utils.utils as utils
+import rlalgs.utils.session as session
 import rlalgs.algos.basicpg.core as core
 import rlalgs.utils.preprocess as preprocess
 
@@ -47,7 +49,8 @@ def simple_finish_path(ptr, path_start_idx, rew_buf):
 
 
 def simplepg(env_fn, hidden_sizes=[32], lr=1e-2, epochs=50, batch_size=5000,
-             seed=0, render=False, render_last=False):
+             seed=0, render=False, render_last=False, logger_kwargs=dict(), save_freq=10,
+             exec_config=None, resume_from=None):
     """
     Simple Policy Gradient
 
@@ -61,6 +64,13 @@ def simplepg(env_fn, hidden_sizes=[32], lr=1e-2, epochs=50, batch_size=5000,
     seed : random seed
     render : whether to render environment or not
     render_last : whether to render environment after final epoch
+    logger_kwargs : dictionary of keyword arguments for logger
+    save_freq : number of epochs between model saves (always atleast saves at end of training)
+    exec_config : tf session execution config (threads, cpu affinity, graph optimizer options and
+        auto-tuning) as dict of kwargs or rlalgs.utils.session.ExecConfig
+    resume_from : output directory of a run to resume training from. Training continues from the
+        training state saved with the run's last model save (network, optimizer, random number
+        generator and logger state).
     """
 
     print("Setting seeds")
@@ -71,7 +81,9 @@ def simplepg(env_fn, hidden_sizes=[32], lr=1e-2, epochs=50, batch_size=5000,
     env = env_fn()
 
     print("Initializing logger")
-    # logger = Logger(output_fname="simple_pg" + env.spec._env_name + ".txt")
+    logger_kwargs = dict(dict(output_fname="simplepg_" + env.spec.id + ".txt"), **logger_kwargs)
+    logger = log.Logger(resume_from=resume_from, **logger_kwargs)
+    logger.save_config(locals(), algo="simplepg")
 
     print("Building network")
     obs_ph = utils.placeholder_from_space(env.observation_space, obs_space=True)
@@ -90,9 +102,13 @@ def simplepg(env_fn, hidden_sizes=[32], lr=1e-2, epochs=50, batch_size=5000,
     buf = core.SimpleBuffer(simple_finish_path)
 
     print("Launching tf session")
-    sess = tf.Session()
+    benchmark = [([loss, train_op], session.zeros_feed([obs_ph, act_ph, return_ph], batch_size)),
+                 (actions, session.zeros_feed([obs_ph]))]
+    sess = session.make_session(exec_config, benchmark)
     sess.run(tf.global_variables_initializer())
 
+    logger.setup_tf_model_saver(sess, env, {log.OBS_NAME: obs_ph}, {log.ACTS_NAME: actions})
+
     def train_one_epoch():
         o, r, d = env.reset(), 0, False
         finished_rendering_this_epoch = False
@@ -119,6 +135,7 @@ def simplepg(env_fn, hidden_sizes=[32], lr=1e-2, epochs=50, batch_size=5000,
                 o, r, d = env.reset(), 0, False
                 finished_rendering_this_epoch = True
                 batch_ep_lens.append(ep_len)
+                logger.log_episode(ep_ret, ep_len)
                 ep_len = 0
                 batch_ep_rets.append(ep_ret)
                 ep_ret = 0
@@ -136,13 +153,23 @@ def simplepg(env_fn, hidden_sizes=[32], lr=1e-2, epochs=50, batch_size=5000,
                                  })
         return batch_loss, batch_ep_rets, batch_ep_lens
 
+    start_epoch = 0
+    if resume_from is not None:
+        start_epoch = logger.restore_train_state(env)["epoch"] + 1
+
     print("Starting training")
-    for i in range(epochs):
+    for i in range(start_epoch, epochs):
         batch_loss, batch_ep_rets, batch_ep_lens = train_one_epoch()
-        print("\nepoch", i)
-        print("loss", batch_loss)
-        print("avg_return", np.mean(batch_ep_rets))
-        print("avg_ep_lens", np.mean(batch_ep_lens))
+        logger.log_tabular("epoch", i)
+        logger.log_tabular("loss", batch_loss)
+        logger.log_tabular("avg_return", np.mean(batch_ep_rets))
+        logger.log_tabular("avg_ep_lens", np.mean(batch_ep_lens))
+        logger.dump_tabular()
+
+        if (save_freq != 0 and i % save_freq == 0) or i == epochs-1:
+            logger.save_model(train_state=dict(epoch=i), env=env)
+
+    logger.close()
 
     if render_last:
         input("Press enter to view final policy in action")
@@ -169,8 +196,10 @@ if __name__ == "__main__":
     parser.add_argument("--lr", type=float, default=1e-2)
     parser.add_argument("--epochs", type=int, default=50)
     parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--resume_from", type=str, default=None)
     args = parser.parse_args()
 
     print("\nSimple Policy Gradient")
     simplepg(lambda: gym.make(args.env), epochs=args.epochs, lr=args.lr,
-             seed=args.seed, render=args.render, render_last=args.renderlast)
+             seed=args.seed, render=args.render, render_last=args.renderlast,
+             resume_from=args.resume_from)
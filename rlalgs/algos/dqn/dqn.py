@@ -6,8 +6,14 @@ import time
 import numpy as np
 import tensorflow as tf
 from gym.spaces import Discrete
+import rlalgs.utils.xla as xla
+import rlalgs.utils.timer as timer
+import rlalgs.utils.trace as trace
+import rlalgs.utils.memory as memory
+import rlalgs.utils.session as session
 import rlalgs.utils.logger as log
 import rlalgs.utils.utils as utils
+import rlalgs.utils.frames as frames
 import rlalgs.algos.dqn.core as core
 import rlalgs.utils.preprocess as preprocess
 
@@ -16,6 +22,10 @@ import os
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
 
 
+# max number of times cut short experiences are resampled before sampling from valid experiences
+MAX_RESAMPLES = 10
+
+
 class DQNReplayBuffer:
     """
     Replay buffer for DQN
@@ -24,33 +34,86 @@ class DQNReplayBuffer:
     Returns a random subset of experiences for training
 
     Stores only the c most recent experiences, where c is the capacity of the buffer
+
+    If frame_stack > 1, each frame is stored only once and stacked observations for o and o_prime
+    are assembled from the ring buffer when sampling.
     """
 
-    def __init__(self, obs_dim, act_dim, capacity):
+    def __init__(self, obs_dim, act_dim, capacity, frame_stack=1):
+        """
+        Arguments:
+            obs_dim : the dimensions of an environment observation (a single frame if stacking)
+            act_dim : the dimensions of an environment action
+            capacity : max number of experiences to store
+            frame_stack : number of consecutive frames in an observation
+        """
         self.obs_buf = np.zeros(utils.combined_shape(capacity, obs_dim), dtype=np.float32)
         self.act_buf = np.zeros(utils.combined_shape(capacity, act_dim), dtype=np.float32)
         self.rew_buf = np.zeros(capacity, dtype=np.float32)
-        self.obs_prime_buf = np.zeros(utils.combined_shape(capacity, obs_dim), dtype=np.float32)
+        if frame_stack == 1:
+            self.obs_prime_buf = np.zeros(utils.combined_shape(capacity, obs_dim), dtype=np.float32)
+        else:
+            # o_t+1 is the frame of the next step stored, so only need to track episode ends
+            self.ep_end_buf = np.zeros(capacity, dtype=np.bool_)
         self.done_buf = np.zeros(capacity, dtype=np.float32)
         self.ptr, self.size = 0, 0
+        # number of stored experiences where episode was cut short (frame stacking only)
+        self.num_cut_short = 0
         self.capacity = capacity
+        self.frame_stack = frame_stack
 
     def store(self, o, a, r, o_prime, d):
         """
         Store an experience (o_t, a_t, r_t, o_t+1, d_t) in the buffer
+
+        If frame stacking, o and o_prime are the newest single frames and o_prime is not stored
+        since it is the frame of the next experience.
         """
+        if self.frame_stack > 1 and self._is_cut_short(self.ptr):
+            self.num_cut_short -= 1
         self.obs_buf[self.ptr] = o
         self.act_buf[self.ptr] = a
         self.rew_buf[self.ptr] = r
-        self.obs_prime_buf[self.ptr] = o_prime
+        if self.frame_stack == 1:
+            self.obs_prime_buf[self.ptr] = o_prime
+        else:
+            self.ep_end_buf[self.ptr] = d
         self.done_buf[self.ptr] = d
         self.ptr = (self.ptr+1) % self.capacity
         self.size = min(self.size+1, self.capacity)
 
+    def end_episode(self):
+        """
+        Mark the last stored experience as the end of an episode that was cut short (i.e. not
+        done), so frames are not stacked across it. Only needed when frame stacking.
+        """
+        if self.frame_stack > 1 and self.size > 0:
+            newest = (self.ptr-1) % self.capacity
+            if not self.ep_end_buf[newest] and self.done_buf[newest] == 0:
+                self.num_cut_short += 1
+            self.ep_end_buf[newest] = True
+
+    def _is_cut_short(self, idx):
+        return self.ep_end_buf[idx] and self.done_buf[idx] == 0
+
+    def can_sample(self):
+        """
+        Whether enough experiences are stored to sample from buffer
+        """
+        if self.frame_stack == 1:
+            return self.size > 0
+        if self.size <= 1:
+            return False
+        # newest experience and experiences where episode was cut short are never sampled
+        newest_cut_short = int(self._is_cut_short((self.ptr-1) % self.capacity))
+        return self.size - 1 - (self.num_cut_short - newest_cut_short) > 0
+
     def sample(self, num_samples):
         """
         Get a num_samples random samples from the replay buffer
         """
+        if self.frame_stack > 1:
+            return self._sample_stacked(num_samples)
         sample_idxs = np.random.choice(self.size, num_samples)
         return {"o": self.obs_buf[sample_idxs],
                 "a": self.act_buf[sample_idxs],
@@ -58,11 +121,164 @@ class DQNReplayBuffer:
                 "o_prime": self.obs_prime_buf[sample_idxs],
                 "d": self.done_buf[sample_idxs]}
 
+    def _sample_stacked(self, num_samples):
+        """
+        Sample experiences, assembling stacked observations from stored frames
+        """
+        oldest = self.ptr if self.size == self.capacity else 0
+        # newest experience has no next frame stored yet so is never sampled
+        sample_idxs = (oldest + np.random.randint(0, self.size-1, num_samples)) % self.capacity
+        # nor are experiences where episode was cut short, since next frame is from new episode
+        cut_short = self.ep_end_buf[sample_idxs] & (self.done_buf[sample_idxs] == 0)
+        for _ in range(MAX_RESAMPLES):
+            if not cut_short.any():
+                break
+            resampled = np.random.randint(0, self.size-1, cut_short.sum())
+            sample_idxs[cut_short] = (oldest + resampled) % self.capacity
+            cut_short = self.ep_end_buf[sample_idxs] & (self.done_buf[sample_idxs] == 0)
+        if cut_short.any():
+            # most experiences are cut short (e.g. very short buffer), so sample from the rest
+            idxs = (oldest + np.arange(self.size-1)) % self.capacity
+            valid = idxs[~(self.ep_end_buf[idxs] & (self.done_buf[idxs] == 0))]
+            assert len(valid) > 0, "No experiences in buffer can be sampled, check can_sample"
+            sample_idxs[cut_short] = np.random.choice(valid, cut_short.sum())
+
+        next_idxs = (sample_idxs + 1) % self.capacity
+        return {"o": frames.stack_frames(self.obs_buf, sample_idxs, self.frame_stack, oldest,
+                                         self.ep_end_buf),
+                "a": self.act_buf[sample_idxs],
+                "r": self.rew_buf[sample_idxs],
+                "o_prime": frames.stack_frames(self.obs_buf, next_idxs, self.frame_stack, oldest,
+                                               self.ep_end_buf),
+                "d": self.done_buf[sample_idxs]}
+
+    def get_state(self):
+        """
+        Get buffer contents and position, for saving training state (arrays are not copied)
+        """
+        return {k: v for k, v in vars(self).items() if k not in ("capacity", "frame_stack")}
+
+    def set_state(self, state):
+        """
+        Restore buffer contents and position from get_state
+        """
+        assert state["obs_buf"].shape == self.obs_buf.shape, \
+            "Saved replay buffer has different shape to buffer"
+        vars(self).update(state)
+        if self.frame_stack > 1:
+            # recount, since states saved before it was tracked don't include it
+            self.num_cut_short = int(np.sum(self.ep_end_buf & (self.done_buf == 0)))
+
+
+class DQNGraphReplayBuffer:
+    """
+    Replay buffer for DQN stored in tf variables, so minibatches are sampled in graph
+
+    Experiences are staged in a small chunk and written to the buffer variables with a single
+    scatter once the chunk is full. The tensors from sample_tensors draw a new random minibatch
+    each time they are run.
+
+    Stores only the c most recent experiences, where c is the capacity of the buffer
+    """
+
+    def __init__(self, obs_dim, act_dim, capacity, chunk_size=64, act_dtype=tf.int32):
+        """
+        Arguments:
+            obs_dim : the dimensions of an environment observation
+            act_dim : the dimensions of an environment action
+            capacity : max number of experiences to store
+            chunk_size : number of experiences staged before writing to buffer
+            act_dtype : tf dtype of actions
+        """
+        self.chunk = DQNReplayBuffer(obs_dim, act_dim, chunk_size)
+        self.ptr, self.size = 0, 0
+        self.capacity = capacity
+
+        shapes = {"o": utils.combined_shape(capacity, obs_dim),
+                  "a": utils.combined_shape(capacity, act_dim),
+                  "r": (capacity, ),
+                  "o_prime": utils.combined_shape(capacity, obs_dim),
+                  "d": (capacity, )}
+        dtypes = {"o": tf.float32, "a": act_dtype, "r": tf.float32, "o_prime": tf.float32,
+                  "d": tf.float32}
+        # local variables so buffer is not saved with model
+        self.buf_vars, self.chunk_phs, scatters = {}, {}, []
+        self.idxs_ph = tf.placeholder(tf.int32, shape=(None, ))
+        for k, shape in shapes.items():
+            self.buf_vars[k] = tf.Variable(tf.zeros(shape, dtypes[k]), trainable=False,
+                                           collections=[tf.GraphKeys.LOCAL_VARIABLES])
+            self.chunk_phs[k] = tf.placeholder(dtypes[k], shape=(None, ) + shape[1:])
+            scatters.append(tf.scatter_update(self.buf_vars[k], self.idxs_ph, self.chunk_phs[k]))
+        self.size_var = tf.Variable(0, dtype=tf.int32, trainable=False,
+                                    collections=[tf.GraphKeys.LOCAL_VARIABLES])
+        self.size_ph = tf.placeholder(tf.int32, shape=())
+        scatters.append(tf.assign(self.size_var, self.size_ph))
+        self.flush_op = tf.group(scatters)
+
+    def store(self, o, a, r, o_prime, d):
+        """
+        Stage an experience (o_t, a_t, r_t, o_t+1, d_t) for writing to buffer
+        """
+        self.chunk.store(o, a, r, o_prime, d)
+
+    def flush(self, sess, force=False):
+        """
+        Write staged experiences to buffer, if staging chunk is full (or force is True)
+        """
+        n = self.chunk.size
+        if n == 0 or (n < self.chunk.capacity and not force):
+            return
+        idxs = (self.ptr + np.arange(n)) % self.capacity
+        self.ptr = (self.ptr + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+        feed_dict = {self.idxs_ph: idxs, self.size_ph: self.size,
+                     self.chunk_phs["o"]: self.chunk.obs_buf[:n],
+                     self.chunk_phs["a"]: self.chunk.act_buf[:n],
+                     self.chunk_phs["r"]: self.chunk.rew_buf[:n],
+                     self.chunk_phs["o_prime"]: self.chunk.obs_prime_buf[:n],
+                     self.chunk_phs["d"]: self.chunk.done_buf[:n]}
+        sess.run(self.flush_op, feed_dict)
+        self.chunk.ptr, self.chunk.size = 0, 0
+
+    def can_sample(self):
+        """
+        Whether any experiences have been written to buffer
+        """
+        return self.size > 0
+
+    def sample_tensors(self, num_samples):
+        """
+        Get tensors for a random minibatch of num_samples experiences, sampled in graph
+        """
+        sample_idxs = tf.random_uniform((num_samples, ), 0, self.size_var, dtype=tf.int32)
+        return {k: tf.gather(v, sample_idxs) for k, v in self.buf_vars.items()}
+
+    def get_state(self, sess):
+        """
+        Get buffer contents and position, for saving training state. Staged experiences are
+        written to buffer first.
+        """
+        self.flush(sess, force=True)
+        state = sess.run(self.buf_vars)
+        state.update(ptr=self.ptr, size=self.size)
+        return state
+
+    def set_state(self, sess, state):
+        """
+        Restore buffer contents and position from get_state
+        """
+        for k, v in self.buf_vars.items():
+            v.load(state[k], sess)
+        self.ptr, self.size = state["ptr"], state["size"]
+        self.size_var.load(self.size, sess)
+
 
 def dqn(env_fn, hidden_sizes=[64, 64], lr=1e-3, epochs=50, epoch_steps=10000, batch_size=32,
         seed=0, replay_size=100000, epsilon=0.05, gamma=0.99, polyak=0.995, start_steps=100000,
         target_update_freq=1, render=False, render_last=False, logger_kwargs=dict(), save_freq=10,
-        overwrite_save=True, preprocess_fn=None, obs_dim=None):
+        overwrite_save=True, preprocess_fn=None, obs_dim=None, frame_stack=1, graph_replay=False,
+        xla_compile=False, exec_config=None, resume_from=None, save_replay=False,
+        time_phases=False, trace_epoch=None, track_memory=False, log_updates=False):
     """
     Deep Q-network with experience replay
 
@@ -92,16 +308,41 @@ def dqn(env_fn, hidden_sizes=[64, 64], lr=1e-3, epochs=50, epoch_steps=10000, ba
         done apart for handling reshaping for discrete observation spaces)
     obs_dim : dimensions for observations (if None then dimensions extracted from environment
         observation space)
+    frame_stack : number of most recent frames (i.e. preprocessed observations) stacked to form
+        the network input
+    graph_replay : whether to store replay buffer in tf variables and sample minibatches in graph
+        (not supported with frame_stack > 1)
+    xla_compile : whether to compile the acting, loss, gradient and optimizer ops with XLA
+    exec_config : tf session execution config (threads, cpu affinity, graph optimizer options and
+        auto-tuning) as dict of kwargs or rlalgs.utils.session.ExecConfig
+    resume_from : output directory of a run to resume training from. Training continues from the
+        training state saved with the run's last model save (networks, optimizer, step count,
+        replay buffer if saved, random number generator and logger state).
+    save_replay : whether to include replay buffer in saved training state (if False, resumed
+        training starts with an empty replay buffer). Off by default since a large buffer (e.g.
+        of image observations) takes many GB and stalls training at each save.
+    time_phases : whether to log time spent in each phase of the training loop (env steps,
+        preprocessing, action selection, buffer writes, sampling, train steps, target updates and
+        checkpointing)
+    trace_epoch : epoch to record a timeline of (python phases of training loop and per-op
+        timings of tf session runs), written to trace.json in output directory in Chrome trace
+        format. If None no timeline is recorded.
+    track_memory : whether to log memory used by replay buffer and tf variables, tf graph op count
+        and peak memory usage each epoch
+    log_updates : whether to log the step and loss of every update to the "updates" event log
+        (see rlalgs.utils.logger.Logger.event_log)
     """
     assert target_update_freq <= epoch_steps, \
         "must have target_update_freq <= epoch_steps, else no learning will be done.."
+    assert not (graph_replay and frame_stack > 1), \
+        "graph_replay is not supported with frame stacking"
 
     tf.reset_default_graph()
     tf.set_random_seed(seed)
     np.random.seed(seed)
 
-    logger = log.Logger(**logger_kwargs)
-    logger.save_config(locals())
+    logger = log.Logger(resume_from=resume_from, **logger_kwargs)
+    logger.save_config(locals(), algo="dqn")
 
     env = env_fn()
     if not isinstance(env.action_space, Discrete):
@@ -110,13 +351,16 @@ def dqn(env_fn, hidden_sizes=[64, 64], lr=1e-3, epochs=50, epoch_steps=10000, ba
     if preprocess_fn is None:
         preprocess_fn = preprocess.preprocess_obs
 
-    if obs_dim is None:
+    if obs_dim is None and frame_stack == 1:
         obs_dim = utils.get_dim_from_space(env.observation_space)
         obs_ph = utils.placeholder_from_space(env.observation_space, obs_space=True)
         obs_prime_ph = utils.placeholder_from_space(env.observation_space, obs_space=True)
     else:
-        obs_ph = tf.placeholder(tf.float32, shape=(None, obs_dim))
-        obs_prime_ph = tf.placeholder(tf.float32, shape=(None, obs_dim))
+        if obs_dim is None:
+            obs_dim = utils.get_dim_from_space(env.observation_space)
+        # network input is the flattened stack of frames
+        obs_ph = tf.placeholder(tf.float32, shape=(None, obs_dim * frame_stack))
+        obs_prime_ph = tf.placeholder(tf.float32, shape=(None, obs_dim * frame_stack))
 
     # need .shape for replay buffer and #actions for random action sampling
     act_dim = env.action_space.shape
@@ -125,20 +369,34 @@ def dqn(env_fn, hidden_sizes=[64, 64], lr=1e-3, epochs=50, epoch_steps=10000, ba
     rew_ph = tf.placeholder(tf.float32, shape=(None, ))
     done_ph = tf.placeholder(tf.float32, shape=(None, ))
 
-    with tf.variable_scope("main"):
-        pi, q_pi, act_q_val, q_vals = core.q_network(obs_ph, act_ph, env.action_space, hidden_sizes)
+    if graph_replay:
+        buf = DQNGraphReplayBuffer(obs_dim, act_dim, replay_size, act_dtype=act_ph.dtype)
+        # train inputs default to minibatch sampled in graph, but can still be fed when acting
+        batch = buf.sample_tensors(batch_size)
+        obs_ph = tf.placeholder_with_default(batch["o"], obs_ph.shape)
+        act_ph = tf.placeholder_with_default(batch["a"], act_ph.shape)
+        rew_ph = tf.placeholder_with_default(batch["r"], rew_ph.shape)
+        obs_prime_ph = tf.placeholder_with_default(batch["o_prime"], obs_prime_ph.shape)
+        done_ph = tf.placeholder_with_default(batch["d"], done_ph.shape)
+    else:
+        buf = DQNReplayBuffer(obs_dim, act_dim, replay_size, frame_stack)
+
+    with xla.jit_scope(xla_compile):
+        with tf.variable_scope("main"):
+            pi, q_pi, act_q_val, q_vals = core.q_network(obs_ph, act_ph, env.action_space,
+                                                         hidden_sizes)
 
-    with tf.variable_scope("target"):
-        pi_targ, q_pi_targ, _, q_vals_targ = core.q_network(obs_prime_ph, act_ph, env.action_space,
-                                                            hidden_sizes)
+        with tf.variable_scope("target"):
+            pi_targ, q_pi_targ, _, q_vals_targ = core.q_network(obs_prime_ph, act_ph,
+                                                                env.action_space, hidden_sizes)
 
-    # Losses
-    target = rew_ph + gamma*(1-done_ph)*q_pi_targ
-    q_loss = tf.reduce_mean((tf.stop_gradient(target) - act_q_val)**2)
+        # Losses
+        target = rew_ph + gamma*(1-done_ph)*q_pi_targ
+        q_loss = tf.reduce_mean((tf.stop_gradient(target) - act_q_val)**2)
 
-    # Training ops
-    q_optimizer = tf.train.AdamOptimizer(learning_rate=lr)
-    q_train_op = q_optimizer.minimize(q_loss)
+        # Training ops
+        q_optimizer = tf.train.AdamOptimizer(learning_rate=lr)
+        q_train_op = q_optimizer.minimize(q_loss)
 
     # update target network to match main network
     target_init = tf.group([v_targ.assign(v_main) for v_main, v_targ
@@ -148,40 +406,77 @@ def dqn(env_fn, hidden_sizes=[64, 64], lr=1e-3, epochs=50, epoch_steps=10000, ba
                               for v_main, v_targ
                               in zip(core.get_vars('main'), core.get_vars('target'))])
 
-    buf = DQNReplayBuffer(obs_dim, act_dim, replay_size)
+    stacker = frames.FrameStack(obs_dim, frame_stack) if frame_stack > 1 else None
 
     epsilon_schedule = np.linspace(1, epsilon, start_steps)
     global total_t
     total_t = 0
 
-    sess = tf.Session()
+    train_phs = [obs_ph, act_ph, rew_ph, obs_prime_ph, done_ph]
+    benchmark = [([q_loss, q_train_op], session.zeros_feed(train_phs, batch_size)),
+                 (pi, session.zeros_feed([obs_ph]))]
+    sess = session.make_session(exec_config, benchmark, logger.verbose)
     sess.run(tf.global_variables_initializer())
+    sess.run(tf.local_variables_initializer())
     sess.run(target_init)
 
-    logger.setup_tf_model_saver(sess, env, {log.OBS_NAME: obs_ph}, {log.ACTS_NAME: pi})
+    logger.setup_tf_model_saver(sess, env, {log.OBS_NAME: obs_ph}, {log.ACTS_NAME: pi},
+                                frame_stack=frame_stack)
+
+    tracer = trace.TraceRecorder()
+    compile_timer = xla.CompileTimer(xla_compile)
+    phase_timer = timer.PhaseTimer(time_phases, ["env_step", "preprocess", "act", "buffer",
+                                                 "sample", "train", "target_update",
+                                                 "checkpoint"], tracer)
+    mem_tracker = memory.MemoryTracker(track_memory)
+    mem_tracker.register("replay", buf)
+
+    def run_op(name, fetches, feed_dict=None):
+        """ Run fetches in session, traced while tracer is recording and timing XLA compile """
+        with compile_timer.time(name):
+            return tracer.run(sess, fetches, feed_dict)
+
+    update_log = None
+    if log_updates:
+        update_log = logger.event_log("updates", [("step", "int64"), ("loss", "float64")])
 
     def get_action(o, t):
         eps = epsilon if t >= start_steps else epsilon_schedule[t]
         if np.random.rand(1) < eps:
             a = np.random.choice(num_actions)
         else:
-            a = sess.run(pi, {obs_ph: o.reshape(1, -1)})
+            a = run_op("act", pi, {obs_ph: o.reshape(1, -1)})
         return a
 
     def update(t):
-        batch = buf.sample(batch_size)
-        feed_dict = {obs_ph: batch['o'],
-                     act_ph: batch["a"],
-                     rew_ph: batch["r"],
-                     obs_prime_ph: batch["o_prime"],
-                     done_ph: batch["d"]}
-
-        batch_loss, _ = sess.run([q_loss, q_train_op], feed_dict)
+        if graph_replay:
+            with phase_timer.phase("buffer"):
+                buf.flush(sess)
+        if not buf.can_sample():
+            return 0.0
+
+        if graph_replay:
+            # minibatch sampled in graph
+            with phase_timer.phase("train"):
+                batch_loss, _ = run_op("train", [q_loss, q_train_op])
+        else:
+            with phase_timer.phase("sample"):
+                batch = buf.sample(batch_size)
+                feed_dict = {obs_ph: batch['o'],
+                             act_ph: batch["a"],
+                             rew_ph: batch["r"],
+                             obs_prime_ph: batch["o_prime"],
+                             done_ph: batch["d"]}
+            with phase_timer.phase("train"):
+                batch_loss, _ = run_op("train", [q_loss, q_train_op], feed_dict)
+        if update_log is not None:
+            update_log.log(total_t, batch_loss)
 
         if t > 0 and (target_update_freq == 1 or t % (target_update_freq-1) == 0):
             if t == epoch_steps-1:
                 logger.log_tabular("ntwk_diff", network_diff())
-            sess.run(target_update)
+            with phase_timer.phase("target_update"):
+                run_op("target_update", target_update)
 
         return batch_loss
 
@@ -206,14 +501,19 @@ def dqn(env_fn, hidden_sizes=[64, 64], lr=1e-3, epochs=50, epoch_steps=10000, ba
         t = 0
 
         o = preprocess_fn(o, env)
+        s = o if stacker is None else stacker.reset(o)
         while True:
             if not finished_rendering_this_epoch and render:
                 env.render()
 
-            a = get_action(o, total_t)
-            o_prime, r, d, _ = env.step(a)
-            o_prime = preprocess_fn(o_prime, env)
-            buf.store(o, a, r, o_prime, d)
+            with phase_timer.phase("act"):
+                a = get_action(s, total_t)
+            with phase_timer.phase("env_step"):
+                o_prime, r, d, _ = env.step(a)
+            with phase_timer.phase("preprocess"):
+                o_prime = preprocess_fn(o_prime, env)
+            with phase_timer.phase("buffer"):
+                buf.store(o, a, r, o_prime, d)
 
             batch_loss = update(t)
             ep_len += 1
@@ -222,26 +522,48 @@ def dqn(env_fn, hidden_sizes=[64, 64], lr=1e-3, epochs=50, epoch_steps=10000, ba
             total_t += 1
             ep_loss.append(batch_loss)
             o = o_prime
+            with phase_timer.phase("preprocess"):
+                s = o if stacker is None else stacker.push(o)
 
             if d:
                 finished_rendering_this_epoch = True
-                o, r, d = env.reset(), 0, False
-                o = preprocess_fn(o, env)
+                with phase_timer.phase("env_step"):
+                    o, r, d = env.reset(), 0, False
+                with phase_timer.phase("preprocess"):
+                    o = preprocess_fn(o, env)
+                    s = o if stacker is None else stacker.reset(o)
 
                 epoch_ep_lens.append(ep_len)
                 epoch_ep_rets.append(ep_ret)
+                logger.log_episode(ep_ret, ep_len)
                 epoch_ep_loss.append(np.mean(ep_loss))
                 ep_len, ep_ret, ep_loss = 0, 0, []
 
             if t >= epoch_steps:
                 epoch_ep_lens.append(ep_len)
+                buf.end_episode()
                 break
 
         return epoch_ep_loss, epoch_ep_rets, epoch_ep_lens
 
     total_epoch_times = 0
     total_episodes = 0
-    for i in range(epochs):
+    start_epoch = 0
+    if resume_from is not None:
+        state = logger.restore_train_state(env)
+        start_epoch = state["epoch"] + 1
+        total_t = state["total_t"]
+        total_episodes = state["total_episodes"]
+        if "replay" in state:
+            replay = dict(state["replay"], **state["arrays"])
+            if graph_replay:
+                buf.set_state(sess, replay)
+            else:
+                buf.set_state(replay)
+
+    for i in range(start_epoch, epochs):
+        if i == trace_epoch:
+            tracer.start()
         logger.log_tabular("epoch", i)
         epoch_start = time.time()
         results = train_one_epoch()
@@ -256,25 +578,50 @@ def dqn(env_fn, hidden_sizes=[64, 64], lr=1e-3, epochs=50, epoch_steps=10000, ba
         logger.log_tabular("end_epsilon", epsilon if total_t >= start_steps else epsilon_schedule[total_t])
         logger.log_tabular("epoch_time", epoch_time)
         logger.log_tabular("mem_usage", utils.get_current_mem_usage())
+        if xla_compile:
+            logger.log_tabular("compile_time", compile_timer.total)
         training_time_left = utils.training_time_left(i, epochs, epoch_time)
         logger.log_tabular("time_rem", training_time_left)
+        # checkpoint time is for save at end of previous epoch
+        phase_timer.log_tabular(logger)
+        mem_tracker.log_tabular(logger)
 
         logger.dump_tabular()
 
         if (save_freq != 0 and i % save_freq == 0) or i == epochs-1:
-            itr = None if overwrite_save else i
-            logger.save_model(itr)
+            with phase_timer.phase("checkpoint"):
+                itr = None if overwrite_save else i
+                state = dict(epoch=i, total_t=total_t, total_episodes=total_episodes)
+                arrays = None
+                if save_replay:
+                    replay = buf.get_state(sess) if graph_replay else buf.get_state()
+                    # buffer arrays are saved with np.save, since pickling them copies the buffer
+                    arrays = {k: v for k, v in replay.items() if isinstance(v, np.ndarray)}
+                    if not graph_replay:
+                        # arrays are written in background while training fills the buffer
+                        arrays = {k: v.copy() for k, v in arrays.items()}
+                    state["replay"] = {k: v for k, v in replay.items() if k not in arrays}
+                logger.save_model(itr, state, env, arrays)
+
+        if i == trace_epoch:
+            tracer.stop()
+            tracer.write(os.path.join(logger.output_dir, trace.TRACE_FNAME))
+
+    logger.close()
 
     if render_last:
         input("Press enter to view final policy in action")
         final_ret = 0
         o, r, d = env.reset(), 0, False
+        o = preprocess_fn(o, env)
+        s = o if stacker is None else stacker.reset(o)
         finished_rendering_this_epoch = False
         while not finished_rendering_this_epoch:
             env.render()
-            o = preprocess_fn(o, env)
-            a = sess.run(pi, {obs_ph: o.reshape(1, -1)})
+            a = sess.run(pi, {obs_ph: s.reshape(1, -1)})
             o, r, d, _ = env.step(a)
+            o = preprocess_fn(o, env)
+            s = o if stacker is None else stacker.push(o)
             final_ret += r
             if d:
                 finished_rendering_this_epoch = True
@@ -297,9 +644,18 @@ if __name__ == "__main__":
     parser.add_argument("--polyak", type=float, default=0.995)
     parser.add_argument("--start_steps", type=int, default=100000)
     parser.add_argument("--target_update_freq", type=int, default=1)
+    parser.add_argument("--frame_stack", type=int, default=1)
+    parser.add_argument("--graph_replay", action="store_true")
+    parser.add_argument("--xla", action="store_true")
     parser.add_argument("--render", action="store_true")
     parser.add_argument("--renderlast", action="store_true")
     parser.add_argument("--exp_name", type=str, default=None)
+    parser.add_argument("--resume_from", type=str, default=None)
+    parser.add_argument("--save_replay", action="store_true")
+    parser.add_argument("--time_phases", action="store_true")
+    parser.add_argument("--trace_epoch", type=int, default=None)
+    parser.add_argument("--track_memory", action="store_true")
+    parser.add_argument("--log_updates", action="store_true")
     args = parser.parse_args()
 
     exp_name = "dqn_" + args.env if args.exp_name is None else args.exp_name
@@ -313,4 +669,7 @@ if __name__ == "__main__":
         seed=args.seed, replay_size=args.replay_size, epsilon=args.epsilon, gamma=args.gamma,
         polyak=args.polyak, start_steps=args.start_steps, target_update_freq=args.target_update_freq,
         render=args.render, render_last=args.renderlast, logger_kwargs=logger_kwargs,
-        preprocess_fn=preprocess_fn, obs_dim=obs_dim)
+        preprocess_fn=preprocess_fn, obs_dim=obs_dim, frame_stack=args.frame_stack,
+        graph_replay=args.graph_replay, xla_compile=args.xla, resume_from=args.resume_from,
+        save_replay=args.save_replay, time_phases=args.time_phases, trace_epoch=args.trace_epoch,
+        track_memory=args.track_memory, log_updates=args.log_updates)
@@ -8,6 +8,11 @@ import time
 import numpy as np
 import tensorflow as tf
 import rlalgs.utils.logger as log
+import rlalgs.utils.xla as xla
+import rlalgs.utils.timer as timer
+import rlalgs.utils.trace as trace
+import rlalgs.utils.memory as memory
+import rlalgs.utils.session as session
 import rlalgs.utils.utils as utils
 import rlalgs.algos.vpg.core as core
 import rlalgs.utils.preprocess as preprocess
@@ -128,7 +133,9 @@ class VPGReplayBuffer:
 
 def vpg(env_fn, hidden_sizes=[64, 64], pi_lr=1e-2, v_lr=1e-2, gamma=0.99, epochs=50,
         batch_size=5000, seed=0, render=False, render_last=False, logger_kwargs=dict(),
-        save_freq=10, overwrite_save=True, preprocess_fn=None, obs_dim=None):
+        save_freq=10, overwrite_save=True, preprocess_fn=None, obs_dim=None, xla_compile=False,
+        exec_config=None, resume_from=None, time_phases=False,
+        trace_epoch=None, track_memory=False):
     """
     Vanilla Policy Gradient
 
@@ -149,13 +156,26 @@ def vpg(env_fn, hidden_sizes=[64, 64], pi_lr=1e-2, v_lr=1e-2, gamma=0.99, epochs
         done apart for handling reshaping for discrete observation spaces)
     obs_dim : dimensions for observations (if None then dimensions extracted from environment
         observation space)
+    xla_compile : whether to compile the acting, loss, gradient and optimizer ops with XLA
+    exec_config : tf session execution config (threads, cpu affinity, graph optimizer options and
+        auto-tuning) as dict of kwargs or rlalgs.utils.session.ExecConfig
+    resume_from : output directory of a run to resume training from. Training continues from the
+        training state saved with the run's last model save (network, optimizer, random number
+        generator and logger state).
+    time_phases : whether to log time spent in each phase of the training loop (env steps,
+        preprocessing, action selection, buffer writes, updates and checkpointing)
+    trace_epoch : epoch to record a timeline of (python phases of training loop and per-op
+        timings of tf session runs), written to trace.json in output directory in Chrome trace
+        format. If None no timeline is recorded.
+    track_memory : whether to log memory used by buffers and tf variables, tf graph op count and
+        peak memory usage each epoch
     """
     tf.reset_default_graph()
     tf.set_random_seed(seed)
     np.random.seed(seed)
 
-    logger = log.Logger(**logger_kwargs)
-    logger.save_config(locals())
+    logger = log.Logger(resume_from=resume_from, **logger_kwargs)
+    logger.save_config(locals(), algo="vpg")
 
     env = env_fn()
 
@@ -173,20 +193,41 @@ def vpg(env_fn, hidden_sizes=[64, 64], pi_lr=1e-2, v_lr=1e-2, gamma=0.99, epochs
     ret_ph = tf.placeholder(tf.float32, shape=(None, ))
     adv_ph = tf.placeholder(tf.float32, shape=(None, ))
 
-    pi, logp, v = mlp_actor_critic(obs_ph, act_ph, env.action_space, hidden_sizes=hidden_sizes)
-    pi_loss = -tf.reduce_mean(logp * adv_ph)
-    v_loss = tf.reduce_mean((ret_ph - v)**2)
+    # epoch batch is loaded into graph once and then reused by all loss and train ops
+    batch_phs = [obs_ph, act_ph, adv_ph, ret_ph]
+    (obs_ph, act_ph, adv_ph, ret_ph), load_batch_op = utils.batch_inputs(batch_phs, batch_size)
 
-    pi_train_op = tf.train.AdamOptimizer(learning_rate=pi_lr).minimize(pi_loss)
-    v_train_op = tf.train.AdamOptimizer(learning_rate=v_lr).minimize(v_loss)
+    with xla.jit_scope(xla_compile):
+        pi, logp, v = mlp_actor_critic(obs_ph, act_ph, env.action_space, hidden_sizes=hidden_sizes)
+        pi_loss = -tf.reduce_mean(logp * adv_ph)
+        v_loss = tf.reduce_mean((ret_ph - v)**2)
+
+        pi_train_op = tf.train.AdamOptimizer(learning_rate=pi_lr).minimize(pi_loss)
+        v_train_op = tf.train.AdamOptimizer(learning_rate=v_lr).minimize(v_loss)
 
     buf = VPGReplayBuffer(obs_dim, act_dim, batch_size, gamma=gamma, adv_fn="gae")
 
-    sess = tf.Session()
+    benchmark = [([pi_train_op, v_train_op], session.zeros_feed([obs_ph, act_ph, adv_ph, ret_ph],
+                                                                 batch_size)),
+                 ([pi, v], session.zeros_feed([obs_ph]))]
+    sess = session.make_session(exec_config, benchmark, logger.verbose)
     sess.run(tf.global_variables_initializer())
+    sess.run(tf.local_variables_initializer())
 
     logger.setup_tf_model_saver(sess, env, {log.OBS_NAME: obs_ph}, {log.ACTS_NAME: pi})
 
+    tracer = trace.TraceRecorder()
+    compile_timer = xla.CompileTimer(xla_compile)
+    phase_timer = timer.PhaseTimer(time_phases, ["env_step", "preprocess", "act", "buffer",
+                                                 "update", "checkpoint"], tracer)
+    mem_tracker = memory.MemoryTracker(track_memory)
+    mem_tracker.register("buffer", buf)
+
+    def run_op(name, fetches, feed_dict=None):
+        """ Run fetches in session, traced while tracer is recording and timing XLA compile """
+        with compile_timer.time(name):
+            return tracer.run(sess, fetches, feed_dict)
+
     def train_one_epoch():
         o, r, d = env.reset(), 0, False
         finished_rendering_this_epoch = False
@@ -198,11 +239,15 @@ def vpg(env_fn, hidden_sizes=[64, 64], pi_lr=1e-2, v_lr=1e-2, gamma=0.99, epochs
             if not finished_rendering_this_epoch and render:
                 env.render()
 
-            o = preprocess_fn(o, env)
+            with phase_timer.phase("preprocess"):
+                o = preprocess_fn(o, env)
 
-            a, v_t = sess.run([pi, v], {obs_ph: o.reshape(1, -1)})
-            buf.store(o, a[0], r, v_t[0])
-            o, r, d, _ = env.step(a[0])
+            with phase_timer.phase("act"):
+                a, v_t = run_op("act", [pi, v], {obs_ph: o.reshape(1, -1)})
+            with phase_timer.phase("buffer"):
+                buf.store(o, a[0], r, v_t[0])
+            with phase_timer.phase("env_step"):
+                o, r, d, _ = env.step(a[0])
 
             ep_len += 1
             ep_ret += r
@@ -214,34 +259,47 @@ def vpg(env_fn, hidden_sizes=[64, 64], pi_lr=1e-2, v_lr=1e-2, gamma=0.99, epochs
                 if d:
                     last_val = r
                 else:
-                    o = preprocess_fn(o, env)
-                    last_val = sess.run(v, {obs_ph: o.reshape(1, -1)})
-                buf.finish_path(last_val)
-
-                o, r, d = env.reset(), 0, False
+                    with phase_timer.phase("preprocess"):
+                        o = preprocess_fn(o, env)
+                    with phase_timer.phase("act"):
+                        last_val = run_op("val", v, {obs_ph: o.reshape(1, -1)})
+                with phase_timer.phase("buffer"):
+                    buf.finish_path(last_val)
+
+                with phase_timer.phase("env_step"):
+                    o, r, d = env.reset(), 0, False
                 finished_rendering_this_epoch = True
                 batch_ep_lens.append(ep_len)
                 batch_ep_rets.append(ep_ret)
+                logger.log_episode(ep_ret, ep_len)
                 ep_len, ep_ret = 0, 0
                 if t == batch_size:
                     break
 
-        batch_obs, batch_acts, batch_adv, batch_rets, batch_vals = buf.get()
-        inputs = {obs_ph: np.array(batch_obs),
-                  act_ph: np.array(batch_acts),
-                  adv_ph: np.array(batch_adv),
-                  ret_ph: np.array(batch_rets)}
+        with phase_timer.phase("update"):
+            batch_obs, batch_acts, batch_adv, batch_rets, batch_vals = buf.get()
+            sess.run(load_batch_op, feed_dict=dict(zip(batch_phs, [batch_obs, batch_acts,
+                                                                   batch_adv, batch_rets])))
 
-        pi_l, v_l = sess.run([pi_loss, v_loss], feed_dict=inputs)
-        sess.run(pi_train_op, feed_dict=inputs)
-        sess.run(v_train_op, feed_dict=inputs)
+            pi_l, v_l = run_op("loss", [pi_loss, v_loss])
+            run_op("pi_train", pi_train_op)
+            run_op("v_train", v_train_op)
 
         return pi_l, v_l, batch_ep_rets, batch_ep_lens
 
     total_epoch_times = 0
     avg_epoch_returns = []
     total_episodes = 0
-    for i in range(epochs):
+    start_epoch = 0
+    if resume_from is not None:
+        state = logger.restore_train_state(env)
+        start_epoch = state["epoch"] + 1
+        avg_epoch_returns = state["avg_epoch_returns"]
+        total_episodes = state["total_episodes"]
+
+    for i in range(start_epoch, epochs):
+        if i == trace_epoch:
+            tracer.start()
         epoch_start = time.time()
         results = train_one_epoch()
         epoch_time = time.time() - epoch_start
@@ -256,14 +314,26 @@ def vpg(env_fn, hidden_sizes=[64, 64], pi_lr=1e-2, v_lr=1e-2, gamma=0.99, epochs
         logger.log_tabular("total_eps", total_episodes)
         logger.log_tabular("epoch_time", epoch_time)
         logger.log_tabular("mem_usage", utils.get_current_mem_usage())
+        if xla_compile:
+            logger.log_tabular("compile_time", compile_timer.total)
+        # checkpoint time is for save at end of previous epoch
+        phase_timer.log_tabular(logger)
+        mem_tracker.log_tabular(logger)
         avg_epoch_returns.append(avg_return)
         logger.dump_tabular()
 
         if (save_freq != 0 and i % save_freq == 0) or i == epochs-1:
-            itr = None if overwrite_save else i
-            logger.save_model(itr)
+            with phase_timer.phase("checkpoint"):
+                itr = None if overwrite_save else i
+                logger.save_model(itr, dict(epoch=i, avg_epoch_returns=avg_epoch_returns,
+                                            total_episodes=total_episodes), env)
+
+        if i == trace_epoch:
+            tracer.stop()
+            tracer.write(os.path.join(logger.output_dir, trace.TRACE_FNAME))
 
-    print("Average epoch time = ", total_epoch_times/epochs)
+    logger.close()
+    print("Average epoch time = ", total_epoch_times/max(1, epochs - start_epoch))
 
     if render_last:
         input("Press enter to view final policy in action")
@@ -297,7 +367,12 @@ if __name__ == "__main__":
     parser.add_argument("--gamma", type=float, default=0.99)
     parser.add_argument("--render", action="store_true")
     parser.add_argument("--renderlast", action="store_true")
+    parser.add_argument("--xla", action="store_true")
     parser.add_argument("--exp_name", type=str, default=None)
+    parser.add_argument("--resume_from", type=str, default=None)
+    parser.add_argument("--time_phases", action="store_true")
+    parser.add_argument("--trace_epoch", type=int, default=None)
+    parser.add_argument("--track_memory", action="store_true")
     args = parser.parse_args()
 
     exp_name = "vpg_" + args.env if args.exp_name is None else args.exp_name
@@ -307,4 +382,6 @@ if __name__ == "__main__":
     vpg(lambda: gym.make(args.env), epochs=args.epochs, batch_size=args.batch_size,
         hidden_sizes=[args.hid]*args.layers, pi_lr=args.pi_lr, v_lr=args.v_lr, gamma=args.gamma,
         seed=args.seed, render=args.render, render_last=args.renderlast,
-        logger_kwargs=logger_kwargs, save_freq=2, overwrite_save=False)
+        logger_kwargs=logger_kwargs, save_freq=2, overwrite_save=False, xla_compile=args.xla,
+        resume_from=args.resume_from, time_phases=args.time_phases,
+        trace_epoch=args.trace_epoch, track_memory=args.track_memory)
@@ -0,0 +1,160 @@
+"""
+Vectorized aggregation of metrics over many experiment runs
+
+Runs are stacked into a single padded (runs x points x metrics) array, aligned on a common x
+axis (e.g. epoch or total steps), with a mask of which entries were logged. Means, standard
+deviations, quantiles and bootstrap confidence intervals over runs are then computed for
+every point and metric at once.
+"""
+import warnings
+import numpy as np
+import pandas as pd
+
+# max number of elements in a bootstrap chunk (bootstrap samples x columns)
+BOOT_CHUNK_SIZE = 2**22
+
+
+def stack_runs(data, x_key="epoch", keys=None, grid=None, cumulative=False):
+    """
+    Stack run data into a padded array aligned on x_key
+
+    Arguments:
+        list data : list of run dataframes (e.g. from analyser.load_all_experiment_runs)
+        str x_key : column to align runs on, which must be increasing within each run
+        list keys : metrics to stack (if None uses all numeric columns of first run, except x_key)
+        array grid : x values to align runs to. If None runs are aligned on the union of their
+            logged x values. Otherwise metrics are linearly interpolated onto grid, which is
+            needed when runs log different x values (e.g. total steps with varying episode
+            lengths). Grid points outside a run's logged range are masked.
+        bool cumulative : whether x_key column holds per row counts (e.g. steps per epoch), in
+            which case the cumulative sum is used as x value
+
+    Returns:
+        np.ndarray x : x values of aligned points, shape (points, )
+        np.ndarray values : metric values, shape (runs, points, metrics), NaN where masked
+        np.ndarray mask : whether value was logged (and finite), shape (runs, points, metrics)
+        list keys : name of each metric
+    """
+    if keys is None:
+        keys = [k for k in data[0].select_dtypes(include=[np.number]).columns if k != x_key]
+    run_xs = []
+    for df in data:
+        run_x = df[x_key].to_numpy(dtype=np.float64)
+        run_xs.append(np.cumsum(run_x) if cumulative else run_x)
+
+    if grid is None:
+        x = np.unique(np.concatenate(run_xs))
+    else:
+        x = np.asarray(grid, dtype=np.float64)
+    values = np.full((len(data), len(x), len(keys)), np.nan)
+
+    for i, (df, run_x) in enumerate(zip(data, run_xs)):
+        run_values = df.reindex(columns=keys).to_numpy(dtype=np.float64)
+        if len(run_x) == 0:
+            continue
+        if grid is None:
+            values[i, np.searchsorted(x, run_x)] = run_values
+            continue
+        # interpolate all metrics at once, between logged points either side of grid point
+        inside = (x >= run_x[0]) & (x <= run_x[-1])
+        if len(run_x) == 1:
+            lo = hi = np.zeros(np.count_nonzero(inside), dtype=np.int64)
+        else:
+            hi = np.clip(np.searchsorted(run_x, x[inside]), 1, len(run_x) - 1)
+            lo = hi - 1
+        span = run_x[hi] - run_x[lo]
+        w = np.divide(x[inside] - run_x[lo], span, out=np.zeros_like(span), where=span > 0)
+        values[i, inside] = run_values[lo] * (1 - w[:, None]) + run_values[hi] * w[:, None]
+
+    mask = np.isfinite(values)
+    return x, values, mask, keys
+
+
+def bootstrap_ci(values, mask, n_boot=1000, ci=0.95, seed=0):
+    """
+    Bootstrap confidence interval of mean over runs (axis 0), for every point and metric.
+
+    Each bootstrap sample resamples runs with replacement, represented by multinomial weights
+    on runs, so the means of all bootstrap samples are computed with one matrix product (in
+    chunks of columns to bound memory). Masked entries are excluded from each sample's mean.
+
+    Arguments:
+        np.ndarray values : values, shape (runs, ...)
+        np.ndarray mask : whether value is present, same shape as values
+        int n_boot : number of bootstrap samples
+        float ci : confidence level
+        int seed : random seed for resampling
+
+    Returns:
+        np.ndarray low : lower bound of interval, shape values.shape[1:]
+        np.ndarray high : upper bound of interval, shape values.shape[1:]
+    """
+    n_runs = values.shape[0]
+    rng = np.random.RandomState(seed)
+    weights = rng.multinomial(n_runs, np.full(n_runs, 1.0 / n_runs), size=n_boot).astype(np.float64)
+    flat_values = np.where(mask, values, 0.0).reshape(n_runs, -1)
+    flat_mask = mask.reshape(n_runs, -1).astype(np.float64)
+    q = [100 * (1 - ci) / 2, 100 * (1 + ci) / 2]
+
+    bounds = np.empty((2, flat_values.shape[1]))
+    chunk = max(1, BOOT_CHUNK_SIZE // n_boot)
+    for start in range(0, flat_values.shape[1], chunk):
+        cols = slice(start, start + chunk)
+        totals = weights @ flat_values[:, cols]
+        counts = weights @ flat_mask[:, cols]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = totals / counts
+        means[counts == 0] = np.nan
+        if np.isnan(means).any():
+            with warnings.catch_warnings():
+                # all NaN columns are expected for points no run logged
+                warnings.simplefilter("ignore", RuntimeWarning)
+                bounds[:, cols] = np.nanpercentile(means, q, axis=0)
+        else:
+            bounds[:, cols] = np.percentile(means, q, axis=0)
+    low, high = bounds.reshape((2, ) + values.shape[1:])
+    return low, high
+
+
+def aggregate(values, mask, quantiles=(0.25, 0.5, 0.75), n_boot=1000, ci=0.95, seed=0):
+    """
+    Compute statistics over runs of stacked run values (see stack_runs)
+
+    Arguments:
+        np.ndarray values : values, shape (runs, points, metrics)
+        np.ndarray mask : whether value is present, same shape as values
+        tuple quantiles : quantiles to compute
+        int n_boot : number of bootstrap samples for confidence interval (0 to skip)
+        float ci : confidence level of interval
+        int seed : random seed for bootstrap
+
+    Returns:
+        dict stats : count, mean, std, ci_low and ci_high each of shape (points, metrics) and
+            quantiles of shape (len(quantiles), points, metrics). Statistics of points where
+            no run logged a value are NaN.
+    """
+    count = mask.sum(axis=0)
+    zeroed = np.where(mask, values, 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = zeroed.sum(axis=0) / count
+        sq_dev = np.where(mask, (values - mean) ** 2, 0.0).sum(axis=0)
+        # sample standard deviation, as pandas std
+        std = np.sqrt(sq_dev / (count - 1))
+    std[count < 2] = np.nan
+    stats = dict(count=count, mean=mean, std=std)
+    with warnings.catch_warnings():
+        # all NaN slices are expected for points no run logged
+        warnings.simplefilter("ignore", RuntimeWarning)
+        stats["quantiles"] = np.nanquantile(np.where(mask, values, np.nan), quantiles, axis=0)
+    if n_boot > 0:
+        stats["ci_low"], stats["ci_high"] = bootstrap_ci(values, mask, n_boot, ci, seed)
+    return stats
+
+
+def to_frame(x, stat, keys, x_key="epoch"):
+    """
+    Convert a (points, metrics) statistic to a dataframe, with x_key as first column
+    """
+    df = pd.DataFrame(stat, columns=keys)
+    df.insert(0, x_key, x)
+    return df
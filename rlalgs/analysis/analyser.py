@@ -5,15 +5,29 @@ visualisations and statistics
 import os
 import json
 import math
+import pickle
 import pandas as pd
 import matplotlib.pyplot as plt
+import rlalgs.utils.metrics as metrics
+import rlalgs.utils.catalog as catalog
+import rlalgs.utils.checkpoints as checkpoints
+import rlalgs.analysis.aggregate as aggregate
+import rlalgs.analysis.downsample as downsample
+from concurrent.futures import ProcessPoolExecutor
+
+
+CACHE_FNAME = ".analysis_cache.pkl"
+# files run data is loaded from, used to detect changed runs
+RUN_FILES = ["progress.txt", "config.json", os.path.join(metrics.METRICS_DIR, metrics.SCHEMA_FNAME)]
 
 
 def load_experiment_run(data_dir):
     """
     Loads a single experiments data (i.e. for a single seed)
 
-    Assumes standard data output, with one .txt file and one config.json file
+    Assumes standard data output, with one .txt file and one config.json file. If the run has a
+    metrics store it is read instead of the .txt file, since it is faster to load and values
+    are stored at full precision.
 
     Arguments:
         str data_dir : path to directory containing data
@@ -24,33 +38,178 @@ def load_experiment_run(data_dir):
     """
     data_file = os.path.join(data_dir, "progress.txt")
     config_file = os.path.join(data_dir, "config.json")
-    data = pd.read_table(data_file)
+    if metrics.has_metrics(data_dir):
+        data = pd.DataFrame(metrics.load_metrics(data_dir))
+    else:
+        data = pd.read_table(data_file)
     with open(config_file, "r") as fin:
         config = json.load(fin)
     return data, config
 
 
-def load_all_experiment_runs(exp_parent_dir):
+def load_event_log(data_dir, name="episodes"):
+    """
+    Loads an event log (by default the per-episode log) of a single experiment run
+    (memory-mapped, so large logs are not read into memory until used)
+
+    Arguments:
+        str data_dir : path to directory containing data
+        str name : name of event log (e.g. "updates" for per update event log)
+
+    Returns:
+        np.ndarray events : record array of events, for episodes with epoch, return, length and
+            time fields
+    """
+    return metrics.load_events(data_dir, name)
+
+
+def load_checkpoint_index(data_dir):
+    """
+    Loads the checkpoint index of a single experiment run
+
+    Arguments:
+        str data_dir : path to directory containing data
+
+    Returns:
+        pd_dataframe index : one row per retained checkpoint, with epoch, path, compressed and
+            the metrics logged for the checkpoint's epoch as columns
+    """
+    entries = checkpoints.load_index(data_dir)
+    rows = []
+    for e in entries:
+        row = {"epoch": e["epoch"], "path": e["path"], "compressed": e["compressed"]}
+        row.update(e["metrics"])
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def run_signature(data_dir):
+    """
+    Get signature of a run's data files (modified time and size of each), which changes whenever
+    the run's data changes
+    """
+    sig = []
+    for fname in RUN_FILES:
+        path = os.path.join(data_dir, fname)
+        if os.path.exists(path):
+            st = os.stat(path)
+            sig.append((fname, st.st_mtime_ns, st.st_size))
+    return tuple(sig)
+
+
+def experiment_signature(exp_parent_dir):
+    """
+    Get signature of all runs of an experiment, which changes whenever any run's data changes
+    """
+    return tuple((os.path.basename(run_dir), run_signature(run_dir))
+                 for run_dir in sorted(get_subdirectories(exp_parent_dir)))
+
+
+def _load_cache(cache_file):
+    if not os.path.exists(cache_file):
+        return {}
+    try:
+        with open(cache_file, "rb") as fin:
+            return pickle.load(fin)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        # unreadable cache is rebuilt
+        return {}
+
+
+def _write_cache(cache_file, cache):
+    try:
+        # tmp file is per process, since several processes may load the same experiment
+        tmp_file = "{}.{}.tmp".format(cache_file, os.getpid())
+        with open(tmp_file, "wb") as fout:
+            pickle.dump(cache, fout, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, cache_file)
+    except OSError as e:
+        # e.g. experiment directory is read-only, loading still works without cache
+        print("Warning: could not write analysis cache {}: {}".format(cache_file, e))
+
+
+def load_all_experiment_runs(exp_parent_dir, workers=None, use_cache=True):
     """
     Loads all experiment runs for a given experiment, where the seeds are diffrent.
 
+    Runs are loaded in parallel in a process pool. Loaded runs are cached in a single file in
+    the parent directory, so only runs whose data files have changed since the last load (by
+    modified time or size) are re-read.
+
     Arguments:
         str exp_parent_dir : the parent directory for experiment
+        int workers : max number of processes to load runs with (if None uses number of cpus)
+        bool use_cache : whether to use and update cache of loaded runs
 
     Returns:
         [pd_dataframe] data : list of data from each experiment
         [dict] config : list of all config info for each experiment
     """
-    exp_run_dirs = get_subdirectories(exp_parent_dir)
+    exp_run_dirs = sorted(get_subdirectories(exp_parent_dir))
+    cache_file = os.path.join(exp_parent_dir, CACHE_FNAME)
+    cache = _load_cache(cache_file) if use_cache else {}
+
+    # cache is keyed by run directory name, so experiment directory can be moved
+    sigs = {run_dir: run_signature(run_dir) for run_dir in exp_run_dirs}
+    stale = [run_dir for run_dir in exp_run_dirs
+             if cache.get(os.path.basename(run_dir), {}).get("sig") != sigs[run_dir]]
+    loaded = load_experiment_runs(stale, workers)
+    for run_dir, (run_data, run_config) in zip(stale, loaded):
+        cache[os.path.basename(run_dir)] = dict(sig=sigs[run_dir], data=run_data,
+                                                config=run_config)
+
     data = []
     configs = []
     for run_dir in exp_run_dirs:
-        run_data, run_config = load_experiment_run(run_dir)
-        data.append(run_data)
-        configs.append(run_config)
+        entry = cache[os.path.basename(run_dir)]
+        data.append(entry["data"])
+        configs.append(entry["config"])
+
+    if use_cache and (len(stale) > 0 or len(cache) != len(exp_run_dirs)):
+        names = set(os.path.basename(run_dir) for run_dir in exp_run_dirs)
+        _write_cache(cache_file, {k: v for k, v in cache.items() if k in names})
     return data, configs
 
 
+def load_experiment_runs(run_dirs, workers=None):
+    """
+    Loads experiment runs in parallel in a process pool
+
+    Arguments:
+        list run_dirs : run directories
+        int workers : max number of processes to load runs with (if None uses number of cpus)
+
+    Returns:
+        list runs : (data, config) of each run
+    """
+    if len(run_dirs) > 1 and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(load_experiment_run, run_dirs))
+    return [load_experiment_run(run_dir) for run_dir in run_dirs]
+
+
+def load_catalog_runs(catalog_path=None, workers=None, **filters):
+    """
+    Loads all experiment runs in run catalog matching filters (see
+    rlalgs.utils.catalog.Catalog.find_runs), e.g.
+
+        load_catalog_runs(algo="dqn", env="CartPole-v0", params={"lr": ("<", 1e-3)})
+
+    Arguments:
+        str catalog_path : catalog database file (if None uses default catalog)
+        int workers : max number of processes to load runs with (if None uses number of cpus)
+
+    Returns:
+        [pd_dataframe] data : list of data from each experiment
+        [dict] config : list of all config info for each experiment
+    """
+    cat = catalog.Catalog(catalog_path)
+    run_dirs = [run["run_dir"] for run in cat.find_runs(**filters)]
+    cat.close()
+    runs = load_experiment_runs(run_dirs, workers)
+    return [data for data, _ in runs], [config for _, config in runs]
+
+
 def get_subdirectories(parent_dir):
     """
     Get all subdirectories of parent
@@ -62,14 +221,21 @@ def get_subdirectories(parent_dir):
     return sub_dirs
 
 
-def average_over_runs(data):
+def average_over_runs(data, x_key="epoch"):
     """
-    Averages epoch data over different runs
+    Averages epoch data over different runs, aligning runs on x_key. Runs of different lengths
+    are averaged over the runs that logged each point.
+
+    See rlalgs.analysis.aggregate for quantiles and confidence intervals.
+
+    Returns:
+        pd_dataframe avg_data : mean of each metric over runs
+        pd_dataframe err_data : standard deviation of each metric over runs
     """
-    data_concat = pd.concat(data)
-    by_row_index = data_concat.groupby(data_concat.index)
-    avg_data = by_row_index.mean()
-    err_data = by_row_index.std()
+    x, values, mask, keys = aggregate.stack_runs(data, x_key)
+    stats = aggregate.aggregate(values, mask, n_boot=0)
+    avg_data = aggregate.to_frame(x, stats["mean"], keys, x_key)
+    err_data = aggregate.to_frame(x, stats["std"], keys, x_key)
     return avg_data, err_data
 
 
@@ -80,13 +246,23 @@ def get_fig_grid_dims(num_plots):
     return rows, cols
 
 
-def plot_data(ax, df, x_key, y_key, err_df=None):
+def plot_data(ax, df, x_key, y_key, err_df=None, max_points=None, method="minmax", key=None):
     """
-    Plots data on 2D plot
+    Plots data on 2D plot, downsampled to max_points (if None uses twice the axis width in
+    pixels) with method (see rlalgs.analysis.downsample)
+
+    If key is not None (e.g. experiment directory, x_key and experiment_signature) downsampled
+    points are cached under key and y_key, so replotting unchanged data isn't downsampled again.
     """
-    x = df[x_key]
-    y = df[y_key]
-    err = err_df[y_key]
+    x = df[x_key].to_numpy()
+    y = df[y_key].to_numpy()
+    err = None if err_df is None else err_df[y_key].to_numpy()
+
+    n_points = downsample.axis_points(ax) if max_points is None else max_points
+    others = () if err is None else (err, )
+    y_cache_key = None if key is None else (key, y_key)
+    x, y, *others = downsample.downsample(x, y, n_points, method, y_cache_key, others)
+    err = others[0] if err is not None else None
 
     ax.plot(x, y)
     if err is not None:
@@ -100,13 +276,20 @@ if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument('exp_dir', type=str, help="path to experiment parent directory")
+    parser.add_argument('--x_key', type=str, default="epoch",
+                        help="column to align runs on and plot against")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="number of processes to load runs with")
+    parser.add_argument('--no_cache', action="store_true",
+                        help="don't use or update cache of loaded runs")
     args = parser.parse_args()
 
     print("\nAnalyser")
-    data, configs = load_all_experiment_runs(args.exp_dir)
-    avg_data, err_data = average_over_runs(data)
+    data, configs = load_all_experiment_runs(args.exp_dir, args.workers, not args.no_cache)
+    avg_data, err_data = average_over_runs(data, args.x_key)
 
-    x_key = "epoch"
+    x_key = args.x_key
+    key = (os.path.abspath(args.exp_dir), x_key, experiment_signature(args.exp_dir))
     headers = list(avg_data)
     num_plots = len(headers) - 1
     rows, cols = get_fig_grid_dims(num_plots)
@@ -116,7 +299,7 @@ if __name__ == "__main__":
     for y_key in headers:
         if y_key != x_key:
             ax = axes[r][c]
-            plot_data(ax, avg_data, x_key, y_key, err_data)
+            plot_data(ax, avg_data, x_key, y_key, err_data, key=key)
             if c + 1 == cols:
                 r += 1
             c = (c + 1) % cols
@@ -0,0 +1,130 @@
+"""
+Shape preserving downsampling of long curves before plotting
+
+Plotting millions of points (e.g. per-episode or per-update logs) is slow, while only about
+as many points as there are pixels across the axis can be seen. Curves are reduced to a subset of
+their points, chosen so spikes are kept:
+
+- minmax : splits points into equal sized buckets and keeps the min and max of each
+- lttb : Largest-Triangle-Three-Buckets, keeps the point of each bucket forming the largest
+    triangle with the points kept either side of it
+
+Both return indices of the points kept, so the same points can be taken from related arrays
+(e.g. error bands).
+"""
+import numpy as np
+
+METHODS = ["minmax", "lttb"]
+# max number of cached results
+CACHE_SIZE = 128
+
+_cache = {}
+
+
+def minmax_indices(y, n_buckets):
+    """
+    Get indices of first, last, min and max points of each of n_buckets equal sized buckets
+
+    Arguments:
+        np.ndarray y : values
+        int n_buckets : number of buckets
+
+    Returns:
+        np.ndarray indices : sorted indices of kept points (at most 2 * n_buckets + 2)
+    """
+    n = len(y)
+    if n <= 2 * n_buckets + 2:
+        return np.arange(n)
+    size = int(np.ceil(n / n_buckets))
+    # pad with last value so all buckets are full, indices into padding are clipped
+    padded = np.pad(np.asarray(y, dtype=np.float64), (0, n_buckets * size - n), mode="edge")
+    isnan = np.isnan(padded)
+    offsets = np.arange(n_buckets) * size
+    mins = np.argmin(np.where(isnan, np.inf, padded).reshape(n_buckets, size), axis=1) + offsets
+    maxs = np.argmax(np.where(isnan, -np.inf, padded).reshape(n_buckets, size), axis=1) + offsets
+    indices = np.concatenate([[0, n - 1], np.minimum(mins, n - 1), np.minimum(maxs, n - 1)])
+    return np.unique(indices)
+
+
+def lttb_indices(x, y, n_out):
+    """
+    Get indices of n_out points chosen by Largest-Triangle-Three-Buckets
+
+    Arguments:
+        np.ndarray x : x values, increasing
+        np.ndarray y : y values
+        int n_out : number of points to keep (including first and last point)
+
+    Returns:
+        np.ndarray indices : sorted indices of kept points
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # n_out - 2 buckets between first and last points
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo, next_hi = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = np.nanmean(y[next_lo:next_hi])
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(np.nan_to_num(area, nan=-1.0)))
+        indices[i + 1] = a
+    return indices
+
+
+def downsample_indices(x, y, n_points, method="minmax", key=None):
+    """
+    Get indices of points to plot, so at most about n_points are plotted
+
+    Arguments:
+        np.ndarray x : x values
+        np.ndarray y : y values
+        int n_points : number of points to reduce to
+        str method : downsampling method (one of METHODS)
+        key : if not None, result is cached under key (e.g. run and metric name) for this
+            resolution and number of points, so redrawing the same curve is free
+
+    Returns:
+        np.ndarray indices : sorted indices of points to plot
+    """
+    assert method in METHODS, "Downsample method must be one of {}".format(METHODS)
+    cache_key = None if key is None else (key, len(y), n_points, method)
+    if cache_key is not None and cache_key in _cache:
+        return _cache[cache_key]
+    if method == "minmax":
+        # each bucket keeps two points
+        indices = minmax_indices(y, max(1, n_points // 2))
+    else:
+        indices = lttb_indices(x, y, n_points)
+    if cache_key is not None:
+        if len(_cache) >= CACHE_SIZE:
+            _cache.pop(next(iter(_cache)))
+        _cache[cache_key] = indices
+    return indices
+
+
+def axis_points(ax, points_per_pixel=2):
+    """
+    Get number of points to downsample to, for plotting on an axis
+    """
+    width = ax.get_window_extent().width
+    return max(100, int(width * points_per_pixel))
+
+
+def downsample(x, y, n_points, method="minmax", key=None, others=()):
+    """
+    Downsample x, y and any other arrays of same length (e.g. error bands) to the same points
+    (see downsample_indices)
+
+    Returns:
+        tuple arrays : downsampled x, y and others
+    """
+    indices = downsample_indices(x, y, n_points, method, key)
+    return tuple(np.asarray(a)[indices] for a in (x, y) + others)
@@ -0,0 +1,212 @@
+"""
+Batch export of figures for experiments, e.g. after a tuner sweep
+
+For each experiment (variant) in a sweep directory a figure of all its metrics averaged over
+runs (seeds) is written to the experiment directory, and for each compared metric a figure
+comparing all variants (mean and bootstrap confidence interval over seeds) is written to the
+sweep directory.
+
+Figures are rendered headless with the Agg backend in a process pool. A figure is skipped if
+the data files of its runs and the export options haven't changed since it was last written.
+
+Usage:
+
+    python export.py path/to/sweep_dir [--formats png svg] [--keys avg_return] [--force]
+"""
+import os
+import json
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+import rlalgs.analysis.analyser as analyser
+import rlalgs.analysis.aggregate as aggregate
+import rlalgs.analysis.downsample as downsample
+
+INDEX_FNAME = ".figures.json"
+
+
+def get_run_dirs(exp_dir):
+    """
+    Get run directories (containing a config.json) of experiment
+    """
+    return sorted(d for d in analyser.get_subdirectories(exp_dir)
+                  if os.path.exists(os.path.join(d, "config.json")))
+
+
+def _new_figure(rows=1, cols=1, size=(6.4, 4.8)):
+    fig = Figure(figsize=(size[0] * cols, size[1] * rows))
+    FigureCanvasAgg(fig)
+    return fig, fig.subplots(rows, cols, squeeze=False)
+
+
+def _save(fig, out_base, formats, dpi):
+    fnames = []
+    for fmt in formats:
+        fname = "{}.{}".format(out_base, fmt)
+        fig.savefig(fname, format=fmt, dpi=dpi)
+        fnames.append(fname)
+    return fnames
+
+
+def render_experiment(exp_dir, out_base, formats, x_key="epoch", dpi=100):
+    """
+    Render figure of all metrics of experiment averaged over its runs
+
+    Returns:
+        list fnames : files written
+    """
+    data, configs = analyser.load_all_experiment_runs(exp_dir, workers=1)
+    avg_data, err_data = analyser.average_over_runs(data, x_key)
+    y_keys = [k for k in avg_data if k != x_key]
+    rows, cols = analyser.get_fig_grid_dims(len(y_keys))
+    fig, axes = _new_figure(rows, cols)
+    key = (os.path.abspath(exp_dir), x_key, analyser.experiment_signature(exp_dir))
+    for i, y_key in enumerate(y_keys):
+        analyser.plot_data(axes[i // cols][i % cols], avg_data, x_key, y_key, err_data,
+                           key=key)
+    for i in range(len(y_keys), rows * cols):
+        axes[i // cols][i % cols].set_axis_off()
+    fig.suptitle(configs[0].get("exp_name", os.path.basename(exp_dir)))
+    fig.tight_layout()
+    return _save(fig, out_base, formats, dpi)
+
+
+def render_comparison(exp_dirs, y_key, out_base, formats, x_key="epoch", n_boot=1000,
+                      dpi=100):
+    """
+    Render figure comparing y_key of experiments, as mean and 95% bootstrap confidence interval
+    over each experiment's runs
+
+    Returns:
+        list fnames : files written
+    """
+    fig, axes = _new_figure()
+    ax = axes[0][0]
+    n_points = downsample.axis_points(ax)
+    for exp_dir in exp_dirs:
+        data, _ = analyser.load_all_experiment_runs(exp_dir, workers=1)
+        x, values, mask, _ = aggregate.stack_runs(data, x_key, [y_key])
+        stats = aggregate.aggregate(values, mask, quantiles=(), n_boot=n_boot)
+        x, mean, low, high = downsample.downsample(
+            x, stats["mean"][:, 0], n_points,
+            others=(stats["ci_low"][:, 0], stats["ci_high"][:, 0]))
+        line, = ax.plot(x, mean, label=os.path.basename(exp_dir))
+        ax.fill_between(x, low, high, alpha=0.2, color=line.get_color())
+    ax.set_xlabel(x_key)
+    ax.set_ylabel(y_key)
+    ax.legend(fontsize="small")
+    fig.tight_layout()
+    return _save(fig, out_base, formats, dpi)
+
+
+def _signature(run_dirs, options):
+    return json.dumps([[os.path.basename(d), analyser.run_signature(d)] for d in run_dirs]
+                      + [options])
+
+
+def _load_index(out_dir):
+    fname = os.path.join(out_dir, INDEX_FNAME)
+    if not os.path.exists(fname):
+        return {}
+    with open(fname) as fin:
+        return json.load(fin)
+
+
+def _write_index(out_dir, index):
+    fname = os.path.join(out_dir, INDEX_FNAME)
+    with open(fname + ".tmp", "w") as fout:
+        json.dump(index, fout, indent=2)
+    os.replace(fname + ".tmp", fname)
+
+
+def export_figures(sweep_dir, formats=["png"], keys=["avg_return"], x_key="epoch",
+                   workers=None, force=False, n_boot=1000, dpi=100):
+    """
+    Export experiment and comparison figures for all experiments in sweep_dir
+
+    sweep_dir can also be a single experiment directory (i.e. containing runs), in which case
+    only its experiment figure is exported.
+
+    Arguments:
+        str sweep_dir : directory containing experiment directories
+        list formats : figure file formats (e.g. png, svg)
+        list keys : metrics to compare between experiments
+        str x_key : column to align runs on and plot against
+        int workers : max number of processes rendering figures (if None uses number of cpus)
+        bool force : whether to render figures even if inputs haven't changed
+        int n_boot : number of bootstrap samples for comparison confidence intervals
+        int dpi : resolution of raster figures
+
+    Returns:
+        list fnames : files written
+    """
+    if len(get_run_dirs(sweep_dir)) > 0:
+        exp_dirs = [sweep_dir]
+    else:
+        exp_dirs = sorted(d for d in analyser.get_subdirectories(sweep_dir)
+                          if len(get_run_dirs(d)) > 0)
+    options = dict(formats=sorted(formats), x_key=x_key, dpi=dpi)
+
+    # jobs of (output dir, figure name, signature, render function, args)
+    jobs = []
+    for exp_dir in exp_dirs:
+        name = os.path.basename(os.path.normpath(exp_dir)) + "_metrics"
+        jobs.append((exp_dir, name, _signature(get_run_dirs(exp_dir), options),
+                     render_experiment, (exp_dir, os.path.join(exp_dir, name), formats, x_key,
+                                         dpi)))
+    if len(exp_dirs) > 1:
+        all_runs = [d for exp_dir in exp_dirs for d in get_run_dirs(exp_dir)]
+        for y_key in keys:
+            name = "compare_" + y_key
+            sig = _signature(all_runs, dict(options, y_key=y_key, n_boot=n_boot))
+            jobs.append((sweep_dir, name, sig, render_comparison,
+                         (exp_dirs, y_key, os.path.join(sweep_dir, name), formats, x_key, n_boot,
+                          dpi)))
+
+    indexes = {}
+    todo = []
+    for out_dir, name, sig, fn, args in jobs:
+        index = indexes.setdefault(out_dir, _load_index(out_dir))
+        outputs_exist = all(os.path.exists(os.path.join(out_dir, "{}.{}".format(name, fmt)))
+                            for fmt in formats)
+        if force or index.get(name) != sig or not outputs_exist:
+            todo.append((out_dir, name, sig, fn, args))
+    print("Exporting {} of {} figures ({} unchanged)".format(len(todo), len(jobs),
+                                                           len(jobs) - len(todo)))
+
+    written = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(fn, *args): (out_dir, name, sig)
+                   for out_dir, name, sig, fn, args in todo}
+        for future in as_completed(futures):
+            out_dir, name, sig = futures[future]
+            try:
+                fnames = future.result()
+            except Exception as e:
+                print("Failed to export {}: {}".format(os.path.join(out_dir, name), e))
+                continue
+            indexes[out_dir][name] = sig
+            written += fnames
+            print("Exported {}".format(", ".join(fnames)))
+    for out_dir, index in indexes.items():
+        _write_index(out_dir, index)
+    return written
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('sweep_dir', type=str,
+                        help="path to directory of experiments (or single experiment)")
+    parser.add_argument('--formats', type=str, nargs="+", default=["png"])
+    parser.add_argument('--keys', type=str, nargs="+", default=["avg_return"],
+                        help="metrics to compare between experiments")
+    parser.add_argument('--x_key', type=str, default="epoch")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--force', action="store_true",
+                        help="export all figures, even if unchanged")
+    parser.add_argument('--dpi', type=int, default=100)
+    args = parser.parse_args()
+
+    export_figures(args.sweep_dir, args.formats, args.keys, args.x_key, args.workers, args.force,
+                   dpi=args.dpi)
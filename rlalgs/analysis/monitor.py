@@ -0,0 +1,314 @@
+"""
+Live monitor for running experiments
+
+Tails the output of one or many runs, reading only the rows appended since the last poll
+(from the progress file, or the binary metrics store if the run has no progress.txt), and keeps
+rolling statistics of the monitored metrics updated incrementally.
+
+Usage:
+
+    python monitor.py path/to/exp_or_run_dir [more dirs ...] [--keys avg_return] [--window n]
+        [--interval secs] [--plot]
+
+Directories are searched for runs, so an experiment parent directory can be given to monitor
+all its runs, including runs started after the monitor.
+"""
+import os
+import time
+import math
+from collections import deque
+import numpy as np
+import matplotlib.pyplot as plt
+from prettytable import PrettyTable
+import rlalgs.utils.metrics as metrics
+import rlalgs.analysis.downsample as downsample
+
+PROGRESS_FNAME = "progress.txt"
+
+
+class ProgressTail:
+    """
+    Reads rows appended to a tab separated progress file since the last poll
+    """
+
+    def __init__(self, fname):
+        self.fname = fname
+        self.offset = 0
+        self.partial = b""
+        self.headers = None
+
+    def poll(self):
+        """
+        Read new complete rows
+
+        Returns:
+            dict columns : maps column name to array of new values (None if file was rewritten,
+                e.g. by a resumed run, in which case the next poll reads it from the start)
+        """
+        size = os.path.getsize(self.fname)
+        if size < self.offset:
+            self.offset, self.partial, self.headers = 0, b"", None
+            return None
+        if size == self.offset:
+            return {}
+        with open(self.fname, "rb") as fin:
+            fin.seek(self.offset)
+            data = fin.read(size - self.offset)
+        self.offset += len(data)
+        lines = (self.partial + data).split(b"\n")
+        # last line is incomplete (or empty if data ended with newline)
+        self.partial = lines.pop()
+        if self.headers is None and len(lines) > 0:
+            self.headers = lines.pop(0).decode().split("\t")
+        rows = [line.decode().split("\t") for line in lines if len(line) > 0]
+        if self.headers is None or len(rows) == 0:
+            return {}
+        return {k: np.array([_to_float(r[i]) for r in rows]) for i, k in enumerate(self.headers)}
+
+
+def _to_float(s):
+    try:
+        return float(s)
+    except ValueError:
+        return math.nan
+
+
+class MetricsTail:
+    """
+    Reads rows appended to a binary metrics store since the last poll
+    """
+
+    def __init__(self, run_dir):
+        self.run_dir = run_dir
+        self.rows = 0
+
+    def poll(self):
+        """
+        Read new complete rows
+
+        Returns:
+            dict columns : maps column name to array of new values (None if store was rewritten,
+                e.g. by a resumed run, in which case the next poll reads it from the start)
+        """
+        n = metrics.metrics_rows(self.run_dir)
+        if n < self.rows:
+            self.rows = 0
+            return None
+        if n == self.rows:
+            return {}
+        columns = metrics.load_metrics(self.run_dir, self.rows)
+        self.rows += min(len(c) for c in columns.values()) if len(columns) > 0 else 0
+        return columns
+
+
+class RollingStats:
+    """
+    Incrementally updated statistics of a metric: mean and standard deviation over last window
+    values, and last, best and count over all values
+    """
+
+    def __init__(self, window):
+        self.values = deque(maxlen=window)
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.count = 0
+        self.last = math.nan
+        self.best = math.nan
+
+    def update(self, new_values):
+        for v in new_values:
+            if not math.isfinite(v):
+                continue
+            if len(self.values) == self.values.maxlen:
+                old = self.values[0]
+                self.total -= old
+                self.total_sq -= old * old
+            self.values.append(v)
+            self.total += v
+            self.total_sq += v * v
+            self.count += 1
+            self.last = v
+            self.best = v if math.isnan(self.best) else max(self.best, v)
+
+    def mean(self):
+        return self.total / len(self.values) if len(self.values) > 0 else math.nan
+
+    def std(self):
+        n = len(self.values)
+        if n == 0:
+            return math.nan
+        return math.sqrt(max(0.0, self.total_sq / n - (self.total / n) ** 2))
+
+
+class RunMonitor:
+    """
+    Monitors a single run
+    """
+
+    def __init__(self, run_dir, keys, window, x_key="epoch", keep_history=False):
+        self.run_dir = run_dir
+        self.keys = keys
+        self.window = window
+        self.x_key = x_key
+        self.keep_history = keep_history
+        self.tail = None
+        self.reset()
+
+    def reset(self):
+        self.stats = {k: RollingStats(self.window) for k in self.keys}
+        self.history = {k: [] for k in [self.x_key] + self.keys}
+        self.last_update = None
+
+    def _get_tail(self):
+        # progress file is preferred, since metrics store is only written every block of rows
+        if self.tail is None:
+            progress_fname = os.path.join(self.run_dir, PROGRESS_FNAME)
+            if os.path.exists(progress_fname):
+                self.tail = ProgressTail(progress_fname)
+            elif metrics.has_metrics(self.run_dir):
+                self.tail = MetricsTail(self.run_dir)
+        return self.tail
+
+    def poll(self):
+        """
+        Read new rows and update statistics, returns whether there were any new rows
+        """
+        tail = self._get_tail()
+        if tail is None:
+            return False
+        columns = tail.poll()
+        if columns is None:
+            self.reset()
+            columns = tail.poll()
+        if len(columns) == 0:
+            return False
+        for k in self.keys:
+            if k in columns:
+                self.stats[k].update(columns[k].tolist())
+        if self.keep_history:
+            for k, values in self.history.items():
+                if k in columns:
+                    values.extend(columns[k].tolist())
+        self.last_update = time.time()
+        return True
+
+
+def find_runs(dirs):
+    """
+    Find run directories (containing a progress file or metrics store) within dirs
+    """
+    runs = []
+    for d in dirs:
+        for root, sub_dirs, files in os.walk(d):
+            if PROGRESS_FNAME in files or metrics.has_metrics(root):
+                runs.append(root)
+                # don't search run's own output directories
+                sub_dirs[:] = []
+    return sorted(runs)
+
+
+class Monitor:
+    """
+    Monitors all runs in a set of directories, picking up new runs as they start
+    """
+
+    def __init__(self, dirs, keys=["avg_return"], window=10, x_key="epoch", keep_history=False):
+        """
+        Arguments:
+            list dirs : run or experiment directories to monitor
+            list keys : metrics to monitor
+            int window : number of most recent rows rolling statistics are over
+            str x_key : x axis metric, stored in history
+            bool keep_history : whether to keep all values of monitored metrics (e.g. to plot)
+        """
+        self.dirs = dirs
+        self.keys = keys
+        self.window = window
+        self.x_key = x_key
+        self.keep_history = keep_history
+        self.runs = {}
+
+    def poll(self):
+        """
+        Poll all runs, returns number of runs with new rows
+        """
+        for run_dir in find_runs(self.dirs):
+            if run_dir not in self.runs:
+                self.runs[run_dir] = RunMonitor(run_dir, self.keys, self.window, self.x_key,
+                                                self.keep_history)
+        return sum(run.poll() for run in self.runs.values())
+
+    def report(self):
+        """
+        Print table of rolling statistics of each run
+        """
+        table = PrettyTable()
+        table.field_names = ["Run", "Rows"] + \
+            ["{} ({})".format(k, s) for k in self.keys for s in ["mean", "std", "last", "best"]] + \
+            ["Updated (s ago)"]
+        now = time.time()
+        for run_dir, run in sorted(self.runs.items()):
+            rows = max([s.count for s in run.stats.values()] + [0])
+            row = [os.path.relpath(run_dir), rows]
+            for k in self.keys:
+                s = run.stats[k]
+                row += ["%.3g" % v for v in [s.mean(), s.std(), s.last, s.best]]
+            row.append("-" if run.last_update is None else "%.0f" % (now - run.last_update))
+            table.add_row(row)
+        print(table)
+
+    def plot(self, axes):
+        """
+        Plot history of monitored metrics of each run, one metric per axis, downsampled to
+        the axis width
+        """
+        for ax, k in zip(axes, self.keys):
+            ax.clear()
+            n_points = downsample.axis_points(ax)
+            for run_dir, run in sorted(self.runs.items()):
+                y = run.history[k]
+                x = run.history[self.x_key]
+                if len(x) != len(y):
+                    x = range(len(y))
+                x, y = downsample.downsample(x, y, n_points, key=(run_dir, k))
+                ax.plot(x, y, label=os.path.basename(run_dir))
+            ax.set_xlabel(self.x_key)
+            ax.set_ylabel(k)
+        if len(self.runs) <= 10:
+            axes[0].legend(fontsize="small")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('dirs', type=str, nargs="+",
+                        help="run or experiment directories to monitor")
+    parser.add_argument('--keys', type=str, nargs="+", default=["avg_return"],
+                        help="metrics to monitor")
+    parser.add_argument('--window', type=int, default=10,
+                        help="number of recent epochs rolling statistics are over")
+    parser.add_argument('--interval', type=float, default=5.0,
+                        help="seconds between polls")
+    parser.add_argument('--plot', action="store_true",
+                        help="plot monitored metrics of each run")
+    args = parser.parse_args()
+
+    print("\nMonitoring {}".format(", ".join(args.dirs)))
+    monitor = Monitor(args.dirs, args.keys, args.window, keep_history=args.plot)
+    if args.plot:
+        plt.ion()
+        fig, axes = plt.subplots(len(args.keys), 1, squeeze=False)
+        axes = axes[:, 0]
+    try:
+        while True:
+            if monitor.poll() > 0:
+                monitor.report()
+                if args.plot:
+                    monitor.plot(axes)
+                    fig.canvas.draw_idle()
+            if args.plot:
+                plt.pause(args.interval)
+            else:
+                time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
@@ -13,16 +13,43 @@ Usage:
 
     python plot.py path/to/data/file.txt [--smooth n]
 
+If the file's directory contains a metrics store (see rlalgs.utils.metrics) it is read
+instead of the file. A run output directory can also be given in place of the file.
 """
+import os
+import os.path as osp
 import pandas as pd
 import matplotlib.pyplot as plt
+import rlalgs.utils.metrics as metrics
+import rlalgs.analysis.analyser as analyser
+import rlalgs.analysis.downsample as downsample
 
 LINE = "\n" + "-" * 60 + "\n"
 
 
-def plot(file_path, smooth_period):
+def load_data(file_path):
+    """
+    Load logged data from logger output file or run output directory
+    """
+    run_dir = file_path if osp.isdir(file_path) else osp.dirname(file_path)
+    if metrics.has_metrics(run_dir):
+        return pd.DataFrame(metrics.load_metrics(run_dir))
+    return pd.read_table(file_path)
 
-    df = pd.read_table(file_path)
+
+def plot(file_path, smooth_period, max_points=None, method="minmax"):
+    """
+    Print statistics of and plot average return of run
+
+    Arguments:
+        str file_path : logger output file or run output directory
+        int smooth_period : number of epochs to smooth returns over
+        int max_points : number of points curve is downsampled to before plotting (if None
+            uses twice the axis width in pixels)
+        str method : downsampling method (see rlalgs.analysis.downsample)
+    """
+
+    df = load_data(file_path)
     x = df["epoch"]
     y = df["avg_return"]
     # eps = df["total_eps"]
@@ -67,11 +94,23 @@ def plot(file_path, smooth_period):
     print("\tStandard dev: {:.3f} secs".format(epoch_times.std()))
     print(LINE)
 
+    n_points = downsample.axis_points(plt.gca()) if max_points is None else max_points
+    # signature in key, so a run that has since logged (or on resume rewritten) rows is
+    # downsampled again
+    if osp.isdir(file_path):
+        sig = analyser.run_signature(file_path)
+    else:
+        st = os.stat(file_path)
+        sig = analyser.run_signature(osp.dirname(file_path)) + ((st.st_mtime_ns, st.st_size), )
+    key = (osp.abspath(file_path), sig, "avg_return", smooth_period)
+    x, y_smooth_mean, y_rolling_std = downsample.downsample(
+        x.to_numpy(), y_smooth_mean.to_numpy(), n_points, method, key,
+        others=(y_rolling_std.to_numpy(), ))
     plt.plot(x, y_smooth_mean)
     plt.fill_between(x, y_smooth_mean-y_rolling_std, y_smooth_mean+y_rolling_std, alpha=0.5)
     plt.xlabel("epoch")
     plt.ylabel("average return")
-    plt.title(file_path.split("/")[-1])
+    plt.title(osp.basename(osp.normpath(file_path)))
 
     plt.show()
 
@@ -80,12 +119,16 @@ if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument('file', metavar='file', type=str,
-                        help='path to logger output file')
+                        help='path to logger output file or run output directory')
     parser.add_argument('--smooth', type=int, default=1,
                         help='Number of epochs to smooth returns over')
+    parser.add_argument('--max_points', type=int, default=None,
+                        help='Number of points to downsample curve to (default: from plot width)')
+    parser.add_argument('--downsample', type=str, default="minmax",
+                        choices=downsample.METHODS, help='Downsampling method')
     args = parser.parse_args()
 
     print("\nResults plotter")
     print("Plotting results from {}".format(args.file))
     print("Using smoothing period of {}".format(args.smooth))
-    plot(args.file, args.smooth)
+    plot(args.file, args.smooth, args.max_points, args.downsample)
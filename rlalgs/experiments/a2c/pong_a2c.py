@@ -1,9 +1,9 @@
-import gym
 import time
 import datetime
 import multiprocessing
 import rlalgs.utils.mpi as mpi
 from rlalgs.algos.a2c.a2c import a2c
+from rlalgs.utils.wrappers import make_env_fn
 from rlalgs.utils.logger import setup_logger_kwargs
 from rlalgs.utils.preprocess import preprocess_pong_image
 
@@ -17,7 +17,8 @@ cpu = multiprocessing.cpu_count() - 1
 mpi.mpi_fork(cpu)
 mpi.print_msg(f"\nStarting Pong training using A2C and {cpu} processes")
 
-env = "Pong-v0"
+env = "PongNoFrameskip-v4"
+frame_skip = 4     # repeat each action for 4 frames, max-pooling last two
 training_steps = int(16e7)
 steps_per_epoch = 5000 * cpu       # > average complete episode length
 epochs = int(training_steps/steps_per_epoch)
@@ -48,7 +49,7 @@ params = {
 
 start_time = time.time()
 mpi.print_msg(f"Start time = {time.ctime()}")
-a2c(lambda: gym.make(env), **params)
+a2c(make_env_fn(env, frame_skip), **params)
 end_time = time.time()
 mpi.print_msg(f"End time = {time.ctime()}")
 total_time = end_time - start_time
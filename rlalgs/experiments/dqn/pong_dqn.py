@@ -11,13 +11,14 @@ Features of the DQN paper (for atari):
 - Epsilon annealed from 1 to 0.1 over first 1 million frames
 - trained for 10 million frames
 """
-import gym
 import time
 from rlalgs import dqn
+from rlalgs.utils.wrappers import make_env_fn
 from rlalgs.utils.logger import setup_logger_kwargs
 from rlalgs.utils.preprocess import preprocess_pong_image
 
-env = "Pong-v0"
+env = "PongNoFrameskip-v4"
+frame_skip = 4     # repeat each action for 4 frames, max-pooling last two
 training_steps = int(5e7)   # from atari paper (50 million frames)
 epoch_steps = 10000         # set to be same as target_update_freq
 epochs = int(training_steps/epoch_steps)
@@ -51,7 +52,7 @@ params = {
 print("\nStarting Pong training using DQN")
 start_time = time.time()
 print("Start time = {}\n".format(start_time))
-dqn(lambda: gym.make(env), **params)
+dqn(make_env_fn(env, frame_skip), **params)
 end_time = time.time()
 print("\nEnd time = {}\n".format(end_time))
 print("Total training time = {} hours\n".format((end_time - start_time)/3600))
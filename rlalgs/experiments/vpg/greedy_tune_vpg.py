@@ -3,6 +3,7 @@ Greedy Search Hyperparameter tuning for VPG
 """
 from rlalgs.algos.vpg.vpg import vpg
 from rlalgs.tuner.greedy_tuner import GreedyTuner
+import rlalgs.tuner.cache as cache
 
 
 HYPERPARAMS = {
@@ -16,6 +17,9 @@ if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument("--env", type=str, default='CartPole-v0')
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--no_cache", action="store_true",
+                        help="rerun experiments already in result cache")
     parser.add_argument("--epochs", type=int, default=25)
     parser.add_argument("--num_trials", type=int, default=5)
     parser.add_argument("--metric", type=str, default="cum_return")
@@ -28,4 +32,5 @@ if __name__ == "__main__":
     for k, v in HYPERPARAMS.items():
         tuner.add(k, v[1], default=v[0])
 
-    tuner.run(vpg, num_cpu=1, data_dir="vpg_greedy_tune")
+    tuner.run(vpg, num_cpu=1, data_dir="vpg_greedy_tune", workers=args.workers,
+              cache_dir=None if args.no_cache else cache.DEFAULT_DIR)
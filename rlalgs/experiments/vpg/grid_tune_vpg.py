@@ -4,6 +4,7 @@ results to file
 """
 from rlalgs.algos.vpg.vpg import vpg
 from rlalgs.tuner.grid_tuner import GridTuner
+import rlalgs.tuner.cache as cache
 
 
 HYPERPARAMS = {
@@ -18,6 +19,9 @@ if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument("--env", type=str, default='CartPole-v0')
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--no_cache", action="store_true",
+                        help="rerun experiments already in result cache")
     parser.add_argument("--num_runs", type=int, default=5)
     args = parser.parse_args()
 
@@ -29,4 +33,5 @@ if __name__ == "__main__":
     for k, v in HYPERPARAMS.items():
         tuner.add(k, v[1])
 
-    tuner.run(vpg, num_cpu=1, data_dir="vpg_tune")
+    tuner.run(vpg, num_cpu=1, data_dir="vpg_tune", workers=args.workers,
+              cache_dir=None if args.no_cache else cache.DEFAULT_DIR)
@@ -0,0 +1,46 @@
+"""
+Hyperband Hyperparameter tuning for VPG
+"""
+import numpy as np
+from rlalgs.algos.vpg.vpg import vpg
+from rlalgs.tuner.hyperband_tuner import HyperbandTuner
+import rlalgs.tuner.cache as cache
+
+
+HYPERPARAMS = {
+    "pi_lr": lambda: np.random.uniform(0.001, 0.1),
+    "v_lr": lambda: np.random.uniform(0.001, 0.1),
+    # "gamma": (0.99, [0.9, 0.995, 1]),
+    "hidden_sizes": [[32], [64], [256], [64, 64], [100, 50, 25], [400, 300]]
+}
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--env", type=str, default='CartPole-v0')
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--no_cache", action="store_true",
+                        help="rerun experiments already in result cache")
+    parser.add_argument("--sample_seed", type=int, default=0,
+                        help="seed for sampling variants, so restarted sweep is resumed")
+    parser.add_argument("--max_epochs", type=int, default=27)
+    parser.add_argument("--min_epochs", type=int, default=1)
+    parser.add_argument("--eta", type=int, default=3)
+    parser.add_argument("--num_trials", type=int, default=5)
+    parser.add_argument("--metric", type=str, default="cum_return")
+    args = parser.parse_args()
+    np.random.seed(args.sample_seed)
+
+    tuner = HyperbandTuner(args.max_epochs, args.min_epochs, args.eta, name="VPG_"+args.env,
+                           seeds=args.num_trials, metric=args.metric)
+    tuner.add('env_name', args.env)
+
+    for k, v in HYPERPARAMS.items():
+        if callable(v):
+            tuner.add_dist(k, v)
+        else:
+            tuner.add(k, v)
+
+    tuner.run(vpg, num_cpu=1, data_dir="vpg_hyperband_tune", workers=args.workers,
+              cache_dir=None if args.no_cache else cache.DEFAULT_DIR)
@@ -1,10 +1,11 @@
-import gym
 import time
 from rlalgs.algos.vpg.vpg import vpg
+from rlalgs.utils.wrappers import make_env_fn
 from rlalgs.utils.logger import setup_logger_kwargs
 from rlalgs.utils.preprocess import preprocess_pong_image
 
-env = "Pong-v0"
+env = "PongNoFrameskip-v4"
+frame_skip = 4     # repeat each action for 4 frames, max-pooling last two
 training_steps = int(4e7)
 batch_size = 5000       # > average complete episode length
 epochs = int(training_steps/batch_size)
@@ -32,7 +33,7 @@ params = {
 print("\nStarting Pong training using VPG")
 start_time = time.time()
 print("Start time = {}\n".format(start_time))
-vpg(lambda: gym.make(env), **params)
+vpg(make_env_fn(env, frame_skip), **params)
 end_time = time.time()
 print("\nEnd time = {}\n".format(end_time))
 print("Total training time = {}\n".format(end_time - start_time))
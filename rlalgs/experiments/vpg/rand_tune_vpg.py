@@ -4,6 +4,7 @@ Random Search Hyperparameter tuning for VPG
 import numpy as np
 from rlalgs.algos.vpg.vpg import vpg
 from rlalgs.tuner.random_tuner import RandomTuner
+import rlalgs.tuner.cache as cache
 
 
 HYPERPARAMS = {
@@ -18,11 +19,17 @@ if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument("--env", type=str, default='CartPole-v0')
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--no_cache", action="store_true",
+                        help="rerun experiments already in result cache")
+    parser.add_argument("--sample_seed", type=int, default=0,
+                        help="seed for sampling variants, so restarted sweep is resumed")
     parser.add_argument("--num_exps", type=int, default=16)
     parser.add_argument("--epochs", type=int, default=25)
     parser.add_argument("--num_trials", type=int, default=5)
     parser.add_argument("--metric", type=str, default="cum_return")
     args = parser.parse_args()
+    np.random.seed(args.sample_seed)
 
     tuner = RandomTuner(args.num_exps, name="VPG_"+args.env, seeds=args.num_trials, metric=args.metric)
     tuner.add('env_name', args.env)
@@ -34,4 +41,5 @@ if __name__ == "__main__":
         else:
             tuner.add(k, v)
 
-    tuner.run(vpg, num_cpu=1, data_dir="vpg_rand_tune")
+    tuner.run(vpg, num_cpu=1, data_dir="vpg_rand_tune", workers=args.workers,
+              cache_dir=None if args.no_cache else cache.DEFAULT_DIR)
@@ -4,11 +4,15 @@ A module for running multiple training runs with different seeds in parallel.
 Note: each run/seed is run using a single CPU so cannot handle multiple runs of parallel
 algorithms (e.g. a2c).
 
+The tf session of each run is configured using the exec_config algorithm argument (see
+rlalgs.utils.session.ExecConfig), which by default shares the available cores between runs.
+
 Functionallity:
 - Inputs:
     1. An YAML file defining what's to be run, including:
         1. name of algorithm
         2. algorith arguments and hyperparams, including environment
+        3. (optional) frame_skip, number of frames to repeat each action for
     2. number of cpus (this will control number of simoultaneuos runs)
         - the cpu rank will also be
     3. experiment name
@@ -16,11 +20,11 @@ Functionallity:
     - results of running algorithm using algorithm arguments with different seeds the specified
     number of runs using the specified number of cpus
 """
-import gym
 import yaml
 import rlalgs   # noqa
 import rlalgs.utils.mpi as mpi
 import rlalgs.utils.logger as log
+import rlalgs.utils.wrappers as wrappers
 from rlalgs.algos import VALID_ALGOS
 import rlalgs.utils.preprocess as preprocess
 
@@ -33,14 +37,14 @@ def run_exp(exp_file, exp_name, seed):
     """
     Loads and runs the experiment
     """
-    alg_name, env, args = load_exp(exp_file)
+    alg_name, env, args, frame_skip = load_exp(exp_file)
     exp_name = f"{alg_name}_{env}" if exp_name is None else exp_name
     alg_fn = eval("rlalgs."+alg_name)
     seed += mpi.proc_id()
     verbose = mpi.proc_id() == 0
 
     print_msg(f"Starting training")
-    run_alg(alg_fn, env, args, seed, exp_name, verbose)
+    run_alg(alg_fn, env, args, seed, exp_name, verbose, frame_skip)
     print_msg(f"Finished training")
 
 
@@ -55,10 +59,11 @@ def load_exp(exp_file):
     algo = exp["algo"]
     env = exp["env"]
     args = exp.get("args")
-    return algo, env, args
+    frame_skip = exp.get("frame_skip", 1)
+    return algo, env, args, frame_skip
 
 
-def run_alg(alg_fn, env, alg_args, seed, exp_name, verbose):
+def run_alg(alg_fn, env, alg_args, seed, exp_name, verbose, frame_skip=1):
     """
     Run algorithm
     """
@@ -68,7 +73,7 @@ def run_alg(alg_fn, env, alg_args, seed, exp_name, verbose):
     alg_args["logger_kwargs"] = logger_kwargs
     alg_args["preprocess_fn"] = preprocess_fn
     alg_args["obs_dim"] = obs_dim
-    alg_fn(lambda: gym.make(env), **alg_args)
+    alg_fn(wrappers.make_env_fn(env, frame_skip), **alg_args)
 
 
 if __name__ == "__main__":
@@ -4,9 +4,13 @@ standard benchmarks
 """
 import gym
 import time
+import os.path as osp
 import tensorflow as tf
 import rlalgs.utils.logger as logger
 import rlalgs.tester.utils as testutils
+import rlalgs.utils.frames as frames
+import rlalgs.utils.wrappers as wrappers
+import rlalgs.utils.checkpoints as checkpoints
 import rlalgs.utils.preprocess as preprocess
 
 # Just disables the warning, doesn't enable AVX/FMA
@@ -14,7 +18,7 @@ import os
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
 
 
-def run_episode(sess, env, x, pi, render, preprocess_fn):
+def run_episode(sess, env, x, pi, render, preprocess_fn, stacker=None):
     """
     Runs a single episode of the given environment for a model
 
@@ -23,6 +27,7 @@ def run_episode(sess, env, x, pi, render, preprocess_fn):
         env : the gym environment
         x : the policy model input tf placeholder
         pi : the policy model output tf placeholder
+        stacker : FrameStack for models that take stacked frames as input (None if not stacking)
 
     Returns:
         epRew : total reward for episode
@@ -35,6 +40,8 @@ def run_episode(sess, env, x, pi, render, preprocess_fn):
             env.render()
             time.sleep(0.01)
         o = preprocess_fn(o, env)
+        if stacker is not None:
+            o = stacker.reset(o) if t == 0 else stacker.push(o)
         a = sess.run(pi, {x: o.reshape(1, -1)})
         try:
             a_processed = a[0]
@@ -60,7 +67,7 @@ def load_model(fpath):
         pi : the policy model output tf placeholder
     """
     sess = tf.Session()
-    model_vars = logger.restore_model(sess, args.fpath)
+    model_vars = logger.restore_model(sess, fpath)
     x = model_vars["inputs"][logger.OBS_NAME]
     pi = model_vars["outputs"][logger.ACTS_NAME]
     return sess, x, pi
@@ -70,11 +77,18 @@ if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument("fpath", metavar='fpath', type=str,
-                        help="saved model directory name (i.e. the simple_save folder)")
+                        help=("saved model directory name (i.e. the simple_save folder), or run "
+                              "output directory containing a checkpoint index"))
+    parser.add_argument("--checkpoint", type=str, default="last",
+                        help="checkpoint to load from run directory: 'last', 'best' or epoch")
     parser.add_argument("--trials", type=int, default=100)
     parser.add_argument("--render", action="store_true")
     args = parser.parse_args()
 
+    if osp.exists(osp.join(args.fpath, checkpoints.INDEX_FNAME)):
+        args.fpath = checkpoints.find_checkpoint(args.fpath, args.checkpoint)
+        print("Loading checkpoint {}".format(args.fpath))
+
     env_name = logger.get_env_name(args.fpath)
     trials, reward = testutils.get_benchmark(env_name)
     if trials is None or reward is None:
@@ -82,14 +96,20 @@ if __name__ == "__main__":
               .format(env_name))
         trials = args.trials
     print("Running for {} trials".format(trials))
-    env = gym.make(env_name)
+    env = wrappers.wrap_env(gym.make(env_name), logger.get_frame_skip(args.fpath))
 
     sess, x, pi = load_model(args.fpath)
-    preprocess_fn, _ = preprocess.get_preprocess_fn(env_name)
+    preprocess_fn, obs_dim = preprocess.get_preprocess_fn(env_name)
+    frame_stack = logger.get_frame_stack(args.fpath)
+    stacker = None
+    if frame_stack > 1:
+        if obs_dim is None:
+            obs_dim = x.shape.as_list()[-1] // frame_stack
+        stacker = frames.FrameStack(obs_dim, frame_stack)
 
     total_rew = 0
     for i in range(trials):
-        ep_rew, t = run_episode(sess, env, x, pi, args.render, preprocess_fn)
+        ep_rew, t = run_episode(sess, env, x, pi, args.render, preprocess_fn, stacker)
         print("Trial {}: \t total reward = {}, total steps = {}".format(i, ep_rew, t))
         total_rew += ep_rew
 
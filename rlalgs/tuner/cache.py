@@ -0,0 +1,134 @@
+"""
+Persistent content-addressed cache of tuner experiment results
+
+Results returned by an algorithm for each experiment (variant and seed) are stored in a json
+file named by a hash of the algorithm, its hyperparameters, the seed and the version of the
+algorithm's code. Tuners look experiments up before running them, so restarting an interrupted
+sweep only runs the experiments that hadn't completed, and experiments already run by any tuner
+(e.g. the best variant of a grid search rerun by a greedy search) aren't run again.
+
+The code version is a hash of the source of the algorithm's module, so editing the algorithm
+invalidates its cached results. Changes elsewhere (e.g. to the environment or a util) are not
+detected, in which case pass an explicit code_version or clear the cache directory.
+"""
+import os
+import json
+import hashlib
+import inspect
+import os.path as osp
+import numpy as np
+
+
+DEFAULT_DIR = osp.join(osp.abspath(osp.dirname(osp.dirname(__file__))), 'data', 'tuner_cache')
+# experiment kwargs that don't change results, so aren't part of key
+IGNORED_KWARGS = ["resume_from", "logger_kwargs", "exec_config"]
+
+
+def canonicalize(value):
+    """
+    Convert value to json serializable value that is the same for equal values of different
+    types (e.g. tuple and list, numpy and python scalars), so it hashes consistently
+    """
+    if isinstance(value, dict):
+        return {str(k): canonicalize(v) for k, v in sorted(value.items(), key=lambda x: str(x[0]))}
+    if isinstance(value, (list, tuple)):
+        return [canonicalize(v) for v in value]
+    if isinstance(value, np.ndarray):
+        return canonicalize(value.tolist())
+    if isinstance(value, np.generic):
+        return value.item()
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if callable(value):
+        return "{}.{}".format(getattr(value, "__module__", ""),
+                              getattr(value, "__qualname__", repr(value)))
+    return repr(value)
+
+
+def algo_name(algo):
+    return "{}.{}".format(algo.__module__, algo.__qualname__)
+
+
+def code_version(algo):
+    """
+    Get version of algorithm code, as hash of source file of its module
+    """
+    try:
+        with open(inspect.getsourcefile(algo), "rb") as fin:
+            return hashlib.sha256(fin.read()).hexdigest()[:16]
+    except (TypeError, OSError):
+        # e.g. algorithm defined interactively, so has no source file
+        return "unknown"
+
+
+class ResultCache:
+    """
+    Stores results of experiments, one json file per experiment
+    """
+
+    def __init__(self, cache_dir=None, code_version=None):
+        """
+        Arguments:
+            str cache_dir : cache directory (if None uses DEFAULT_DIR)
+            str code_version : version used for all algorithms. If None version of each
+                algorithm is hash of its module's source.
+        """
+        self.cache_dir = DEFAULT_DIR if cache_dir is None else cache_dir
+        self.code_version = code_version
+        self._versions = {}
+
+    def _version(self, algo):
+        if self.code_version is not None:
+            return self.code_version
+        name = algo_name(algo)
+        if name not in self._versions:
+            self._versions[name] = code_version(algo)
+        return self._versions[name]
+
+    def _fname(self, key):
+        return osp.join(self.cache_dir, key[:2], key + ".json")
+
+    def key(self, algo, kwargs):
+        """
+        Get key of experiment
+
+        Arguments:
+            func algo : algorithm
+            dict kwargs : kwargs experiment is run with, including seed
+
+        Returns:
+            str key : hash of algorithm, hyperparameters, seed and code version
+        """
+        params = {k: v for k, v in kwargs.items() if k not in IGNORED_KWARGS}
+        content = json.dumps({"algo": algo_name(algo), "params": canonicalize(params),
+                              "version": self._version(algo)}, sort_keys=True)
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def get(self, key):
+        """
+        Get results of experiment, returns None if not in cache
+        """
+        fname = self._fname(key)
+        if not osp.exists(fname):
+            return None
+        try:
+            with open(fname) as fin:
+                return json.load(fin)["results"]
+        except (ValueError, KeyError) as e:
+            print("Warning: ignoring unreadable result cache file {}: {}".format(fname, e))
+            return None
+
+    def put(self, key, algo, kwargs, results):
+        """
+        Store results of experiment, results must be a dict
+        """
+        fname = self._fname(key)
+        os.makedirs(osp.dirname(fname), exist_ok=True)
+        params = {k: v for k, v in kwargs.items() if k not in IGNORED_KWARGS}
+        entry = {"algo": algo_name(algo), "params": canonicalize(params),
+                 "version": self._version(algo), "results": canonicalize(results)}
+        # written to tmp file then renamed so an interrupted write leaves no partial entry
+        tmp_fname = "{}.{}.tmp".format(fname, os.getpid())
+        with open(tmp_fname, "w") as fout:
+            json.dump(entry, fout)
+        os.replace(tmp_fname, fname)
@@ -28,9 +28,10 @@ class GreedyTuner(Tuner):
         super().__init__(name, seeds, verbose, metric)
         self.best_vals = []
 
-    def _run(self, algo, num_cpu=1, data_dir=None):
+    def _run(self, algo, num_cpu=1, data_dir=None, workers=None):
         """
-        Run each variant in the grid with algorithm
+        Run each variant in the grid with algorithm, the variants of each hyperparameter are run
+        in parallel
         """
         results = {}
         num_exps = sum([len(v) for v in self.vals if len(v) > 0])
@@ -44,27 +45,26 @@ class GreedyTuner(Tuner):
                 continue
 
             print("\nOptimizing hyperparameter: {}\n\n{}".format(self.keys[idx], self.thick_line))
-            var_results = []
-            for var in variants:
-                print("{}\n{} experiment {} of {}".format(self.thick_line, self.name, exp_num, num_exps))
-                var_name = self.name_variant(var)
-
-                # only run variant if it has not already been run
-                if var_name not in results:
-                    var_result = self._run_variant(var_name, var, algo, num_cpu=num_cpu, data_dir=data_dir)
-                    results[var_name] = var_result
-                else:
-                    print(self.line)
-                    print("\tExperiment variant already run, so skipping.")
-                    print(self.line)
-
-                var_results.append(results[var_name])
-                exp_num += 1
-
-                print("{} experiment complete".format(var_name))
-                print("\nExperiment Results:")
-                self.print_results(var_results)
-                print(self.thick_line)
+            print("{}\n{} experiments {} to {} of {}".format(
+                self.thick_line, self.name, exp_num, exp_num + len(variants) - 1, num_exps))
+            named_variants = [(self.name_variant(var), var) for var in variants]
+            # only run variants that have not already been run
+            to_run = [(var_name, var) for var_name, var in named_variants if var_name not in results]
+            if len(to_run) < len(named_variants):
+                print(self.line)
+                print("\t{} experiment variants already run, so skipping."
+                      .format(len(named_variants) - len(to_run)))
+                print(self.line)
+            run_results = self._run_variants(to_run, algo, num_cpu=num_cpu, data_dir=data_dir,
+                                             workers=workers)
+            for (var_name, _), var_result in zip(to_run, run_results):
+                results[var_name] = var_result
+            var_results = [results[var_name] for var_name, _ in named_variants]
+            exp_num += len(variants)
+
+            print("\nExperiment Results:")
+            self.print_results(var_results)
+            print(self.thick_line)
 
             best_val, best_result = self.get_best_val(idx, var_results)
             self.best_vals.append(best_val)
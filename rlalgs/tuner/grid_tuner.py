@@ -19,30 +19,21 @@ class GridTuner(Tuner):
         """
         super().__init__(name, seeds, verbose, metric)
 
-    def _run(self, algo, num_cpu=1, data_dir=None):
+    def _run(self, algo, num_cpu=1, data_dir=None, workers=None):
         """
-        Run each variant in the grid with algorithm
+        Run each variant in the grid with algorithm, all variants are run in parallel
         """
         variants = []
         for var in self.variants():
             var_name = self.name_variant(var)
             variants.append((var_name, var))
 
-        num_exps = len(variants)
-        exp_num = 1
-        results = []
-        for var_name, var in variants:
-            print("{}\n{} experiment {} of {}"
-                  .format(self.thick_line, self.name, exp_num, num_exps))
-            var_result = self._run_variant(var_name, var, algo, num_cpu=num_cpu, data_dir=data_dir)
-            results.append(var_result)
-            exp_num += 1
-
-            print("{} experiment complete".format(var_name))
-            print("\nExperiment Results:")
-            self.print_results([var_result])
-            print(self.thick_line)
-
+        print("{}\n{} running {} experiments".format(self.thick_line, self.name, len(variants)))
+        results = self._run_variants(variants, algo, num_cpu=num_cpu, data_dir=data_dir,
+                                     workers=workers)
+        print("\nExperiment Results:")
+        self.print_results(results)
+        print(self.thick_line)
         return results
 
     def variants(self):
@@ -0,0 +1,212 @@
+"""
+Successive Halving and Hyperband based Hyperparameter optimization classes
+
+Successive halving runs a set of randomly sampled variants for a small number of epochs, keeps
+the best 1/eta of them (by the tuner metric) and runs the survivors for eta times more epochs,
+repeating until the survivors have been run for max_epochs. So most of the compute is spent
+on promising variants, with poor variants stopped early.
+
+Hyperband runs successive halving brackets with different trade-offs between the number of
+variants and the epochs each variant starts with, since it's not known in advance how early
+variants can be told apart.
+
+If the algorithm supports resuming (has a resume_from argument), surviving variants continue
+training from the end of their previous run, otherwise they are rerun from scratch.
+
+Reference:
+- Li et al (2018) Hyperband: A Novel Bandit-Based Approach to Hyperparameter Optimization
+"""
+import math
+import inspect
+import os.path as osp
+from rlalgs.tuner.random_tuner import RandomTuner
+from rlalgs.utils.logger import setup_logger_kwargs, TRAIN_STATE_DIR
+
+
+class SuccessiveHalvingTuner(RandomTuner):
+    """
+    Takes an algorithm and lists or distributions of hyperparam values and runs random
+    hyperparameter search using successive halving.
+
+    Number of epochs for each variant is set by the tuner, so must not be added as a
+    hyperparameter.
+    """
+
+    def __init__(self, num_exps, max_epochs, min_epochs=1, eta=3, name='', seeds=[0],
+                 verbose=False, metric="cum_return"):
+        """
+        Initialize an empty successive halving hyperparameter tuner with given name
+
+        Arguments:
+            int num_exps : number of different variants to start with
+            int max_epochs : number of epochs variants surviving all rounds are run for
+            int min_epochs : number of epochs all variants are run for in first round
+            int eta : 1/eta of variants are kept each round, and run for eta times more epochs
+        """
+        super().__init__(num_exps, name, seeds, verbose, metric)
+        assert eta >= 2, "eta must be at least 2"
+        assert 0 < min_epochs <= max_epochs, "Must have 0 < min_epochs <= max_epochs"
+        self.max_epochs = max_epochs
+        self.min_epochs = min_epochs
+        self.eta = eta
+
+    def add(self, key, vals, shorthand=None, default=None):
+        assert key != "epochs", "Epochs are set by tuner, use max_epochs and min_epochs"
+        super().add(key, vals, shorthand, default)
+
+    def add_dist(self, key, dist, shorthand=None, default=None):
+        assert key != "epochs", "Epochs are set by tuner, use max_epochs and min_epochs"
+        super().add_dist(key, dist, shorthand, default)
+
+    def max_rounds(self):
+        """
+        Get max number of halving rounds after the first, so min_epochs * eta**rounds <=
+        max_epochs
+        """
+        # small constant so exact powers of eta aren't rounded down
+        return int(math.floor(math.log(self.max_epochs / self.min_epochs, self.eta) + 1e-9))
+
+    def _run(self, algo, num_cpu=1, data_dir=None, workers=None):
+        """
+        Run a single successive halving bracket of num_exps variants starting from min_epochs
+        """
+        variants = self._sample_variants(self.num_exps, 0)
+        print("{}\n{} running successive halving of {} experiments".format(
+            self.thick_line, self.name, self.num_exps))
+        results = self._run_bracket(variants, self.max_rounds(), algo, num_cpu, data_dir,
+                                    workers)
+        print("\nExperiment Results:")
+        self.print_results(self.sort_results(results, self.metric))
+        print(self.thick_line)
+        return results
+
+    def _sample_variants(self, num_exps, bracket):
+        """
+        Sample variants for a bracket, names include bracket and index of variant so runs of
+        variants with the same (rounded) hyperparams don't share an output directory.
+
+        Must be called before any experiments are run, since np.random.seed is set each time
+        algo is run which messes with random sampling.
+        """
+        variants = []
+        for i in range(num_exps):
+            var = self.sample_next_variant()
+            var_name = "{}_b{}_{}".format(self.name_variant(var), bracket, i)
+            variants.append((var_name, var))
+        return variants
+
+    def _run_bracket(self, variants, rounds, algo, num_cpu=1, data_dir=None, workers=None):
+        """
+        Run successive halving on variants, with rounds halving rounds after the first. The
+        first round runs for max_epochs / eta**rounds epochs.
+
+        Returns:
+            list result_structs : result of each variant for the most epochs it was run for
+        """
+        resume = "resume_from" in inspect.signature(algo).parameters
+        results = {}
+        epochs_run = {}
+        for r in range(rounds + 1):
+            epochs = max(1, int(round(self.max_epochs / self.eta**(rounds - r))))
+            print("\nRound {} of {}: running {} variants for {} epochs".format(
+                r + 1, rounds + 1, len(variants), epochs))
+            jobs = []
+            for exp_name, variant in variants:
+                for seed in self.seeds:
+                    kwargs = dict(variant, seed=seed, epochs=epochs)
+                    output_dir = setup_logger_kwargs(exp_name, data_dir, seed)["output_dir"]
+                    # previous round may have been skipped (result cache) with its run removed
+                    if resume and epochs_run.get(exp_name, 0) > 0 and \
+                       osp.exists(osp.join(output_dir, TRAIN_STATE_DIR)):
+                        kwargs["resume_from"] = output_dir
+                    jobs.append((exp_name, algo, kwargs))
+            job_results = self._run_jobs(jobs, num_cpu, data_dir, workers)
+            print(self.line)
+
+            round_results = []
+            for i, (exp_name, variant) in enumerate(variants):
+                trial_results = job_results[i*len(self.seeds):(i+1)*len(self.seeds)]
+                result_struct = {"exp_name": exp_name}
+                result_struct.update(variant)
+                result_struct["epochs"] = epochs
+                result_struct.update(self._analyse_trial_results(trial_results))
+                results[exp_name] = result_struct
+                epochs_run[exp_name] = epochs
+                round_results.append((result_struct, (exp_name, variant)))
+
+            # keep best 1/eta of variants, all run for same number of epochs so are comparable
+            keep = max(1, len(variants) // self.eta)
+            round_results.sort(key=lambda x: x[0][self.metric], reverse=True)
+            variants = [v for _, v in round_results[:keep]]
+        return list(results.values())
+
+    def sort_results(self, results, metric):
+        """
+        Sorts results by number of epochs run for, then by a given metric, since metrics of
+        variants stopped early aren't comparable to those of variants run for longer
+        """
+        return sorted(results, key=lambda k: (k["epochs"], k[metric]), reverse=True)
+
+
+class HyperbandTuner(SuccessiveHalvingTuner):
+    """
+    Takes an algorithm and lists or distributions of hyperparam values and runs random
+    hyperparameter search using Hyperband.
+
+    Runs a successive halving bracket for each number of rounds from max_rounds down to 0,
+    starting with the most variants run for fewest epochs and ending with a few variants all
+    run for max_epochs.
+    """
+
+    def __init__(self, max_epochs, min_epochs=1, eta=3, name='', seeds=[0], verbose=False,
+                 metric="cum_return"):
+        """
+        Initialize an empty hyperband hyperparameter tuner with given name
+
+        Arguments:
+            int max_epochs : max number of epochs any variant is run for
+            int min_epochs : min number of epochs any variant is run for
+            int eta : 1/eta of variants are kept each round, and run for eta times more epochs
+        """
+        super().__init__(0, max_epochs, min_epochs, eta, name, seeds, verbose, metric)
+        self.num_exps = sum(self.bracket_size(s) for s in range(self.max_rounds() + 1))
+
+    def bracket_size(self, rounds):
+        """
+        Get number of variants of bracket with given number of rounds, chosen so each bracket
+        uses about the same total number of epochs
+        """
+        s_max = self.max_rounds()
+        return int(math.ceil((s_max + 1) / (rounds + 1) * self.eta**rounds))
+
+    def _run(self, algo, num_cpu=1, data_dir=None, workers=None):
+        """
+        Run successive halving brackets, from most to fewest rounds
+        """
+        # variants of all brackets are sampled before any are run, since running algo in this
+        # process (e.g. when workers=1) sets np.random.seed
+        brackets = [(rounds, self._sample_variants(self.bracket_size(rounds), rounds))
+                    for rounds in reversed(range(self.max_rounds() + 1))]
+        results = []
+        for rounds, variants in brackets:
+            print("{}\n{} running bracket {}: {} experiments".format(
+                self.thick_line, self.name, rounds, len(variants)))
+            results += self._run_bracket(variants, rounds, algo, num_cpu, data_dir, workers)
+        print("\nExperiment Results:")
+        self.print_results(self.sort_results(results, self.metric))
+        print(self.thick_line)
+        return results
+
+
+if __name__ == "__main__":
+    import numpy as np
+    tuner = HyperbandTuner(27, name="Test", seeds=5)
+    tuner.add("one", [1, 2])
+    tuner.add_dist("two", lambda: np.random.uniform(0, 1), "tw", 0.5)
+    tuner.print_info()
+
+    for rounds in reversed(range(tuner.max_rounds() + 1)):
+        n = tuner.bracket_size(rounds)
+        print("Bracket {}: {} variants, epochs per round: {}".format(
+            rounds, n, [int(round(tuner.max_epochs / tuner.eta**(rounds - r)))
+                        for r in range(rounds + 1)]))
@@ -49,9 +49,9 @@ class RandomTuner(Tuner):
         self.shs.append(shorthand)
         self.default_vals.append(dist if default is None else default)
 
-    def _run(self, algo, num_cpu=1, data_dir=None):
+    def _run(self, algo, num_cpu=1, data_dir=None, workers=None):
         """
-        Run each variant in the grid with algorithm
+        Run each variant in the grid with algorithm, all variants are run in parallel
         """
         # construct all variants at start since np.random.seed is set each time algo is run
         # which messes with random sampling
@@ -61,19 +61,12 @@ class RandomTuner(Tuner):
             var_name = self.name_variant(var)
             variants.append((var_name, var))
 
-        results = []
-        exp_num = 1
-        for var_name, var in variants:
-            print("{}\n{} experiment {} of {}".format(self.thick_line, self.name, exp_num, self.num_exps))
-            var_result = self._run_variant(var_name, var, algo, num_cpu=num_cpu, data_dir=data_dir)
-            results.append(var_result)
-            exp_num += 1
-
-            print("{} experiment complete".format(var_name))
-            print("\nExperiment Results:")
-            self.print_results([var_result])
-            print(self.thick_line)
-
+        print("{}\n{} running {} experiments".format(self.thick_line, self.name, self.num_exps))
+        results = self._run_variants(variants, algo, num_cpu=num_cpu, data_dir=data_dir,
+                                     workers=workers)
+        print("\nExperiment Results:")
+        self.print_results(results)
+        print(self.thick_line)
         return results
 
     def sample_next_variant(self):
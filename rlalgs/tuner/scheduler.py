@@ -0,0 +1,108 @@
+"""
+Process pool scheduler for running tuner experiments in parallel
+
+Each (variant, seed) experiment is a job run in a fresh process (so tf graphs and sessions of
+different experiments never share a process), with a pool of processes sized to the number of
+cores. Results are collected as jobs complete.
+"""
+import os
+import sys
+import time
+import inspect
+import multiprocessing as mp
+from rlalgs.utils.logger import setup_logger_kwargs
+
+# stdout and stderr of parallel jobs are written to this file in the job's output directory
+JOB_OUTPUT_FNAME = "stdout.txt"
+
+
+def default_workers(num_cpu=1):
+    """
+    Get number of parallel jobs that fit on machine's cores, for jobs using num_cpu cores each
+    """
+    return max(1, (os.cpu_count() or 1) // num_cpu)
+
+
+def _single_thread_env():
+    # each job gets one core, so libraries mustn't start a thread per core
+    os.environ.update(MKL_NUM_THREADS="1", OMP_NUM_THREADS="1")
+
+
+def _run_job(job):
+    """
+    Run a single experiment job in a pool worker, returns (job index, results, run time)
+    """
+    # imported here to avoid circular import, since tuner imports scheduler
+    from rlalgs.tuner.tuner import call_experiment
+    idx, exp_name, algo, kwargs, num_cpu, data_dir, verbose = job
+    kwargs = dict(kwargs)
+    if "logger_kwargs" not in kwargs:
+        kwargs["logger_kwargs"] = setup_logger_kwargs(exp_name, data_dir, kwargs["seed"],
+                                                      verbose)
+    if "exec_config" in inspect.signature(algo).parameters and kwargs.get("exec_config") is None:
+        kwargs["exec_config"] = dict(intra_op_threads=1, inter_op_threads=1)
+
+    output_dir = kwargs["logger_kwargs"]["output_dir"]
+    os.makedirs(output_dir, exist_ok=True)
+    start = time.time()
+    with open(os.path.join(output_dir, JOB_OUTPUT_FNAME), "w", buffering=1) as fout:
+        stdout, stderr = sys.stdout, sys.stderr
+        sys.stdout = sys.stderr = fout
+        try:
+            results = call_experiment(exp_name, algo, num_cpu=num_cpu, data_dir=data_dir,
+                                      verbose=verbose, **kwargs)
+        finally:
+            sys.stdout, sys.stderr = stdout, stderr
+    return idx, results, time.time() - start
+
+
+def run_jobs(jobs, num_cpu=1, data_dir=None, verbose=False, workers=None, on_result=None):
+    """
+    Run experiment jobs, in parallel if more than one worker
+
+    Jobs are only run in parallel for single cpu experiments (num_cpu=1), since experiments
+    using MPI relaunch the calling script.
+
+    Arguments:
+        list jobs : (exp_name, algo, kwargs) of each experiment, kwargs must include seed
+        int num_cpu : number of MPI processes to use for each experiment
+        str data_dir : directory to store experiment results. If None will use default directory.
+        bool verbose : whether to print detailed messages while training
+        int workers : max number of jobs run in parallel (if None uses number of cores)
+        func on_result : if not None, called with (job index, results) as each job completes
+
+    Returns:
+        list results : results returned by algorithm for each job, in order of jobs
+    """
+    # imported here to avoid circular import, since tuner imports scheduler
+    from rlalgs.tuner.tuner import call_experiment
+    workers = default_workers(num_cpu) if workers is None else workers
+    if workers <= 1 or num_cpu > 1 or len(jobs) <= 1:
+        results = []
+        for idx, (exp_name, algo, kwargs) in enumerate(jobs):
+            res = call_experiment(exp_name, algo, num_cpu=num_cpu, data_dir=data_dir,
+                                  verbose=verbose, **kwargs)
+            if on_result is not None:
+                on_result(idx, res)
+            results.append(res)
+        return results
+
+    tasks = [(i, exp_name, algo, kwargs, num_cpu, data_dir, verbose)
+             for i, (exp_name, algo, kwargs) in enumerate(jobs)]
+    results = [None] * len(jobs)
+    print("\nRunning {} experiments with {} parallel workers (output of each experiment is in "
+          "{} in its output directory)".format(len(jobs), min(workers, len(jobs)),
+                                               JOB_OUTPUT_FNAME))
+    start = time.time()
+    # spawn and one task per child, so each experiment starts in a fresh process
+    ctx = mp.get_context("spawn")
+    with ctx.Pool(min(workers, len(jobs)), initializer=_single_thread_env,
+                  maxtasksperchild=1) as pool:
+        for num_done, (idx, res, run_time) in enumerate(pool.imap_unordered(_run_job, tasks), 1):
+            results[idx] = res
+            if on_result is not None:
+                on_result(idx, res)
+            exp_name, _, kwargs = jobs[idx]
+            print("Completed {} of {}: {} seed {} ({:.1f} secs, {:.1f} secs elapsed)".format(
+                num_done, len(jobs), exp_name, kwargs["seed"], run_time, time.time() - start))
+    return results
@@ -9,6 +9,9 @@ classes
 import numpy as np
 import os.path as osp
 from prettytable import PrettyTable
+import rlalgs.utils.catalog as catalog
+import rlalgs.tuner.cache as cache
+import rlalgs.tuner.scheduler as scheduler
 from rlalgs.utils.mpi import mpi_fork
 from rlalgs.utils.logger import setup_logger_kwargs
 
@@ -70,6 +73,9 @@ class Tuner:
 
     Subclasses must implement:
     - _run
+
+    Experiments (each variant and seed) are run in parallel in a process pool, see
+    rlalgs.tuner.scheduler.
     """
     line = "\n" + "-"*LINE_WIDTH + "\n"
     thick_line = "\n" + "="*LINE_WIDTH + "\n"
@@ -99,13 +105,15 @@ class Tuner:
         self.shs = []
         self.verbose = verbose
         self.metric = metric
+        self.cache = None
 
         if isinstance(seeds, int):
             self.seeds = list(range(seeds))
         else:
             self.seeds = seeds
 
-    def run(self, algo, num_cpu=1, data_dir=None):
+    def run(self, algo, num_cpu=1, data_dir=None, workers=None, cache_dir=None,
+            code_version=None):
         """
         Run each variant in the grid with algorithm
 
@@ -113,21 +121,30 @@ class Tuner:
             1. environment is also passed by user as a hyperparam
 
         Arguments:
-            func algo : the algorothm to run (must be callable function)
+            func algo : the algorothm to run (must be callable function, importable from a
+                module so it can be run in pool processes)
             int num_cpu : number of cpus to use
             str data_dir : where the data should be output to
+            int workers : max number of experiments run in parallel (if None uses number of
+                cores / num_cpu). Experiments using more than one cpu are run one at a time.
+            str cache_dir : directory of result cache, e.g. cache.DEFAULT_DIR (if None results
+                are not cached). Cached results are only invalidated by changes to algorithm's
+                module, so clear cache (or set code_version) after changing other code it uses.
+            str code_version : version of algorithm for result cache keys (if None uses hash
+                of algorithm's module source)
 
         Returns:
             dict results : the performance of each variant
         """
+        self.cache = None if cache_dir is None else cache.ResultCache(cache_dir, code_version)
         self.print_info()
-        results = self._run(algo, num_cpu, data_dir)
+        results = self._run(algo, num_cpu, data_dir, workers)
         sorted_results = self.sort_results(results, self.metric)
         self.print_results(sorted_results)
-        self.write_results(sorted_results)
+        self.write_results(sorted_results, data_dir)
         return sorted_results
 
-    def _run(self, algo, num_cpu=1, data_dir=None):
+    def _run(self, algo, num_cpu=1, data_dir=None, workers=None):
         raise NotImplementedError
 
     def add(self, key, vals, shorthand=None, default=None):
@@ -275,29 +292,90 @@ class Tuner:
                     var_name += ("_" + sh + "_" + str(variant_val))
         return var_name
 
-    def _run_variant(self, exp_name, variant, algo, num_cpu=1, data_dir=None):
+    def _run_variant(self, exp_name, variant, algo, num_cpu=1, data_dir=None, workers=None):
         """
         Runs a single hyperparameter setting variant with algo for each seed.
 
         Returns:
             dict result_struct : dictionary containing exp name, variant info and results
         """
-        trial_num = 1
-        trial_results = []
-        for seed in self.seeds:
-            print("{}\n{} Running trial {} of {}".format(self.line, ">>>", trial_num, len(self.seeds)))
-            variant["seed"] = seed
-            var_result = call_experiment(exp_name, algo, num_cpu=num_cpu, data_dir=data_dir,
-                                         verbose=self.verbose, **variant)
-            trial_results.append(var_result)
-            trial_num += 1
+        return self._run_variants([(exp_name, variant)], algo, num_cpu, data_dir, workers)[0]
+
+    def _run_variants(self, variants, algo, num_cpu=1, data_dir=None, workers=None):
+        """
+        Runs hyperparameter setting variants with algo for each seed, with all (variant, seed)
+        experiments scheduled in parallel.
+
+        Arguments:
+            list variants : (exp_name, variant) of each variant
+
+        Returns:
+            list result_structs : dictionary containing exp name, variant info and results for
+                each variant
+        """
+        jobs = [(exp_name, algo, dict(variant, seed=seed))
+                for exp_name, variant in variants for seed in self.seeds]
+        job_results = self._run_jobs(jobs, num_cpu, data_dir, workers)
         print(self.line)
 
-        results = self._analyse_trial_results(trial_results)
-        result_struct = {"exp_name": exp_name}
-        result_struct.update(variant)
-        result_struct.update(results)
-        return result_struct
+        result_structs = []
+        for i, (exp_name, variant) in enumerate(variants):
+            trial_results = job_results[i*len(self.seeds):(i+1)*len(self.seeds)]
+            results = self._analyse_trial_results(trial_results)
+            result_struct = {"exp_name": exp_name}
+            result_struct.update(variant)
+            result_struct.update(results)
+            result_structs.append(result_struct)
+        return result_structs
+
+    def _run_jobs(self, jobs, num_cpu=1, data_dir=None, workers=None):
+        """
+        Run experiment jobs (see scheduler.run_jobs), skipping those with results in the
+        result cache and storing results of the rest as each completes.
+
+        Returns:
+            list results : results of each job, in order of jobs
+        """
+        if self.cache is None:
+            return scheduler.run_jobs(jobs, num_cpu, data_dir, self.verbose, workers)
+
+        keys = [self.cache.key(algo, kwargs) for _, algo, kwargs in jobs]
+        results = [self.cache.get(key) for key in keys]
+        todo = [i for i, res in enumerate(results) if res is None]
+        if len(todo) < len(jobs):
+            print("\n{} of {} experiments found in result cache {}, so skipping.".format(
+                len(jobs) - len(todo), len(jobs), self.cache.cache_dir))
+
+        def store(idx, res):
+            # only root process of MPI experiments returns results
+            if isinstance(res, dict):
+                _, algo, kwargs = jobs[todo[idx]]
+                self.cache.put(keys[todo[idx]], algo, kwargs, res)
+
+        todo_results = scheduler.run_jobs([jobs[i] for i in todo], num_cpu, data_dir,
+                                          self.verbose, workers, on_result=store)
+        for i, res in zip(todo, todo_results):
+            results[i] = res
+        return results
+
+    def find_runs(self, catalog_path=None, data_dir=None, **filters):
+        """
+        Find runs of this tuner's experiments in run catalog, matching filters (see
+        rlalgs.utils.catalog.Catalog.find_runs)
+
+        Arguments:
+            str catalog_path : catalog database file (if None uses catalog of data_dir)
+            str data_dir : directory experiments were run in (if None uses default directory)
+
+        Returns:
+            list runs : catalog entries of runs
+        """
+        if catalog_path is None:
+            catalog_path = catalog.catalog_path(data_dir)
+        cat = catalog.Catalog(catalog_path)
+        runs = cat.find_runs(exp_name=self.name + "%", **filters)
+        cat.close()
+        return runs
 
     def sort_results(self, results, metric):
         """
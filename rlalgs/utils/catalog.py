@@ -0,0 +1,366 @@
+"""
+SQLite catalog of experiment runs
+
+Indexes the config, hyperparameters, latest logged metrics and output paths of every run, so
+runs can be selected by query (e.g. all dqn runs on CartPole-v0 with lr < 1e-3) without opening
+each run's files. Each data directory has its own catalog (catalog.db), which is updated by
+Logger as runs set up with setup_logger_kwargs progress, and can be rebuilt for existing runs by
+rescanning the data directory:
+
+    python catalog.py rescan [data_dir]
+    python catalog.py query [--exp_name dqn%] [--env CartPole-v0] [--param lr "<" 1e-3]
+"""
+import os
+import json
+import time
+import pickle
+import numbers
+import sqlite3
+import os.path as osp
+import rlalgs.utils.metrics as metrics
+
+
+DEFAULT_DIR = osp.join(osp.abspath(osp.dirname(osp.dirname(__file__))), 'data')
+CATALOG_FNAME = "catalog.db"
+DEFAULT_PATH = osp.join(DEFAULT_DIR, CATALOG_FNAME)
+PROGRESS_FNAME = "progress.txt"
+OPS = ["=", "!=", "<", "<=", ">", ">="]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_dir TEXT PRIMARY KEY, exp_name TEXT, algo TEXT, env TEXT, config TEXT, model_dir TEXT,
+    rows INTEGER DEFAULT 0, created REAL, updated REAL, signature TEXT);
+CREATE TABLE IF NOT EXISTS params (
+    run_dir TEXT, key TEXT, num REAL, text TEXT, PRIMARY KEY (run_dir, key));
+CREATE INDEX IF NOT EXISTS params_key ON params (key, num);
+CREATE TABLE IF NOT EXISTS metrics (
+    run_dir TEXT, key TEXT, value REAL, PRIMARY KEY (run_dir, key));
+CREATE INDEX IF NOT EXISTS metrics_key ON metrics (key, value);
+CREATE INDEX IF NOT EXISTS runs_exp_name ON runs (exp_name);
+CREATE INDEX IF NOT EXISTS runs_env ON runs (env);
+"""
+
+
+def flatten_config(config, prefix=""):
+    """
+    Flatten nested config dicts into {"key.sub_key": value}
+    """
+    flat = {}
+    for k, v in config.items():
+        if isinstance(v, dict):
+            flat.update(flatten_config(v, prefix + str(k) + "."))
+        else:
+            flat[prefix + str(k)] = v
+    return flat
+
+
+def _param_values(v):
+    """
+    Get (num, text) columns for a param value, numbers (and bools) are stored as num
+    """
+    if isinstance(v, (bool, int, float)):
+        return float(v), None
+    if isinstance(v, str):
+        return None, v
+    return None, json.dumps(v)
+
+
+def _is_number(v):
+    # includes numpy scalars
+    return isinstance(v, numbers.Number) and not isinstance(v, bool)
+
+
+
+def catalog_path(data_dir=None):
+    """
+    Get path of catalog database of runs in data directory (if None uses DEFAULT_DIR)
+    """
+    return osp.join(DEFAULT_DIR if data_dir is None else data_dir, CATALOG_FNAME)
+
+class Catalog:
+    """
+    Connection to a run catalog database
+    """
+
+    def __init__(self, db_path=None):
+        """
+        Arguments:
+            str db_path : catalog database file (if None uses DEFAULT_PATH)
+        """
+        self.db_path = DEFAULT_PATH if db_path is None else db_path
+        os.makedirs(osp.dirname(osp.abspath(self.db_path)), exist_ok=True)
+        # runs write concurrently, so wait on locks and use write ahead log
+        self.conn = sqlite3.connect(self.db_path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def add_run(self, run_dir, config, exp_name=None, algo=None):
+        """
+        Add or replace a run with its config and hyperparameters
+
+        Arguments:
+            str run_dir : run output directory
+            dict config : run config (as saved to config.json)
+            str exp_name : experiment name
+            str algo : name of algorithm
+        """
+        run_dir = osp.abspath(run_dir)
+        now = time.time()
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO runs (run_dir, exp_name, algo, config, created, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(run_dir) DO UPDATE SET "
+                "exp_name=excluded.exp_name, algo=excluded.algo, config=excluded.config, "
+                "updated=excluded.updated",
+                (run_dir, exp_name, algo, json.dumps(config), now, now))
+            self.conn.execute("DELETE FROM params WHERE run_dir = ?", (run_dir, ))
+            self.conn.executemany(
+                "INSERT INTO params (run_dir, key, num, text) VALUES (?, ?, ?, ?)",
+                [(run_dir, k) + _param_values(v) for k, v in flatten_config(config).items()])
+
+    def set_model(self, run_dir, env, model_dir):
+        """
+        Set environment and saved model directory of run
+        """
+        with self.conn:
+            self.conn.execute("UPDATE runs SET env = ?, model_dir = ?, updated = ? "
+                              "WHERE run_dir = ?",
+                              (env, model_dir, time.time(), osp.abspath(run_dir)))
+
+    def update_metrics(self, run_dir, row, rows, signature=None):
+        """
+        Set latest logged metrics of run
+
+        Arguments:
+            str run_dir : run output directory
+            dict row : latest logged row, non-numeric values are ignored
+            int rows : number of rows logged
+            str signature : signature of run files, used by rescan to skip unchanged runs
+        """
+        run_dir = osp.abspath(run_dir)
+        values = [(run_dir, k, float(v)) for k, v in row.items() if _is_number(v)]
+        with self.conn:
+            self.conn.execute("UPDATE runs SET rows = ?, updated = ?, signature = ? "
+                              "WHERE run_dir = ?", (rows, time.time(), signature, run_dir))
+            self.conn.executemany(
+                "INSERT INTO metrics (run_dir, key, value) VALUES (?, ?, ?) "
+                "ON CONFLICT(run_dir, key) DO UPDATE SET value=excluded.value", values)
+
+    def remove_run(self, run_dir):
+        run_dir = osp.abspath(run_dir)
+        with self.conn:
+            for table in ["runs", "params", "metrics"]:
+                self.conn.execute("DELETE FROM {} WHERE run_dir = ?".format(table), (run_dir, ))
+
+    def find_runs(self, exp_name=None, algo=None, env=None, params=None, metrics=None,
+                  order_by=None, descending=True, limit=None):
+        """
+        Find runs matching all given filters
+
+        Param and metric filters map a key to a value (matched by equality) or to an (op, value)
+        tuple, with op one of OPS, e.g. params={"lr": ("<", 1e-3), "gamma": 0.99}
+
+        Arguments:
+            str exp_name : experiment name, as SQL LIKE pattern (e.g. "dqn%")
+            str algo : algorithm name
+            str env : environment id
+            dict params : hyperparameter filters (nested config keys are joined with ".")
+            dict metrics : filters on latest logged metrics
+            str order_by : metric to order runs by
+            bool descending : whether to order by descending metric value
+            int limit : max number of runs to return
+
+        Returns:
+            list runs : dicts of run_dir, exp_name, algo, env, model_dir, rows, config and metrics
+        """
+        where, args = [], []
+        for col, value in [("exp_name", exp_name), ("algo", algo), ("env", env)]:
+            if value is not None:
+                where.append("runs.{} {} ?".format(col, "LIKE" if col == "exp_name" else "="))
+                args.append(value)
+        for table, filters in [("params", params), ("metrics", metrics)]:
+            for k, cond in (filters or {}).items():
+                op, value = cond if isinstance(cond, tuple) else ("=", cond)
+                assert op in OPS, "Filter op must be one of {}".format(OPS)
+                if table == "metrics":
+                    col = "value"
+                else:
+                    col = "num" if _is_number(value) or isinstance(value, bool) else "text"
+                    if col == "num":
+                        value = float(value)
+                    elif not isinstance(value, str):
+                        value = json.dumps(value)
+                where.append("EXISTS (SELECT 1 FROM {0} f WHERE f.run_dir = runs.run_dir "
+                             "AND f.key = ? AND f.{1} {2} ?)".format(table, col, op))
+                args += [k, value]
+
+        sql = "SELECT runs.run_dir, exp_name, algo, env, model_dir, rows, config FROM runs"
+        if order_by is not None:
+            sql += " LEFT JOIN metrics o ON o.run_dir = runs.run_dir AND o.key = ?"
+            args.insert(0, order_by)
+        if len(where) > 0:
+            sql += " WHERE " + " AND ".join(where)
+        if order_by is not None:
+            sql += " ORDER BY o.value IS NULL, o.value {}".format("DESC" if descending else "ASC")
+        if limit is not None:
+            sql += " LIMIT {:d}".format(limit)
+
+        runs = []
+        for run_dir, exp, alg, e, model_dir, rows, config in self.conn.execute(sql, args):
+            runs.append(dict(run_dir=run_dir, exp_name=exp, algo=alg, env=e, model_dir=model_dir,
+                             rows=rows, config=json.loads(config) if config else {},
+                             metrics=self.get_metrics(run_dir)))
+        return runs
+
+    def get_metrics(self, run_dir):
+        """
+        Get latest logged metrics of run
+        """
+        return dict(self.conn.execute("SELECT key, value FROM metrics WHERE run_dir = ?",
+                                      (osp.abspath(run_dir), )))
+
+    def get_signature(self, run_dir):
+        row = self.conn.execute("SELECT signature FROM runs WHERE run_dir = ?",
+                                (osp.abspath(run_dir), )).fetchone()
+        return None if row is None else row[0]
+
+    def run_dirs(self):
+        return [r[0] for r in self.conn.execute("SELECT run_dir FROM runs")]
+
+
+def run_signature(run_dir):
+    """
+    Get signature of run's config and logged data files (modified time and size)
+    """
+    sig = []
+    for fname in ["config.json", PROGRESS_FNAME, osp.join(metrics.METRICS_DIR,
+                                                          metrics.SCHEMA_FNAME)]:
+        path = osp.join(run_dir, fname)
+        if osp.exists(path):
+            st = os.stat(path)
+            sig.append([fname, st.st_mtime_ns, st.st_size])
+    return json.dumps(sig)
+
+
+def _last_logged_row(run_dir):
+    """
+    Get (last logged row, number of rows) of run, from metrics store or progress file
+    """
+    if metrics.has_metrics(run_dir):
+        columns = metrics.load_metrics(run_dir)
+        n = min([len(c) for c in columns.values()] + [metrics.metrics_rows(run_dir)])
+        if n > 0:
+            return {k: c[n-1].item() for k, c in columns.items()}, n
+    fname = osp.join(run_dir, PROGRESS_FNAME)
+    if not osp.exists(fname):
+        return {}, 0
+    with open(fname, "rb") as fin:
+        lines = fin.read().splitlines()
+    if len(lines) < 2:
+        return {}, 0
+    row = {}
+    for k, v in zip(lines[0].decode().split("\t"), lines[-1].decode().split("\t")):
+        try:
+            row[k] = float(v)
+        except ValueError:
+            pass
+    return row, len(lines) - 1
+
+
+def _run_env(run_dir):
+    info_fname = osp.join(run_dir, "simple_save", "exp_info.pkl")
+    if not osp.exists(info_fname):
+        return None
+    with open(info_fname, "rb") as fin:
+        return pickle.load(fin).get("env")
+
+
+def rescan(data_dir=None, db_path=None, verbose=True):
+    """
+    Add all runs (directories containing a config.json) under data_dir to catalog, skipping runs
+    whose files haven't changed since they were last cataloged, and remove cataloged runs under
+    data_dir whose directories no longer exist.
+
+    Arguments:
+        str data_dir : directory to scan (if None uses DEFAULT_DIR)
+        str db_path : catalog database file (if None uses catalog of data_dir)
+        bool verbose : whether to print scan summary
+
+    Returns:
+        int updated : number of runs added or updated
+    """
+    data_dir = osp.abspath(DEFAULT_DIR if data_dir is None else data_dir)
+    catalog = Catalog(catalog_path(data_dir) if db_path is None else db_path)
+    updated, seen = 0, set()
+    for root, sub_dirs, files in os.walk(data_dir):
+        if "config.json" not in files:
+            continue
+        # don't search run's own output directories
+        sub_dirs[:] = []
+        seen.add(root)
+        signature = run_signature(root)
+        if catalog.get_signature(root) == signature:
+            continue
+        with open(osp.join(root, "config.json")) as fin:
+            config = json.load(fin)
+        catalog.add_run(root, config, config.get("exp_name"), config.get("algo"))
+        model_dir = osp.join(root, "simple_save")
+        catalog.set_model(root, _run_env(root), model_dir if osp.isdir(model_dir) else None)
+        row, rows = _last_logged_row(root)
+        catalog.update_metrics(root, row, rows, signature)
+        updated += 1
+    removed = [d for d in catalog.run_dirs()
+               if d.startswith(data_dir + os.sep) and d not in seen and not osp.isdir(d)]
+    for run_dir in removed:
+        catalog.remove_run(run_dir)
+    catalog.close()
+    if verbose:
+        print("Catalog: {} runs found, {} updated, {} removed".format(len(seen), updated,
+                                                                      len(removed)))
+    return updated
+
+
+def _parse_value(s):
+    try:
+        return float(s)
+    except ValueError:
+        return s
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", type=str, default=None, help="catalog database file")
+    subparsers = parser.add_subparsers(dest="command")
+    rescan_parser = subparsers.add_parser("rescan", help="add runs in data directory to catalog")
+    rescan_parser.add_argument("data_dir", type=str, nargs="?", default=None)
+    query_parser = subparsers.add_parser("query", help="find runs in catalog")
+    query_parser.add_argument("--exp_name", type=str, default=None)
+    query_parser.add_argument("--algo", type=str, default=None)
+    query_parser.add_argument("--env", type=str, default=None)
+    query_parser.add_argument("--param", nargs=3, action="append", default=[],
+                              metavar=("KEY", "OP", "VALUE"))
+    query_parser.add_argument("--metric", nargs=3, action="append", default=[],
+                              metavar=("KEY", "OP", "VALUE"))
+    query_parser.add_argument("--order_by", type=str, default=None)
+    query_parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.command == "rescan":
+        rescan(args.data_dir, args.db)
+    elif args.command == "query":
+        runs = Catalog(args.db).find_runs(
+            args.exp_name, args.algo, args.env,
+            {k: (op, _parse_value(v)) for k, op, v in args.param},
+            {k: (op, float(v)) for k, op, v in args.metric},
+            args.order_by, limit=args.limit)
+        for run in runs:
+            print("{}\t{}\t{}\t{}".format(run["run_dir"], run["algo"], run["env"],
+                                          run["metrics"].get(args.order_by, "")))
+        print("{} runs".format(len(runs)))
+    else:
+        parser.print_help()
@@ -0,0 +1,223 @@
+"""
+Checkpoint retention policy and index for saved models.
+
+The index file (checkpoints.json) in a run's output directory maps the epoch of each saved
+checkpoint to its location and the metrics logged for that epoch, so checkpoints can be found
+without scanning directories.
+"""
+import os
+import json
+import atexit
+import shutil
+import tarfile
+import tempfile
+import numpy as np
+import os.path as osp
+
+
+INDEX_FNAME = "checkpoints.json"
+COMPRESSED_EXT = ".tar.gz"
+
+
+class RetentionPolicy:
+    """
+    Selects which checkpoints to keep.
+
+    A checkpoint is kept if any of the enabled rules select it, and the most recent checkpoint is
+    always kept. If no rules are enabled all checkpoints are kept.
+    """
+
+    def __init__(self, keep_last=None, keep_best=None, best_key="avg_return", exp_thin=False,
+                 compress=False):
+        """
+        Arguments:
+            int keep_last : number of most recent checkpoints to keep
+            int keep_best : number of checkpoints with highest best_key metric to keep
+            str best_key : metric used to rank checkpoints for keep_best
+            bool exp_thin : keep one checkpoint per exponentially growing age bucket (i.e. ages of
+                0, 1-2, 3-6, 7-14, ... epochs behind the most recent checkpoint)
+            bool compress : whether to compress retained checkpoints, other than the most recent
+        """
+        self.keep_last = keep_last
+        self.keep_best = keep_best
+        self.best_key = best_key
+        self.exp_thin = exp_thin
+        self.compress = compress
+
+    @classmethod
+    def from_arg(cls, retention):
+        """
+        Get RetentionPolicy from argument (None, dict of RetentionPolicy kwargs or RetentionPolicy)
+        """
+        if retention is None:
+            return cls()
+        if isinstance(retention, dict):
+            return cls(**retention)
+        return retention
+
+    def select(self, entries):
+        """
+        Select checkpoints to keep
+
+        Arguments:
+            list entries : checkpoint index entries, ordered oldest to newest
+
+        Returns:
+            set keep : paths of checkpoints to keep
+        """
+        if len(entries) == 0:
+            return set()
+        if self.keep_last is None and self.keep_best is None and not self.exp_thin:
+            return set(e["path"] for e in entries)
+
+        keep = {entries[-1]["path"]}
+        if self.keep_last is not None:
+            keep.update(e["path"] for e in entries[-self.keep_last:])
+        if self.keep_best is not None:
+            ranked = [e for e in entries if self.best_key in e["metrics"]]
+            ranked.sort(key=lambda e: e["metrics"][self.best_key], reverse=True)
+            keep.update(e["path"] for e in ranked[:self.keep_best])
+        if self.exp_thin and entries[-1]["epoch"] is not None:
+            latest = entries[-1]["epoch"]
+            buckets = {}
+            for e in entries:
+                if e["epoch"] is None:
+                    continue
+                # entries are ordered oldest to newest, so oldest in each bucket is kept. Keeping
+                # the newest would evict every checkpoint once it ages into the next bucket
+                buckets.setdefault(int(np.log2(latest - e["epoch"] + 1)), e["path"])
+            keep.update(buckets.values())
+        return keep
+
+
+class CheckpointIndex:
+    """
+    Index of the checkpoints saved for a run, with retention policy applied as checkpoints
+    are added.
+    """
+
+    def __init__(self, output_dir, retention=None):
+        """
+        Arguments:
+            str output_dir : run output directory
+            None, dict or RetentionPolicy retention : checkpoint retention policy
+        """
+        self.output_dir = output_dir
+        self.policy = RetentionPolicy.from_arg(retention)
+        self.entries = load_index(output_dir)
+
+    def add(self, epoch, model_dir, metrics):
+        """
+        Add a newly written checkpoint to the index, apply retention policy and save index.
+
+        Arguments:
+            int epoch : epoch checkpoint was saved at
+            str model_dir : checkpoint directory
+            dict metrics : numeric metrics logged for epoch
+        """
+        path = osp.relpath(model_dir, self.output_dir)
+        # checkpoints that are overwritten keep the same path
+        self.entries = [e for e in self.entries if e["path"] != path]
+        self.entries.append({"epoch": epoch, "path": path, "compressed": False,
+                             "metrics": metrics})
+        self.entries.sort(key=lambda e: -1 if e["epoch"] is None else e["epoch"])
+        self._apply_policy(path)
+        self.save()
+
+    def _apply_policy(self, newest_path):
+        keep = self.policy.select(self.entries)
+        keep.add(newest_path)
+        retained = []
+        for e in self.entries:
+            full_path = osp.join(self.output_dir, e["path"])
+            if e["path"] not in keep:
+                if osp.isdir(full_path):
+                    shutil.rmtree(full_path)
+                elif osp.exists(full_path):
+                    os.remove(full_path)
+                continue
+            if self.policy.compress and not e["compressed"] and e["path"] != newest_path:
+                with tarfile.open(full_path + COMPRESSED_EXT, "w:gz") as tar:
+                    tar.add(full_path, arcname=osp.basename(full_path))
+                shutil.rmtree(full_path)
+                e["path"] += COMPRESSED_EXT
+                e["compressed"] = True
+            retained.append(e)
+        self.entries = retained
+
+    def save(self):
+        """
+        Write index to file, replacing the old index in a single step
+        """
+        index_fname = osp.join(self.output_dir, INDEX_FNAME)
+        with open(index_fname + ".tmp", "w") as fout:
+            json.dump(self.entries, fout, indent=2)
+        os.replace(index_fname + ".tmp", index_fname)
+
+
+def load_index(run_dir):
+    """
+    Load the checkpoint index entries for a run (empty list if run has no index)
+
+    Arguments:
+        str run_dir : run output directory
+
+    Returns:
+        list entries : index entries, ordered oldest to newest
+    """
+    index_fname = osp.join(run_dir, INDEX_FNAME)
+    if not osp.exists(index_fname):
+        return []
+    with open(index_fname) as fin:
+        return json.load(fin)
+
+
+def find_checkpoint(run_dir, which="last", best_key="avg_return"):
+    """
+    Find the model directory of a saved checkpoint for a run, using the run's checkpoint index.
+
+    Compressed checkpoints are extracted to a temporary directory, which is removed when the
+    process exits.
+
+    Arguments:
+        str run_dir : run output directory
+        str or int which : "last", "best" or the epoch of the checkpoint
+        str best_key : metric used to select checkpoint if which is "best"
+
+    Returns:
+        str model_dir : path to model directory
+    """
+    entries = load_index(run_dir)
+    assert len(entries) > 0, "No checkpoint index found in {}".format(run_dir)
+    if which == "last":
+        entry = entries[-1]
+    elif which == "best":
+        entry = max([e for e in entries if best_key in e["metrics"]],
+                    key=lambda e: e["metrics"][best_key])
+    else:
+        matches = [e for e in entries if e["epoch"] == int(which)]
+        assert len(matches) > 0, "No checkpoint saved for epoch {}".format(which)
+        entry = matches[0]
+
+    model_dir = osp.join(run_dir, entry["path"])
+    if entry["compressed"]:
+        extract_dir = tempfile.mkdtemp()
+        atexit.register(shutil.rmtree, extract_dir, ignore_errors=True)
+        with tarfile.open(model_dir) as tar:
+            tar.extractall(extract_dir)
+        model_dir = osp.join(extract_dir, osp.basename(model_dir)[:-len(COMPRESSED_EXT)])
+    return model_dir
+
+
+
+if __name__ == "__main__":
+    # demo of checkpoints kept by exp_thin as a run saves checkpoints
+    policy = RetentionPolicy(exp_thin=True)
+    for save_freq, epochs in [(1, 1000), (10, 2000)]:
+        entries = []
+        for epoch in range(0, epochs, save_freq):
+            entries.append({"epoch": epoch, "path": str(epoch), "metrics": {}})
+            keep = policy.select(entries)
+            entries = [e for e in entries if e["path"] in keep]
+        print("save_freq={}, epochs={}: kept {}".format(save_freq, epochs,
+                                                       [e["epoch"] for e in entries]))
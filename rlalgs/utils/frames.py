@@ -0,0 +1,70 @@
+"""
+Module contains functions for stacking consecutive observation frames.
+
+Buffers store each frame once and stacked observations are assembled from buffer indices
+when they are needed, so buffer memory does not grow with the number of stacked frames.
+"""
+import numpy as np
+
+
+def stack_frames(frame_buf, idxs, stack_size, oldest=0, ep_end_buf=None):
+    """
+    Assemble stacked observations from a (ring) buffer of single frames.
+
+    Frames are ordered oldest to newest and flattened, so each stacked observation has
+    stack_size * frame_dim elements. Frames from before the oldest frame in the buffer or from
+    a previous episode are zeroed.
+
+    Arguments:
+        np.ndarray frame_buf : buffer of single frames with shape (capacity, frame_dim)
+        np.ndarray idxs : buffer index of newest frame for each stacked observation
+        int stack_size : number of frames in a stacked observation
+        int oldest : buffer index of the oldest stored frame (non-zero for a full ring buffer)
+        np.ndarray ep_end_buf : flags marking the last step of each episode in buffer. If None
+            then frames are not masked at episode boundaries
+
+    Returns:
+        np.ndarray stacked : stacked observations with shape (len(idxs), stack_size * frame_dim)
+    """
+    capacity = frame_buf.shape[0]
+    idxs = np.asarray(idxs)
+    # offset of each frame back from the newest frame, ordered oldest to newest
+    offsets = np.arange(stack_size - 1, -1, -1)
+    frame_idxs = (idxs[:, None] - offsets[None, :]) % capacity
+    # can't look further back than the oldest frame stored in buffer
+    invalid = offsets[None, :] > ((idxs - oldest) % capacity)[:, None]
+    if ep_end_buf is not None and stack_size > 1:
+        # frame is from a previous episode if an episode ended at or after it
+        ends = ep_end_buf[frame_idxs].astype(bool)
+        ends[:, -1] = False
+        invalid |= np.logical_or.accumulate(ends[:, ::-1], axis=1)[:, ::-1]
+    stacked = frame_buf[frame_idxs]
+    stacked[invalid] = 0
+    return stacked.reshape(len(idxs), -1)
+
+
+class FrameStack:
+    """
+    Rolling stack of the most recent frames of the current episode, for use when acting.
+
+    Matches the stacked observations produced by stack_frames.
+    """
+
+    def __init__(self, frame_dim, stack_size):
+        self.frames = np.zeros((stack_size, frame_dim), dtype=np.float32)
+
+    def reset(self, frame):
+        """
+        Start a new episode with frame, returning the stacked observation
+        """
+        self.frames[:] = 0
+        self.frames[-1] = frame
+        return self.frames.flatten()
+
+    def push(self, frame):
+        """
+        Add newest frame to stack, returning the stacked observation
+        """
+        self.frames[:-1] = self.frames[1:]
+        self.frames[-1] = frame
+        return self.frames.flatten()
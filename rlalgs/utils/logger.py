@@ -8,17 +8,30 @@ Inspired heavily by OpenAI spinningup logger, which was in turn inspired by rlla
 """
 import os
 import json
+import time
 import atexit
+import queue
+import random
 import shutil
 import pickle
+import sqlite3
+import threading
 import os.path as osp
+import numpy as np
 import tensorflow as tf
+import rlalgs.utils.catalog as catalog
+from rlalgs.utils.checkpoints import CheckpointIndex
+from rlalgs.utils.metrics import MetricsWriter, EventLog, METRICS_DIR, EVENTS_EXT
 from rlalgs.utils.serialization_utils import convert_json
 
 
 DEFAULT_DIR = osp.join(osp.abspath(osp.dirname(osp.dirname(__file__))), 'data')
 OBS_NAME = "x"
 ACTS_NAME = "pi"
+TRAIN_STATE_DIR = "train_state"
+# epoch is number of rows logged before episode finished, time is wall clock time
+EPISODE_FIELDS = [("epoch", "int64"), ("return", "float64"), ("length", "int64"),
+                  ("time", "float64")]
 
 
 def setup_logger_kwargs(exp_name, data_dir=None, seed=None, verbose=True):
@@ -38,7 +51,8 @@ def setup_logger_kwargs(exp_name, data_dir=None, seed=None, verbose=True):
         verbose : whether logger should output performance metrics each epoch
 
     Returns:
-        logger_kwargs : dictionary containing output_dir and exp_name
+        logger_kwargs : dictionary containing output_dir, exp_name and catalog_path, the run
+            catalog of data_dir
     """
     if data_dir is None:
         data_dir = DEFAULT_DIR
@@ -50,7 +64,8 @@ def setup_logger_kwargs(exp_name, data_dir=None, seed=None, verbose=True):
         expfolder = exp_name
     output_dir = osp.join(data_dir, expfolder)
 
-    return dict(output_dir=output_dir, exp_name=exp_name, verbose=verbose)
+    return dict(output_dir=output_dir, exp_name=exp_name, verbose=verbose,
+                catalog_path=catalog.catalog_path(data_dir))
 
 
 def restore_model(sess, model_dir):
@@ -75,19 +90,226 @@ def get_env_name(model_dir):
     return info["env"]
 
 
+def get_frame_skip(model_dir):
+    info_file = open(osp.join(model_dir, "exp_info.pkl"), "rb")
+    info = pickle.load(info_file)
+    info_file.close()
+    return info.get("frame_skip", 1)
+
+
+def get_frame_stack(model_dir):
+    info_file = open(osp.join(model_dir, "exp_info.pkl"), "rb")
+    info = pickle.load(info_file)
+    info_file.close()
+    return info.get("frame_stack", 1)
+
+
+def get_rng_state(env=None):
+    """
+    Get the state of the numpy and python global random number generators, and of the
+    environment and its action space random number generators (if env is not None)
+    """
+    state = {"np": np.random.get_state(), "py": random.getstate()}
+    if env is not None:
+        for k, obj in (("env", env.unwrapped), ("action_space", env.action_space)):
+            if isinstance(getattr(obj, "np_random", None), np.random.RandomState):
+                state[k] = obj.np_random.get_state()
+    return state
+
+
+def set_rng_state(state, env=None):
+    """
+    Restore random number generator states returned by get_rng_state
+    """
+    np.random.set_state(state["np"])
+    random.setstate(state["py"])
+    if env is not None:
+        for k, obj in (("env", env.unwrapped), ("action_space", env.action_space)):
+            if k in state:
+                obj.np_random.set_state(state[k])
+
+
+def load_train_state(run_dir):
+    """
+    Load the training state saved in run output directory by Logger.save_model
+
+    Arguments:
+        str run_dir : output directory of run
+
+    Returns:
+        dict state : the saved training state, with any arrays saved separately in
+            state["arrays"]
+    """
+    state_dir = osp.join(run_dir, TRAIN_STATE_DIR)
+    with open(osp.join(state_dir, "state.pkl"), "rb") as fin:
+        state = pickle.load(fin)
+    state["arrays"] = {name: np.load(osp.join(state_dir, name + ".npy"))
+                       for name in state.get("arrays", [])}
+    return state
+
+
+def _swap_dir(tmp_dir, target_dir):
+    """
+    Replace target_dir with completely written tmp_dir
+    """
+    old_dir = target_dir + ".old"
+    # left behind if process was killed during a previous swap
+    if osp.exists(old_dir):
+        shutil.rmtree(old_dir)
+    if osp.exists(target_dir):
+        os.rename(target_dir, old_dir)
+    os.rename(tmp_dir, target_dir)
+    if osp.exists(old_dir):
+        shutil.rmtree(old_dir)
+
+
+def _link_or_copy(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        # e.g. filesystem doesn't support hard links
+        shutil.copy2(src, dst)
+
+
+class CheckpointWriter:
+    """
+    Writes model checkpoints in a background thread, so training does not stall while saving.
+
+    Variable values are snapshotted in memory by the caller and loaded into a mirror of the
+    variables in a separate graph, which is then saved. Checkpoints are written to a temporary
+    directory which is renamed into place once complete.
+
+    A training state directory can be written along with a checkpoint, containing the same
+    variable checkpoint (hard linked, so it is only written once) and any state files.
+    """
+
+    def __init__(self, variables, meta_graph_def):
+        """
+        Arguments:
+            list variables : the variables to save
+            MetaGraphDef meta_graph_def : meta graph of model, written with each checkpoint
+        """
+        self.meta_graph_def = meta_graph_def
+        self.graph = tf.Graph()
+        with self.graph.as_default():
+            self.mirror_vars = [tf.Variable(tf.zeros(v.shape, v.dtype.base_dtype), name=v.op.name)
+                                for v in variables]
+            self.saver = tf.train.Saver({v.op.name: m for v, m in zip(variables, self.mirror_vars)},
+                                        save_relative_paths=True)
+        self.sess = tf.Session(graph=self.graph)
+        # only buffer one pending snapshot, so memory use is bounded if writing falls behind
+        self.queue = queue.Queue(maxsize=1)
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def write(self, model_dir, values, info, callback=None, state_dir=None, state_files=None):
+        """
+        Queue snapshot of variable values, and model info, to be written to model_dir.
+
+        If provided, callback is called from writer thread once checkpoint is written.
+
+        Arguments:
+            str model_dir : directory to write checkpoint to
+            list values : values of variables
+            dict info : model info, written to exp_info.pkl
+            func callback : called once checkpoint is written
+            str state_dir : if not None, directory to also write checkpoint and state_files to
+            dict state_files : file name -> contents (bytes, or np.ndarray written with np.save)
+        """
+        self._check_error()
+        self.queue.put((model_dir, values, info, callback, state_dir, state_files))
+
+    def wait(self):
+        """
+        Block until all queued checkpoints are written
+        """
+        self.queue.join()
+        self._check_error()
+
+    def close(self):
+        """
+        Write any queued checkpoints and stop writer thread
+        """
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+            self.sess.close()
+        self._check_error()
+
+    def _check_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise RuntimeError("Writing model checkpoint failed") from error
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                return
+            model_dir, values, info, callback, state_dir, state_files = item
+            try:
+                self._write(model_dir, values, info, state_dir, state_files)
+                if callback is not None:
+                    callback()
+            except Exception as e:
+                self.error = e
+            self.queue.task_done()
+
+    def _write(self, model_dir, values, info, state_dir=None, state_files=None):
+        tmp_dir = model_dir + ".tmp"
+        if osp.exists(tmp_dir):
+            shutil.rmtree(tmp_dir)
+        self.sess.run([m.initializer for m in self.mirror_vars],
+                      {m.initializer.inputs[1]: v for m, v in zip(self.mirror_vars, values)})
+        self.saver.save(self.sess, osp.join(tmp_dir, "model"), write_meta_graph=False)
+        ckpt_fnames = os.listdir(tmp_dir)
+        with open(osp.join(tmp_dir, "model.meta"), "wb") as fout:
+            fout.write(self.meta_graph_def.SerializeToString())
+        with open(osp.join(tmp_dir, "exp_info.pkl"), "wb") as info_file:
+            pickle.dump(info, info_file)
+
+        if state_dir is not None:
+            state_tmp_dir = state_dir + ".tmp"
+            if osp.exists(state_tmp_dir):
+                shutil.rmtree(state_tmp_dir)
+            os.makedirs(state_tmp_dir)
+            for fname in ckpt_fnames:
+                _link_or_copy(osp.join(tmp_dir, fname), osp.join(state_tmp_dir, fname))
+            for fname, contents in state_files.items():
+                if isinstance(contents, np.ndarray):
+                    np.save(osp.join(state_tmp_dir, fname), contents)
+                else:
+                    with open(osp.join(state_tmp_dir, fname), "wb") as fout:
+                        fout.write(contents)
+
+        _swap_dir(tmp_dir, model_dir)
+        if state_dir is not None:
+            _swap_dir(state_tmp_dir, state_dir)
+
+
 class Logger:
     """
     A simple logger
 
     Allows for:
     - storing and writing tabular statistics to a tab seperated file
+    - writing numeric statistics at full precision to a columnar binary store in
+      output_dir/metrics (see rlalgs.utils.metrics)
+    - logging per-episode (log_episode) and other high-frequency events (event_log) to
+      buffered binary event logs
+    - recording the run's config, latest metrics and model directory in the run catalog
+      (see rlalgs.utils.catalog)
 
     Simply call log_tabular(diagnostic_name, diagnostic_value) to store a key-value pair.
     Then call dump_tabular() to write all stored key-value pairs to tab seperated file.
 
     """
 
-    def __init__(self, output_dir=None, output_fname="progress.txt", exp_name=None, verbose=True):
+    def __init__(self, output_dir=None, output_fname="progress.txt", exp_name=None, verbose=True,
+                 checkpoint_retention=None, resume_from=None, metrics_block_rows=10,
+                 catalog_path=None):
         """
         Initialize logger to write to output_dir/output_file
 
@@ -97,6 +319,14 @@ class Logger:
             str output_fname : the name of output file
             str exp_name : name of experiment
             bool verbose : whether to print detailed info or not
+            checkpoint_retention : retention policy for saved models, as dict of kwargs or
+                rlalgs.utils.checkpoints.RetentionPolicy (if None all saved models are kept)
+            str resume_from : output directory of run being resumed. Rows logged by that run up
+                to its saved training state are copied to the output file (and metrics store) and
+                new rows appended.
+            int metrics_block_rows : number of rows buffered before being written to metrics store
+            str catalog_path : run catalog database to record run in (if None run isn't
+                cataloged). setup_logger_kwargs sets it to the catalog of its data directory.
         """
         self.output_dir = DEFAULT_DIR if output_dir is None else output_dir
         if osp.exists(self.output_dir):
@@ -104,26 +334,131 @@ class Logger:
         else:
             os.makedirs(self.output_dir)
         self.output_fname = osp.join(self.output_dir, output_fname)
-        self.output_file = open(self.output_fname, "w", buffering=1)
-        # closes file when module exits
-        atexit.register(self.output_file.close)
         self.first_row = True
         self.headers = []
+        self.rows_logged = 0
+        self.resume_event_counts = {}
+        self.resume_from = resume_from
+        if resume_from is None:
+            self.output_file = open(self.output_fname, "w", buffering=1)
+        else:
+            self._resume_output_file(osp.join(resume_from, output_fname))
+        self.metrics_writer = MetricsWriter(
+            osp.join(self.output_dir, METRICS_DIR), metrics_block_rows,
+            None if resume_from is None else osp.join(resume_from, METRICS_DIR), self.rows_logged)
+        self.event_logs = {}
+        self.episode_log = self.event_log("episodes", EPISODE_FIELDS)
         self.log_current_row = {}
         self.exp_name = exp_name
         self.verbose = verbose
+        self.checkpoint_writer = None
+        self.checkpoint_index = CheckpointIndex(self.output_dir, checkpoint_retention)
+        self.last_row = {}
+        self.catalog = None
+        if catalog_path is not None:
+            try:
+                self.catalog = catalog.Catalog(catalog_path)
+            except (sqlite3.Error, OSError) as e:
+                print("Warning: could not open run catalog {}: {}".format(catalog_path, e))
+        # fallback in case close isn't called, e.g. training raised an exception
+        atexit.register(self.close)
+
+    def close(self):
+        """
+        Finish logging: wait for pending checkpoints to be written, stop checkpoint writer,
+        write buffered metrics and events and close files. Should be called at end of training,
+        so loggers of runs in the same process (e.g. a tuner sweep) don't accumulate.
+        """
+        atexit.unregister(self.close)
+        try:
+            if self.checkpoint_writer is not None:
+                self.checkpoint_writer.close()
+        finally:
+            self.metrics_writer.flush()
+            for log in self.event_logs.values():
+                log.flush()
+            self.output_file.close()
+            if self.catalog is not None:
+                self.catalog.close()
+                self.catalog = None
+
+    def _resume_output_file(self, resume_fname):
+        """
+        Write rows logged up to saved training state to output file and open it for appending
+        """
+        with open(osp.join(self.resume_from, TRAIN_STATE_DIR, "logger.json")) as fin:
+            logger_state = json.load(fin)
+        self.rows_logged = logger_state["rows_logged"]
+        self.resume_event_counts = logger_state.get("event_counts", {})
+        with open(resume_fname) as fin:
+            lines = fin.readlines()[:self.rows_logged+1]
+        self.output_file = open(self.output_fname, "w", buffering=1)
+        self.output_file.writelines(lines)
+        if len(lines) > 0:
+            self.headers = lines[0].rstrip("\n").split("\t")
+            self.first_row = False
 
-    def save_config(self, config):
+    def _update_catalog(self, update):
+        """
+        Run catalog update, disabling catalog if it fails so training isn't interrupted
+        """
+        try:
+            update()
+        except (sqlite3.Error, OSError) as e:
+            print("Warning: updating run catalog failed, no longer updating it: {}".format(e))
+            self.catalog = None
+
+    def event_log(self, name, fields, capacity=4096):
+        """
+        Create a buffered binary event log, written to output_dir/metrics/<name>.events.
+
+        Use for high-frequency events (e.g. per update losses), by calling log on returned event
+        log with a value for each field. Logs are written at exit and with each training state
+        save. Read back with rlalgs.utils.metrics.load_events.
+
+        Arguments:
+            str name : name of event log
+            list fields : (name, dtype) of each event field
+            int capacity : number of events buffered before writing
+
+        Returns:
+            EventLog log : the event log
+        """
+        assert name not in self.event_logs, "Event log %s already exists" % name
+        fname = osp.join(self.output_dir, METRICS_DIR, name + EVENTS_EXT)
+        resume_fname = None
+        if self.resume_from is not None:
+            resume_fname = osp.join(self.resume_from, METRICS_DIR, name + EVENTS_EXT)
+        log = EventLog(fname, fields, capacity, resume_fname, self.resume_event_counts.get(name, 0))
+        self.event_logs[name] = log
+        return log
+
+    def log_episode(self, ep_return, ep_len, end_time=None):
+        """
+        Log return and length of a finished episode to episode event log
+
+        Arguments:
+            float ep_return : episode return
+            int ep_len : episode length
+            float end_time : wall clock time episode finished (if None uses current time)
+        """
+        self.episode_log.log(self.rows_logged, ep_return, ep_len,
+                             time.time() if end_time is None else end_time)
+
+    def save_config(self, config, algo=None):
         """
         Saves the configuration (env, hyperparams, etc) for a given algorithm run.
         Configuration is saved into a file called "config.json" in output directory.
 
         Arguments:
             dict config : local config dictionary of algorithm
+            str algo : name of algorithm, saved as "algo" and used to index run in catalog
         """
         config_json = convert_json(config)
         if self.exp_name is not None:
             config_json["exp_name"] = self.exp_name
+        if algo is not None:
+            config_json["algo"] = algo
         if 'logger' in config_json:
             del config_json['logger']
         if self.verbose:
@@ -133,40 +468,146 @@ class Logger:
             print("\n")
         with open(osp.join(self.output_dir, "config.json"), "w") as out:
             json.dump(config_json, out, separators=(',', ':\t'), indent=2, sort_keys=True)
+        if self.catalog is not None:
+            self._update_catalog(lambda: self.catalog.add_run(
+                self.output_dir, config_json, self.exp_name, algo))
 
-    def save_model(self, itr=None):
+    def save_model(self, itr=None, train_state=None, env=None, arrays=None):
         """
-        Save the current model.
+        Save the current model, and optionally the full training state so training can be
+        resumed.
 
         If itr is not None saves model to new directory, otherwise rewrites old saved model if one
         exists.
+
+        Variable values are snapshotted immediately and written to disk in the background, call
+        wait_for_saves to block until saving is complete.
+
+        If train_state is not None the training state of run is also saved, overwriting any
+        previously saved training state. This is all global variables (including optimizer
+        state, as in the model checkpoint), the numpy, python and environment random number
+        generator states, the number of rows logged and the algorithm state passed in. The
+        state is snapshotted along with the variables and written by the same background save,
+        so it is consistent with the saved model. Pending rows and events are written to the
+        metrics store and event logs, so they can be resumed from the saved state.
+
+        The state of random ops run in the tf graph and the internal state of the environment
+        (beyond its random number generator) can't be saved, so training state should be saved
+        at an epoch boundary where the environment is reset.
+
+        Arguments:
+            int itr : iteration of model, if None model is overwritten
+            dict train_state : algorithm state (e.g. epoch, step counts)
+            gym.Env env : the environment
+            dict arrays : large numpy arrays of algorithm state (e.g. replay buffer contents),
+                each written directly to its own .npy file instead of being pickled with state.
+                Restored in state["arrays"]. Arrays are written in the background so must not be
+                modified afterwards (pass copies of arrays that are).
         """
         assert hasattr(self, "tf_saver_elements"), \
             "First have to setup model saving with self.setup_tf_model_saver, before saving model"
-        saver = tf.train.Saver()
         sess = self.tf_saver_elements["session"]
         base_model_dir = self.tf_saver_elements["base_model_dir"]
         model_dir = base_model_dir if itr is None else base_model_dir + str(itr)
-        if osp.exists(model_dir):
-            shutil.rmtree(model_dir)
-        # save model
-        saver.save(sess, osp.join(model_dir, "model"))
-        # save model info
-        info_file = open(osp.join(model_dir, "exp_info.pkl"), "wb")
-        pickle.dump(self.tf_model_info, info_file)
-        info_file.close()
+        if self.checkpoint_writer is None:
+            # export once graph is complete, so all model ops are included
+            saver = self.tf_saver_elements["saver"]
+            meta_graph_def = tf.train.export_meta_graph(saver_def=saver.saver_def)
+            self.checkpoint_writer = CheckpointWriter(self.tf_saver_elements["variables"],
+                                                      meta_graph_def)
+        values = sess.run(self.tf_saver_elements["variables"])
+        # index checkpoint under metrics of last logged epoch
+        epoch = self.last_row.get("epoch", itr)
+        epoch = None if epoch is None else int(epoch)
+        metrics = {k: float(v) for k, v in self.last_row.items()
+                   if isinstance(v, (int, float, np.number))}
+
+        def index_checkpoint():
+            self.checkpoint_index.add(epoch, model_dir, metrics)
+
+        state_dir, state_files = None, None
+        if train_state is not None:
+            state_dir = osp.join(self.output_dir, TRAIN_STATE_DIR)
+            state_files = self._train_state_files(train_state, env, arrays)
+        self.checkpoint_writer.write(model_dir, values, dict(self.tf_model_info), index_checkpoint,
+                                     state_dir, state_files)
+
+    def _train_state_files(self, state, env=None, arrays=None):
+        """
+        Snapshot training state as the files of training state directory
+        """
+        arrays = {} if arrays is None else arrays
+        self.metrics_writer.flush()
+        for log in self.event_logs.values():
+            log.flush()
+        state = dict(state, rng=get_rng_state(env), arrays=sorted(arrays))
+        files = {name + ".npy": arr for name, arr in arrays.items()}
+        # pickled now, so later changes to state by algorithm aren't saved
+        files["state.pkl"] = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+        # kept separate so resuming logger doesn't need to load full state
+        files["logger.json"] = json.dumps(
+            {"rows_logged": self.rows_logged,
+             "event_counts": {k: len(v) for k, v in self.event_logs.items()}}).encode()
+        return files
+
+    def wait_for_saves(self):
+        """
+        Block until all model saves have been written to disk
+        """
+        if self.checkpoint_writer is not None:
+            self.checkpoint_writer.wait()
 
-    def setup_tf_model_saver(self, sess, env, inputs, outputs):
+    def restore_train_state(self, env=None):
+        """
+        Restore training state saved by run being resumed (i.e. resume_from)
+
+        This should be called after setup_tf_model_saver.
+
+        Arguments:
+            gym.Env env : the environment
+
+        Returns:
+            dict state : algorithm state passed to save_model
+        """
+        assert self.resume_from is not None, "Logger has no run to resume from"
+        assert hasattr(self, "tf_saver_elements"), \
+            "First have to setup model saving with self.setup_tf_model_saver, before restoring"
+        self.tf_saver_elements["saver"].restore(
+            self.tf_saver_elements["session"],
+            osp.join(self.resume_from, TRAIN_STATE_DIR, "model"))
+        state = load_train_state(self.resume_from)
+        set_rng_state(state["rng"], env)
+        if self.verbose:
+            print("Resumed training state from {}".format(self.resume_from))
+        return state
+
+    def setup_tf_model_saver(self, sess, env, inputs, outputs, frame_stack=1):
         """
         Set up model saver info
 
         This should be called before save_model.
+
+        Arguments:
+            tf.Session sess : the session containing model
+            gym.Env env : the environment model is trained on
+            dict inputs : model input tensors
+            dict outputs : model output tensors
+            int frame_stack : number of stacked frames model takes as input
         """
         base_model_dir = osp.join(self.output_dir, "simple_save")
-        self.tf_saver_elements = dict(session=sess, base_model_dir=base_model_dir)
+        # single saver per run, so save ops are only added to graph once
+        variables = tf.global_variables()
+        saver = tf.train.Saver(variables, save_relative_paths=True)
+        self.tf_saver_elements = dict(session=sess, base_model_dir=base_model_dir, saver=saver,
+                                      variables=variables)
         self.tf_model_info = {'env': env.spec.id,
+                              'frame_skip': getattr(env, "frame_skip", 1),
+                              'frame_stack': frame_stack,
                               "inputs": {k: v.name for k, v in inputs.items()},
                               "outputs": {k: v.name for k, v in outputs.items()}}
+        if self.catalog is not None:
+            self._update_catalog(lambda: self.catalog.set_model(self.output_dir, env.spec.id,
+                                                                base_model_dir))
 
     def log_tabular(self, key, value):
         """
@@ -213,8 +654,14 @@ class Logger:
             self.output_file.write("\t".join(self.headers) + "\n")
 
         self.output_file.write("\t".join(vals) + "\n")
+        self.metrics_writer.append(self.log_current_row)
+        self.last_row = dict(self.log_current_row)
         self.log_current_row.clear()
         self.first_row = False
+        self.rows_logged += 1
+        if self.catalog is not None:
+            self._update_catalog(lambda: self.catalog.update_metrics(self.output_dir, self.last_row,
+                                                                     self.rows_logged))
 
     def get_stats(self, key):
         """
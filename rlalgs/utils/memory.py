@@ -0,0 +1,99 @@
+"""
+Memory accounting for training runs.
+
+Reports the memory held by registered buffers and by tf variables, the size of the tf graph
+(so graph growth from ops being added during training shows up) and peak memory usage.
+"""
+import numpy as np
+import tensorflow as tf
+import rlalgs.utils.utils as utils
+
+
+MIB = float(2**20)
+
+
+def variable_bytes(variables):
+    """
+    Get total bytes allocated for tf variables
+    """
+    return sum(v.shape.num_elements() * v.dtype.base_dtype.size for v in variables)
+
+
+def buffer_bytes(buf, max_depth=2):
+    """
+    Get total bytes of numpy arrays and tf variables held by a buffer object.
+
+    Arrays and variables held in attributes, in dicts, lists or tuples, or in attributes of
+    nested objects (e.g. a staging buffer, up to max_depth) are counted, each only once.
+
+    Arguments:
+        buf : the buffer object
+        int max_depth : max depth of nested objects to search
+
+    Returns:
+        int nbytes : total bytes
+    """
+    seen = set()
+
+    def _bytes(obj, depth):
+        if id(obj) in seen:
+            return 0
+        seen.add(id(obj))
+        if isinstance(obj, np.ndarray):
+            return obj.nbytes
+        if isinstance(obj, tf.Variable):
+            return variable_bytes([obj])
+        if isinstance(obj, dict):
+            return sum(_bytes(v, depth) for v in obj.values())
+        if isinstance(obj, (list, tuple)):
+            return sum(_bytes(v, depth) for v in obj)
+        # don't search tf objects (e.g. placeholders), which reference the whole graph
+        if depth < max_depth and hasattr(obj, "__dict__") \
+                and not type(obj).__module__.startswith("tensorflow"):
+            return sum(_bytes(v, depth + 1) for v in vars(obj).values())
+        return 0
+
+    return _bytes(buf, 0)
+
+
+class MemoryTracker:
+    """
+    Logs memory usage of registered buffers and of the tf graph each epoch.
+
+    Disabled by default, in which case nothing is logged.
+    """
+
+    def __init__(self, enabled=False):
+        """
+        Arguments:
+            bool enabled : whether to log memory usage
+        """
+        self.enabled = enabled
+        self.buffers = {}
+
+    def register(self, name, buf):
+        """
+        Register a buffer, whose memory usage is logged as <name>_mem
+
+        Arguments:
+            str name : name of buffer
+            buf : the buffer object
+        """
+        self.buffers[name] = buf
+
+    def log_tabular(self, logger):
+        """
+        Log memory usage (in MiB) of each registered buffer, of global and local tf variables,
+        the number of ops in the default graph and the peak memory usage of process.
+
+        Arguments:
+            Logger logger : the logger
+        """
+        if not self.enabled:
+            return
+        for name, buf in self.buffers.items():
+            logger.log_tabular(name + "_mem", buffer_bytes(buf) / MIB)
+        logger.log_tabular("global_vars_mem", variable_bytes(tf.global_variables()) / MIB)
+        logger.log_tabular("local_vars_mem", variable_bytes(tf.local_variables()) / MIB)
+        logger.log_tabular("graph_ops", len(tf.get_default_graph().get_operations()))
+        logger.log_tabular("peak_mem_usage", utils.get_peak_mem_usage())
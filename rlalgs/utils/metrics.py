@@ -0,0 +1,274 @@
+"""
+Binary stores for logged metrics, written alongside the text progress file.
+
+Each column is stored in its own file of raw typed values (metrics/<column>.bin), with a
+schema.json listing the columns, their dtypes and the number of complete rows. Rows are
+buffered and appended to the column files in blocks, and columns can be read back without
+parsing via memory-mapping.
+
+Event logs store high-frequency records (e.g. one per episode or per update) as binary records
+(metrics/<name>.events). Records are buffered in a preallocated array and written in blocks, so
+logging an event does no file I/O.
+"""
+import os
+import json
+import numpy as np
+import os.path as osp
+
+
+METRICS_DIR = "metrics"
+SCHEMA_FNAME = "schema.json"
+EVENTS_EXT = ".events"
+
+
+def _column_dtype(value):
+    """
+    Get dtype to store column as, from a logged value (None if value is not numeric)
+
+    Integer columns are stored as float64, since a column logged as an int in the first row may
+    later be logged as a float or nan.
+    """
+    if isinstance(value, (bool, np.bool_)):
+        return "bool"
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return "float64"
+    return None
+
+
+def _column_values(values, dtype):
+    """
+    Convert logged values of a column to array of column dtype, values that can't be converted
+    (e.g. None) are stored as nan (or False for bool columns)
+    """
+    try:
+        return np.array(values, dtype=dtype)
+    except (TypeError, ValueError):
+        missing = False if dtype == "bool" else np.nan
+        return np.array([v if _column_dtype(v) is not None else missing for v in values],
+                        dtype=dtype)
+
+
+def _column_fname(name):
+    return name.replace(os.sep, "_") + ".bin"
+
+
+def _read_schema(metrics_dir):
+    with open(osp.join(metrics_dir, SCHEMA_FNAME)) as fin:
+        return json.load(fin)
+
+
+class MetricsWriter:
+    """
+    Appends logged rows to a columnar metrics store.
+
+    Columns are taken from the values of the first row, non-numeric columns are not stored.
+    Numeric columns are stored as float64, except bool columns. Rows are written in blocks of
+    block_rows, so call flush to write any pending rows.
+    """
+
+    def __init__(self, metrics_dir, block_rows=10, resume_dir=None, resume_rows=0):
+        """
+        Arguments:
+            str metrics_dir : directory to store metrics in
+            int block_rows : number of rows buffered before writing
+            str resume_dir : metrics directory of run being resumed. If not None the first
+                resume_rows rows of its store are copied and new rows appended after them.
+            int resume_rows : number of rows to keep when resuming
+        """
+        self.metrics_dir = metrics_dir
+        self.block_rows = block_rows
+        self.columns = []
+        self.block = []
+        self.rows = 0
+        os.makedirs(metrics_dir, exist_ok=True)
+        if resume_dir is not None and osp.exists(osp.join(resume_dir, SCHEMA_FNAME)):
+            self._resume(resume_dir, resume_rows)
+        else:
+            self._clear()
+
+    def _clear(self):
+        for fname in os.listdir(self.metrics_dir):
+            if fname.endswith(".bin") or fname == SCHEMA_FNAME:
+                os.remove(osp.join(self.metrics_dir, fname))
+
+    def _resume(self, resume_dir, resume_rows):
+        data = load_metrics(osp.dirname(resume_dir))
+        schema = _read_schema(resume_dir)
+        # data is read into memory before writing, since resume_dir may be metrics_dir
+        self.rows = min(resume_rows, schema["rows"])
+        data = {name: np.array(col[:self.rows]) for name, col in data.items()}
+        self._clear()
+        # int64 columns of stores written before all numeric columns were float64 are converted
+        self.columns = [(c["name"], "float64" if c["dtype"] == "int64" else c["dtype"])
+                        for c in schema["columns"]]
+        data = {name: data[name].astype(dtype) for name, dtype in self.columns}
+        for name, _ in self.columns:
+            with open(osp.join(self.metrics_dir, _column_fname(name)), "wb") as fout:
+                fout.write(data[name].tobytes())
+        self._write_schema()
+
+    def append(self, row):
+        """
+        Append a logged row
+
+        Arguments:
+            dict row : maps column name to value
+        """
+        if len(self.columns) == 0 and self.rows == 0:
+            self.columns = [(k, _column_dtype(v)) for k, v in row.items()
+                            if _column_dtype(v) is not None]
+        self.block.append([row[name] for name, _ in self.columns])
+        if len(self.block) >= self.block_rows:
+            self.flush()
+
+    def flush(self):
+        """
+        Write pending rows to store
+        """
+        if len(self.block) == 0:
+            return
+        for i, (name, dtype) in enumerate(self.columns):
+            values = _column_values([r[i] for r in self.block], dtype)
+            with open(osp.join(self.metrics_dir, _column_fname(name)), "ab") as fout:
+                fout.write(values.tobytes())
+        self.rows += len(self.block)
+        self.block = []
+        self._write_schema()
+
+    def _write_schema(self):
+        schema = {"rows": self.rows,
+                  "columns": [{"name": name, "dtype": dtype, "file": _column_fname(name)}
+                              for name, dtype in self.columns]}
+        schema_fname = osp.join(self.metrics_dir, SCHEMA_FNAME)
+        # schema is replaced in one step, so readers never see rows that aren't fully written
+        with open(schema_fname + ".tmp", "w") as fout:
+            json.dump(schema, fout, indent=2)
+        os.replace(schema_fname + ".tmp", schema_fname)
+
+
+def has_metrics(run_dir):
+    """
+    Whether run output directory has a metrics store
+    """
+    return osp.exists(osp.join(run_dir, METRICS_DIR, SCHEMA_FNAME))
+
+
+def load_metrics(run_dir, start=0):
+    """
+    Load the columns of a run's metrics store, as read-only memory-mapped arrays
+
+    Arguments:
+        str run_dir : run output directory
+        int start : first row to load, so only rows appended since a previous load can be read
+
+    Returns:
+        dict columns : maps column name to array of values, in logged column order
+    """
+    metrics_dir = osp.join(run_dir, METRICS_DIR)
+    schema = _read_schema(metrics_dir)
+    n = max(0, schema["rows"] - start)
+    columns = {}
+    for c in schema["columns"]:
+        if n == 0:
+            columns[c["name"]] = np.zeros(0, dtype=c["dtype"])
+        else:
+            columns[c["name"]] = np.memmap(osp.join(metrics_dir, c["file"]), dtype=c["dtype"],
+                                           mode="r", shape=(n, ),
+                                           offset=start * np.dtype(c["dtype"]).itemsize)
+    return columns
+
+
+def metrics_rows(run_dir):
+    """
+    Get number of complete rows in a run's metrics store
+    """
+    return _read_schema(osp.join(run_dir, METRICS_DIR))["rows"]
+
+
+class EventLog:
+    """
+    Buffered log of fixed format event records.
+
+    Records are stored in a preallocated buffer of capacity records, which is written to the
+    log file whenever it fills up, so call flush to write any pending records.
+    """
+
+    def __init__(self, fname, fields, capacity=4096, resume_fname=None, resume_events=0):
+        """
+        Arguments:
+            str fname : log file path
+            list fields : (name, dtype) of each record field
+            int capacity : number of records buffered before writing
+            str resume_fname : log file of run being resumed. If not None its first
+                resume_events records are copied and new records appended after them.
+            int resume_events : number of records to keep when resuming
+        """
+        self.fname = fname
+        self.dtype = np.dtype(fields)
+        self.buf = np.zeros(capacity, dtype=self.dtype)
+        self.ptr = 0
+        self.count = 0
+        data = b""
+        if resume_fname is not None and osp.exists(resume_fname):
+            events = _load_events_file(resume_fname)
+            self.count = min(resume_events, len(events))
+            # read into memory before writing, since resume_fname may be fname
+            data = np.array(events[:self.count]).tobytes()
+        with open(fname, "wb") as fout:
+            fout.write(data)
+        with open(fname + ".json", "w") as fout:
+            json.dump({"fields": [[n, self.dtype[n].str] for n in self.dtype.names]}, fout)
+
+    def log(self, *values):
+        """
+        Log an event, with a value for each field
+        """
+        self.buf[self.ptr] = values
+        self.ptr += 1
+        if self.ptr == len(self.buf):
+            self.flush()
+
+    def flush(self):
+        """
+        Write buffered records to log file
+        """
+        if self.ptr == 0:
+            return
+        with open(self.fname, "ab") as fout:
+            fout.write(self.buf[:self.ptr].tobytes())
+        self.count += self.ptr
+        self.ptr = 0
+
+    def __len__(self):
+        return self.count + self.ptr
+
+
+def _load_events_file(fname):
+    with open(fname + ".json") as fin:
+        dtype = np.dtype([tuple(f) for f in json.load(fin)["fields"]])
+    # ignore any partially written record at end of file
+    n = osp.getsize(fname) // dtype.itemsize
+    if n == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(fname, dtype=dtype, mode="r", shape=(n, ))
+
+
+def has_events(run_dir, name):
+    """
+    Whether run output directory has an event log
+    """
+    return osp.exists(osp.join(run_dir, METRICS_DIR, name + EVENTS_EXT + ".json"))
+
+
+def load_events(run_dir, name):
+    """
+    Load a run's event log, as a read-only memory-mapped record array
+
+    Arguments:
+        str run_dir : run output directory
+        str name : name of event log (e.g. "episodes")
+
+    Returns:
+        np.ndarray events : record array with a field for each event field
+    """
+    return _load_events_file(osp.join(run_dir, METRICS_DIR, name + EVENTS_EXT))
@@ -3,6 +3,7 @@ This module contains MPI functions for A2C implementation
 """
 import os
 import sys
+import time
 import subprocess
 import numpy as np
 from mpi4py import MPI
@@ -33,6 +34,35 @@ def mpi_fork(n, bind_to_core=False):
         sys.exit()
 
 
+# functions called with (name, nbytes, start, end) after each MPI collective call
+_comm_observers = []
+
+
+def add_comm_observer(fn):
+    """
+    Add function to be called with (name, nbytes, start, end) after each collective call made
+    by this module, where start and end are wall clock times
+    """
+    _comm_observers.append(fn)
+
+
+def remove_comm_observer(fn):
+    """ Remove function added with add_comm_observer """
+    _comm_observers.remove(fn)
+
+
+def _collective(name, nbytes, call, *args, **kwargs):
+    """ Make collective call, notifying any comm observers """
+    if not _comm_observers:
+        return call(*args, **kwargs)
+    start = time.time()
+    result = call(*args, **kwargs)
+    end = time.time()
+    for fn in _comm_observers:
+        fn(name, nbytes, start, end)
+    return result
+
+
 def proc_id():
     """ Get rank of calling process. """
     return MPI.COMM_WORLD.Get_rank()
@@ -89,7 +119,156 @@ def tf_broadcast(x, root=0):
 
 def broadcast(x, root=0):
     """ Sends x from root process to all other processes """
-    MPI.COMM_WORLD.Bcast(x, root=root)
+    _collective("Bcast", x.nbytes, MPI.COMM_WORLD.Bcast, x, root=root)
+
+
+def broadcast_obj(obj, root=0):
+    """ Sends python object from root process to all other processes """
+    return MPI.COMM_WORLD.bcast(obj, root=root)
+
+
+def gather_obj(obj, root=0):
+    """ Gathers python object from each process into list on root (None on other processes) """
+    return MPI.COMM_WORLD.gather(obj, root=root)
+
+
+def scatter_obj(objs, root=0):
+    """ Sends i-th object of list on root process to process i """
+    return MPI.COMM_WORLD.scatter(objs, root=root)
+
+
+def gather_stats(samples, root=0):
+    """
+    Compute statistics of samples over all processes (e.g. episode returns of an epoch) with a
+    single collective call.
+
+    Each process packs (count, sum, sum of squares, min, max) of its samples for each metric into
+    one array, which is gathered on root.
+
+    Arguments:
+        dict samples : maps metric name to list of samples of calling process (may be empty).
+            Must have same keys, in same order, on all processes.
+        int root : rank of process to compute stats on
+
+    Returns:
+        dict stats : on root maps metric name to dict with global mean, std, min, max and count
+            of samples (None on other processes)
+    """
+    keys = list(samples.keys())
+    packed = np.zeros((len(keys), 5), dtype=np.float64)
+    for i, k in enumerate(keys):
+        x = np.asarray(samples[k], dtype=np.float64).ravel()
+        if x.size > 0:
+            packed[i] = [x.size, x.sum(), np.square(x).sum(), x.min(), x.max()]
+        else:
+            packed[i] = [0, 0, 0, np.inf, -np.inf]
+    gathered = np.zeros((num_procs(), ) + packed.shape) if proc_id() == root else None
+    MPI.COMM_WORLD.Gather(packed, gathered, root=root)
+    if proc_id() != root:
+        return None
+
+    stats = {}
+    for i, k in enumerate(keys):
+        count = gathered[:, i, 0].sum()
+        if count == 0:
+            stats[k] = dict(mean=np.nan, std=np.nan, min=np.nan, max=np.nan, count=0)
+            continue
+        mean = gathered[:, i, 1].sum() / count
+        var = max(0.0, gathered[:, i, 2].sum() / count - mean**2)
+        stats[k] = dict(mean=mean, std=np.sqrt(var), min=gathered[:, i, 3].min(),
+                        max=gathered[:, i, 4].max(), count=int(count))
+    return stats
+
+
+class CommProfiler:
+    """
+    Profiles the MPI collective calls made by this module (number of calls, bytes sent and time
+    per collective) and the load imbalance between processes, aggregated over all processes each
+    epoch.
+
+    Imbalance is measured from each process's busy time (epoch time not spent in collectives), so
+    doesn't rely on the clocks of processes being in sync. The time a process waits in
+    collectives for slower processes is estimated as the max busy time over processes minus its
+    own busy time.
+    """
+    collectives = ["Allreduce", "Bcast"]
+
+    def __init__(self, enabled=False):
+        """
+        Arguments:
+            bool enabled : whether to profile collective calls
+        """
+        self.enabled = enabled
+        self.stats = None
+        self.reset()
+        self.observing = enabled
+        if enabled:
+            add_comm_observer(self.observe)
+
+    def close(self):
+        """ Stop observing collective calls, should be called at end of training """
+        if self.observing:
+            remove_comm_observer(self.observe)
+            self.observing = False
+
+    def reset(self):
+        """ Clear counts for epoch """
+        self.calls = {c: 0 for c in self.collectives}
+        self.nbytes = {c: 0 for c in self.collectives}
+        self.time = {c: 0.0 for c in self.collectives}
+
+    def observe(self, name, nbytes, start, end):
+        """ Comm observer, counting call """
+        self.calls[name] += 1
+        self.nbytes[name] += nbytes
+        self.time[name] += end - start
+
+    def end_epoch(self, epoch_time):
+        """
+        Aggregate epoch's counts from all processes on root process, then reset counts.
+        Must be called by all processes.
+
+        Arguments:
+            float epoch_time : wall time of epoch on calling process
+        """
+        if not self.enabled:
+            return
+        comm_time = sum(self.time.values())
+        samples = {}
+        for c in self.collectives:
+            name = c.lower()
+            samples[name + "_calls"] = [self.calls[c]]
+            samples[name + "_mb"] = [self.nbytes[c] / float(2**20)]
+            samples[name + "_time"] = [self.time[c]]
+        samples["comm_time"] = [comm_time]
+        samples["busy_time"] = [max(0.0, epoch_time - comm_time)]
+        proc_stats = gather_stats(samples)
+        self.reset()
+        if proc_stats is None:
+            return
+        self.stats = {}
+        for c in self.collectives:
+            name = c.lower()
+            self.stats[name + "_calls"] = proc_stats[name + "_calls"]["max"]
+            self.stats[name + "_mb"] = proc_stats[name + "_mb"]["mean"]
+            self.stats[name + "_time"] = proc_stats[name + "_time"]["mean"]
+        busy = proc_stats["busy_time"]
+        self.stats["comm_time_max"] = proc_stats["comm_time"]["max"]
+        self.stats["wait_time_mean"] = busy["max"] - busy["mean"]
+        self.stats["wait_time_max"] = busy["max"] - busy["min"]
+        self.stats["imbalance"] = self.stats["wait_time_max"] / max(busy["max"], 1e-12)
+
+    def log_tabular(self, logger):
+        """
+        Log stats aggregated by last call to end_epoch (root process only). Per collective logs
+        calls per process (<name>_calls), MiB sent per process (<name>_mb) and mean time per
+        process (<name>_time), as well as max comm time, mean and max wait time over processes
+        and imbalance (max wait time as fraction of max busy time).
+        """
+        if not self.enabled:
+            return
+        for k, v in self.stats.items():
+            logger.log_tabular(k, v)
 
 
 class MPIAdamOptimizer(tf.train.AdamOptimizer):
@@ -123,7 +302,8 @@ class MPIAdamOptimizer(tf.train.AdamOptimizer):
 
         def _collect_grads(flat_grad):
             # Sum grads across all processes
-            self.comm.Allreduce(flat_grad, buf, op=MPI.SUM)
+            _collective("Allreduce", flat_grad.nbytes, self.comm.Allreduce, flat_grad, buf,
+                        op=MPI.SUM)
             # Average by dividing by number of processes
             np.divide(buf, float(num_tasks), out=buf)
             return buf
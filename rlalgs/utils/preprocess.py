@@ -33,7 +33,8 @@ def preprocess_pong_image(o, env=None):
 # map from environment name to preprocess fn and obs_dim
 PREPROCESS_MAP = {
     "Default": (preprocess_obs, None),
-    "Pong-v0": (preprocess_pong_image, 80*80)
+    "Pong-v0": (preprocess_pong_image, 80*80),
+    "PongNoFrameskip-v4": (preprocess_pong_image, 80*80)
 }
 
 
@@ -0,0 +1,202 @@
+"""
+Execution configuration for tensorflow sessions.
+
+Controls threading, cpu affinity and graph optimizer options, and can pick the fastest thread
+settings for the current graph with a short benchmark on startup.
+"""
+import os
+import time
+import numpy as np
+import tensorflow as tf
+from tensorflow.core.protobuf import rewriter_config_pb2
+import rlalgs.utils.mpi as mpi
+import rlalgs.utils.utils as utils
+
+
+def available_cores():
+    """
+    Get the ids of the cpu cores the calling process may run on
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count()))
+
+
+class ExecConfig:
+    """
+    Execution configuration for a tensorflow session.
+
+    By default the cores available are shared between all processes of an MPI run, so running
+    processes concurrently does not oversubscribe cores.
+    """
+
+    def __init__(self, intra_op_threads=None, inter_op_threads=None, affinity=False,
+                 opt_level=None, rewrite_options=None, autotune=False, autotune_runs=20):
+        """
+        Arguments:
+            int intra_op_threads : threads used to parallelize a single op (if None uses cores
+                available per process)
+            int inter_op_threads : threads used to run independent ops in parallel (if None uses
+                min(2, cores available per process))
+            bool or list affinity : whether to pin process to cores. If True each MPI process
+                is pinned to its own slice of the available cores, if a list pins process to the
+                listed core ids
+            str opt_level : tf graph optimizer level, "L0" or "L1" (if None uses tf default)
+            dict rewrite_options : grappler rewriter options mapping option name to "ON", "OFF"
+                or "AGGRESSIVE", e.g. {"arithmetic_optimization": "OFF"}
+            bool autotune : whether to pick fastest thread settings with a benchmark of the
+                current graph when session is created
+            int autotune_runs : number of timed runs per thread setting when auto-tuning
+        """
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.affinity = affinity
+        self.opt_level = opt_level
+        self.rewrite_options = {} if rewrite_options is None else rewrite_options
+        self.autotune = autotune
+        self.autotune_runs = autotune_runs
+
+    @classmethod
+    def from_arg(cls, exec_config):
+        """
+        Get ExecConfig from algorithm argument (None, dict of ExecConfig kwargs or ExecConfig)
+        """
+        if exec_config is None:
+            return cls()
+        if isinstance(exec_config, dict):
+            return cls(**exec_config)
+        return exec_config
+
+    def process_cores(self):
+        """
+        Get the core ids to use for calling process
+        """
+        if isinstance(self.affinity, (list, tuple)):
+            return list(self.affinity)
+        cores = available_cores()
+        n_procs = mpi.num_procs()
+        if len(cores) < n_procs:
+            # e.g. processes already bound to cores by mpirun
+            return cores
+        n = len(cores) // n_procs
+        return cores[mpi.proc_id()*n:(mpi.proc_id()+1)*n]
+
+    def apply_affinity(self):
+        """
+        Pin calling process to its cores, if affinity is set
+        """
+        if self.affinity and hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, self.process_cores())
+
+    def thread_settings(self):
+        """
+        Get the (intra_op_threads, inter_op_threads) to use
+        """
+        n_cores = len(self.process_cores())
+        intra = n_cores if self.intra_op_threads is None else self.intra_op_threads
+        inter = min(2, n_cores) if self.inter_op_threads is None else self.inter_op_threads
+        return intra, inter
+
+    def candidate_thread_settings(self):
+        """
+        Get the (intra_op_threads, inter_op_threads) settings to try when auto-tuning
+        """
+        n_cores = len(self.process_cores())
+        intras = sorted(set([2**i for i in range(int(np.log2(n_cores)) + 1)] + [n_cores]))
+        inters = [1, 2] if n_cores > 1 else [1]
+        return [(intra, inter) for intra in intras for inter in inters]
+
+    def proto(self, intra_op_threads=None, inter_op_threads=None):
+        """
+        Get the tf.ConfigProto for this config, optionally overriding thread settings
+        """
+        intra, inter = self.thread_settings()
+        config = tf.ConfigProto(
+            intra_op_parallelism_threads=intra if intra_op_threads is None else intra_op_threads,
+            inter_op_parallelism_threads=inter if inter_op_threads is None else inter_op_threads)
+        if self.opt_level is not None:
+            config.graph_options.optimizer_options.opt_level = \
+                getattr(tf.OptimizerOptions, self.opt_level)
+        rewriter = config.graph_options.rewrite_options
+        for name, toggle in self.rewrite_options.items():
+            setattr(rewriter, name, getattr(rewriter_config_pb2.RewriterConfig, toggle))
+        return config
+
+
+def zeros_feed(phs, batch_size=1):
+    """
+    Get a feed dict of zero arrays for placeholders, for benchmarking ops
+
+    Arguments:
+        list phs : placeholders to feed
+        int batch_size : size of leading dimension of each array
+
+    Returns:
+        dict feed_dict : feed dictionary
+    """
+    return {ph: np.zeros(utils.combined_shape(batch_size, ph.shape.as_list()[1:]),
+                         dtype=ph.dtype.as_numpy_dtype)
+            for ph in phs}
+
+
+def autotune(config, benchmark, verbose=True):
+    """
+    Pick the fastest thread settings for running benchmark ops on the current graph.
+
+    Each candidate setting is timed in a fresh session, so the session used for training is not
+    affected.
+
+    Arguments:
+        ExecConfig config : execution config
+        list benchmark : (fetches, feed_dict) pairs, all of which are run each timed step. Ops
+            should only depend on global variables and fed placeholders.
+        bool verbose : whether to print timing of each setting
+
+    Returns:
+        tuple best : fastest (intra_op_threads, inter_op_threads)
+    """
+    init_op = tf.global_variables_initializer()
+    best, best_time = None, None
+    for intra, inter in config.candidate_thread_settings():
+        with tf.Session(config=config.proto(intra, inter)) as sess:
+            sess.run(init_op)
+            for fetches, feed_dict in benchmark:
+                # first run includes one-off setup costs
+                sess.run(fetches, feed_dict)
+            start = time.time()
+            for _ in range(config.autotune_runs):
+                for fetches, feed_dict in benchmark:
+                    sess.run(fetches, feed_dict)
+            run_time = (time.time() - start) / config.autotune_runs
+        if verbose:
+            print("Autotune: intra_op_threads={}, inter_op_threads={} \t {:.3g} s/step"
+                  .format(intra, inter, run_time))
+        if best_time is None or run_time < best_time:
+            best, best_time = (intra, inter), run_time
+    return best
+
+
+def make_session(exec_config=None, benchmark=None, verbose=True):
+    """
+    Create a tf.Session using execution config.
+
+    If config has autotune set, thread settings are first picked by benchmarking the current graph.
+
+    Arguments:
+        None, dict or ExecConfig exec_config : the execution config (see ExecConfig.from_arg)
+        list benchmark : (fetches, feed_dict) pairs to benchmark when auto-tuning
+        bool verbose : whether to print auto-tuning results
+
+    Returns:
+        tf.Session sess : the new session
+    """
+    config = ExecConfig.from_arg(exec_config)
+    config.apply_affinity()
+    if config.autotune and benchmark:
+        # sessions share the first session's intra-op thread pool unless overridden
+        os.environ["TF_OVERRIDE_GLOBAL_THREADPOOL"] = "1"
+        config.intra_op_threads, config.inter_op_threads = autotune(config, benchmark, verbose)
+        if verbose:
+            print("Autotune: using intra_op_threads={}, inter_op_threads={}"
+                  .format(config.intra_op_threads, config.inter_op_threads))
+    return tf.Session(config=config.proto())
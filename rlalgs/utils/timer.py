@@ -0,0 +1,106 @@
+"""
+Low overhead timers for measuring the time spent in each phase of a training loop
+(e.g. env steps, action selection, gradient updates).
+
+Timers are disabled by default, in which case timing a phase does nothing. Phases are also
+recorded as trace events while a trace recorder (see rlalgs.utils.trace) is recording.
+"""
+import time
+
+
+class _Phase:
+    """
+    Context manager which adds time spent within it to a phase total
+    """
+    __slots__ = ("totals", "counts", "name", "start")
+
+    def __init__(self, totals, counts, name):
+        self.totals = totals
+        self.counts = counts
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.totals[self.name] += time.perf_counter() - self.start
+        self.counts[self.name] += 1
+        return False
+
+
+class _NullPhase:
+    """
+    Context manager which does nothing, used when timing is disabled
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class PhaseTimer:
+    """
+    Accumulates time spent in each named phase, between calls to log_tabular.
+
+    Usage:
+        timer = PhaseTimer(enabled, ["act", "env_step"])
+        with timer.phase("act"):
+            ...
+        timer.log_tabular(logger)
+    """
+
+    def __init__(self, enabled=False, phases=[], tracer=None):
+        """
+        Arguments:
+            bool enabled : whether to time phases
+            list phases : names of phases, in order columns are logged. Phases must be declared
+                so the same columns are logged each epoch, even if a phase doesn't run.
+            TraceRecorder tracer : trace recorder to record phases with, when it is recording
+        """
+        self.enabled = enabled
+        self.tracer = tracer
+        self.phases = list(phases)
+        self.totals = {name: 0.0 for name in self.phases}
+        self.counts = {name: 0 for name in self.phases}
+        self._timers = {name: _Phase(self.totals, self.counts, name) for name in self.phases}
+
+    def phase(self, name):
+        """
+        Get context manager for timing a phase (phases of same name must not be nested)
+        """
+        if self.tracer is not None and self.tracer.recording:
+            return self.tracer.span(name, self._timers[name] if self.enabled else None)
+        if not self.enabled:
+            return _NULL_PHASE
+        return self._timers[name]
+
+    def reset(self):
+        """
+        Clear accumulated times
+        """
+        for name in self.phases:
+            self.totals[name] = 0.0
+            self.counts[name] = 0
+
+    def log_tabular(self, logger):
+        """
+        Log total time (<phase>_time) and mean time per call (<phase>_mean) of each phase since
+        last logged, then reset. Does nothing if timer is disabled.
+
+        Arguments:
+            Logger logger : the logger
+        """
+        if not self.enabled:
+            return
+        for name in self.phases:
+            logger.log_tabular(name + "_time", self.totals[name])
+            logger.log_tabular(name + "_mean", self.totals[name] / max(1, self.counts[name]))
+        self.reset()
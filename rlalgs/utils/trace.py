@@ -0,0 +1,173 @@
+"""
+Records a timeline of a window of training in Chrome trace format (viewable in
+chrome://tracing or https://ui.perfetto.dev).
+
+Timelines include the python phases of the training loop (see rlalgs.utils.timer), the per-op
+timings of tf session runs and MPI collective calls (see rlalgs.utils.mpi.add_comm_observer).
+Recording adds overhead, so should only be done for a short window of training.
+"""
+import json
+import time
+import threading
+import tensorflow as tf
+
+
+TRACE_FNAME = "trace.json"
+
+
+class _Span:
+    """
+    Context manager which records time spent within it as a trace event, also timing an inner
+    phase timer if provided
+    """
+    __slots__ = ("recorder", "name", "inner", "start")
+
+    def __init__(self, recorder, name, inner=None):
+        self.recorder = recorder
+        self.name = name
+        self.inner = inner
+        self.start = 0.0
+
+    def __enter__(self):
+        if self.inner is not None:
+            self.inner.__enter__()
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *exc):
+        self.recorder.add_event(self.name, "phase", self.start, time.time())
+        if self.inner is not None:
+            self.inner.__exit__(*exc)
+        return False
+
+
+class TraceRecorder:
+    """
+    Records trace events while recording is started.
+
+    Event timestamps are wall clock times, so events from tf step stats and from different
+    processes line up.
+    """
+
+    def __init__(self, pid=0, max_events=500000):
+        """
+        Arguments:
+            int pid : id of process in trace (e.g. MPI rank)
+            int max_events : max number of events to record, further events are dropped
+        """
+        self.pid = pid
+        self.max_events = max_events
+        self.recording = False
+        self.dropped = 0
+        self._tids = {}
+        self.events = [{"name": "process_name", "ph": "M", "pid": pid, "tid": 0,
+                        "args": {"name": "process {}".format(pid)}}]
+        self.run_options = tf.RunOptions(trace_level=tf.RunOptions.FULL_TRACE)
+
+    def start(self):
+        """
+        Start recording events
+        """
+        self.recording = True
+
+    def stop(self):
+        """
+        Stop recording events
+        """
+        self.recording = False
+
+    def _tid(self, key, label):
+        """
+        Get trace thread id for key, adding thread name event the first time key is seen
+        """
+        if key not in self._tids:
+            self._tids[key] = len(self._tids)
+            self.events.append({"name": "thread_name", "ph": "M", "pid": self.pid,
+                                "tid": self._tids[key], "args": {"name": label}})
+        return self._tids[key]
+
+    def _append(self, name, cat, ts, dur, tid, args=None):
+        if len(self.events) >= self.max_events:
+            self.dropped += 1
+            return
+        event = {"name": name, "cat": cat, "ph": "X", "pid": self.pid, "tid": tid,
+                 "ts": ts, "dur": dur}
+        if args is not None:
+            event["args"] = args
+        self.events.append(event)
+
+    def add_event(self, name, cat, start, end, args=None):
+        """
+        Record an event that ran on calling thread, if recording
+
+        Arguments:
+            str name : event name
+            str cat : event category (e.g. "phase", "tf", "mpi")
+            float start : event start wall clock time (s)
+            float end : event end wall clock time (s)
+            dict args : extra event info
+        """
+        if not self.recording:
+            return
+        thread = threading.current_thread()
+        tid = self._tid(thread.ident, thread.name)
+        self._append(name, cat, start*1e6, (end - start)*1e6, tid, args)
+
+    def span(self, name, inner=None):
+        """
+        Get context manager that records time spent within it as an event
+
+        Arguments:
+            str name : event name
+            inner : context manager entered and exited with span (e.g. a phase timer)
+        """
+        return _Span(self, name, inner)
+
+    def comm_event(self, name, nbytes, start, end):
+        """
+        Record an MPI collective call (for use as an MPI comm observer)
+        """
+        self.add_event(name, "mpi", start, end, {"bytes": nbytes})
+
+    def run(self, sess, fetches, feed_dict=None):
+        """
+        Run fetches in session, recording the run and per-op step stats if recording
+        """
+        if not self.recording:
+            return sess.run(fetches, feed_dict)
+        run_metadata = tf.RunMetadata()
+        start = time.time()
+        result = sess.run(fetches, feed_dict, options=self.run_options,
+                          run_metadata=run_metadata)
+        self.add_event("sess.run", "tf", start, time.time())
+        self._add_step_stats(run_metadata.step_stats)
+        return result
+
+    def _add_step_stats(self, step_stats):
+        for dev_stats in step_stats.dev_stats:
+            for node in dev_stats.node_stats:
+                tid = self._tid((dev_stats.device, node.thread_id),
+                                "{} thread {}".format(dev_stats.device, node.thread_id))
+                self._append(node.node_name, "tf_op", node.all_start_micros,
+                             max(1, node.all_end_rel_micros), tid,
+                             {"op": node.timeline_label})
+
+    def write(self, fname):
+        """
+        Write recorded events to trace file
+        """
+        write_trace(fname, self.events)
+        if self.dropped > 0:
+            print("Trace: dropped {} events after reaching max_events".format(self.dropped))
+
+
+def write_trace(fname, events):
+    """
+    Write trace events to file in Chrome trace format
+
+    Arguments:
+        str fname : trace file path
+        list events : trace events (e.g. combined events of TraceRecorders of all processes)
+    """
+    with open(fname, "w") as fout:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, fout)
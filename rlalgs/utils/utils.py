@@ -1,7 +1,9 @@
 """
 Common general functions used by algorithm implementations
 """
+import sys
 import psutil
+import resource
 import datetime
 import numpy as np
 import scipy.signal
@@ -48,6 +50,33 @@ def placeholder_from_space(space, obs_space=False, name=None):
     raise NotImplementedError
 
 
+def batch_inputs(phs, batch_size):
+    """
+    Create persistent in-graph variables for holding a batch of data, so a batch only needs to be
+    copied into the tf runtime once and can then be reused by every loss and train op run on it.
+
+    Each returned input reads its batch variable by default but can still be fed directly
+    (e.g. when selecting an action for a single observation).
+
+    Arguments:
+        list phs : placeholders for each batch input, used for loading batch
+        int batch_size : number of entries in a batch
+
+    Returns:
+        list inputs : tensors to use as model inputs in place of phs
+        tf.Operation load_op : loads batch values fed to phs into the batch variables
+    """
+    inputs, assigns = [], []
+    for ph in phs:
+        shape = combined_shape(batch_size, ph.shape.as_list()[1:])
+        # local variables so batch is not saved with model or synced across processes
+        batch_var = tf.Variable(tf.zeros(shape, ph.dtype), trainable=False,
+                                collections=[tf.GraphKeys.LOCAL_VARIABLES])
+        assigns.append(tf.assign(batch_var, ph))
+        inputs.append(tf.placeholder_with_default(batch_var, ph.shape))
+    return inputs, tf.group(assigns)
+
+
 def combined_shape(length, shape=None):
     """
     Combines a tensor length and a shape into a single shape tuple
@@ -191,6 +220,17 @@ def get_current_mem_usage():
     return process.memory_info().rss / float(2**20)
 
 
+def get_peak_mem_usage():
+    """
+    Gets the peak memory usage (max resident set size) of calling process in MiB
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and KiB on linux
+    if sys.platform == "darwin":
+        return peak / float(2**20)
+    return peak / float(2**10)
+
+
 def print_current_mem_usage():
     """
     Prints memory usage of current process to stdout
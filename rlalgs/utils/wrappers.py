@@ -0,0 +1,76 @@
+"""
+Module contains environment wrappers for use with algorithms and experiments.
+"""
+import gym
+import numpy as np
+
+
+class ActionRepeatWrapper(gym.Wrapper):
+    """
+    Repeats each chosen action for frame_skip emulator frames.
+
+    Rewards are summed over the repeated frames and the returned observation is the
+    pixel-wise max over the last two frames (removes flickering of atari sprites).
+    Episode ends early if the environment finishes during the repeated frames.
+    """
+
+    def __init__(self, env, frame_skip=4):
+        """
+        Arguments:
+            gym.Env env : environment to wrap
+            int frame_skip : number of frames to repeat each action for
+        """
+        assert frame_skip >= 1, "frame_skip must be >= 1"
+        super().__init__(env)
+        self.frame_skip = frame_skip
+        self._obs_buf = np.zeros((2, ) + env.observation_space.shape,
+                                 dtype=env.observation_space.dtype)
+
+    def step(self, action):
+        total_rew, d, info = 0.0, False, {}
+        for i in range(self.frame_skip):
+            o, r, d, info = self.env.step(action)
+            if i == self.frame_skip - 2:
+                self._obs_buf[0] = o
+            if i == self.frame_skip - 1:
+                self._obs_buf[1] = o
+            total_rew += r
+            if d:
+                break
+        if i < self.frame_skip - 1 or self.frame_skip == 1:
+            # no second frame to pool with (episode finished early or no skipping)
+            return o, total_rew, d, info
+        return self._obs_buf.max(axis=0), total_rew, d, info
+
+    def reset(self, **kwargs):
+        return self.env.reset(**kwargs)
+
+
+def wrap_env(env, frame_skip=1):
+    """
+    Apply standard wrappers to environment
+
+    Arguments:
+        gym.Env env : environment to wrap
+        int frame_skip : number of frames to repeat each action for (1 = no wrapping)
+
+    Returns:
+        gym.Env env : wrapped environment
+    """
+    if frame_skip > 1:
+        env = ActionRepeatWrapper(env, frame_skip)
+    return env
+
+
+def make_env_fn(env_name, frame_skip=1):
+    """
+    Get a function which creates a copy of a (wrapped) OpenAI gym environment
+
+    Arguments:
+        str env_name : name of gym environment
+        int frame_skip : number of frames to repeat each action for (1 = no wrapping)
+
+    Returns:
+        func env_fn : function which creates environment
+    """
+    return lambda: wrap_env(gym.make(env_name), frame_skip)
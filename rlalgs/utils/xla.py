@@ -0,0 +1,99 @@
+"""
+Functions for compiling parts of the tensorflow graph with XLA
+"""
+import time
+import contextlib
+import tensorflow as tf
+
+
+def _experimental_jit_scope():
+    try:
+        return tf.xla.experimental.jit_scope()
+    except AttributeError:
+        # older tensorflow versions
+        return tf.contrib.compiler.jit.experimental_jit_scope()
+
+
+@contextlib.contextmanager
+def jit_scope(enabled=True):
+    """
+    Context manager within which created ops, and their gradients, are compiled with XLA.
+
+    Variables created within scope are resource variables, since XLA cannot compile ops on
+    reference variables. Does nothing if enabled is False.
+    """
+    if not enabled:
+        yield
+        return
+    with tf.variable_scope(tf.get_variable_scope(), use_resource=True):
+        with _experimental_jit_scope():
+            yield
+
+
+class _CompileRun:
+    """
+    Context manager which times a run of a named op for its compile timer
+    """
+    __slots__ = ("timer", "name", "start")
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer._record(self.name, time.time() - self.start)
+        return False
+
+
+class _NullRun:
+    """
+    Context manager which does nothing, used when op runs are not timed
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_RUN = _NullRun()
+
+
+class CompileTimer:
+    """
+    Estimates the one-off compile cost of each named op as the time of its first run minus the
+    time of its second run.
+
+    Usage:
+        compile_timer = CompileTimer(xla_compile)
+        with compile_timer.time("train"):
+            sess.run(train_op)
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.total = 0.0
+        self._first_times = {}
+        self._timed = set()
+
+    def time(self, name):
+        """
+        Get context manager which times op run within it, if it is first or second run for name
+        """
+        if not self.enabled or name in self._timed:
+            return _NULL_RUN
+        return _CompileRun(self, name)
+
+    def _record(self, name, run_time):
+        if name not in self._first_times:
+            self._first_times[name] = run_time
+        else:
+            self.total += max(0.0, self._first_times[name] - run_time)
+            self._timed.add(name)